@@ -1,11 +1,17 @@
-from netmiko import ConnectHandler
 from paramiko.ssh_exception import SSHException
 
+from connection_pool import netmiko_pool
+from deferred_save import DeferredSaveConnection
+
 def connect_to_device(device_info):
     try:
-        connection = ConnectHandler(**device_info)
-        connection.enable()
-        return connection
+        # Borrow an authenticated, enabled connection from the shared pool
+        connect_args = dict(device_info)
+        host = connect_args.pop('ip')
+        connection = netmiko_pool.acquire(host, connect_args.pop('username'), **connect_args)
+
+        # Saves requested by the steps below are written once, when the workflow commits
+        return DeferredSaveConnection(connection, host)
     except SSHException as e:
         print(f"Error connecting to the device: {e}")
         return None
@@ -18,7 +24,7 @@ def configure_acl(connection):
     ]
     try:
         connection.send_config_set(acl_config_commands)
-        connection.send_command('write memory')
+        connection.save()
         print("ACL Configuration Successful.")
     except Exception as e:
         print(f"Error configuring ACL: {e}")
@@ -39,7 +45,7 @@ def configure_ipsec(connection, your_pre_shared_key, r2_ip):
     ]
     try:
         connection.send_config_set(ipsec_config_commands)
-        connection.send_command('write memory')
+        connection.save()
         print("IPSec Configuration Successful.")
     except Exception as e:
         print(f"Error configuring IPSec: {e}")
@@ -68,5 +74,7 @@ if device_connection:
     # Configure IPSec
     configure_ipsec(device_connection, YOUR_PRESHARED_KEY, R2_IP)
 
-    # Disconnect from the device
-    device_connection.disconnect()
+    # One write memory for both changes, then hand the connection back and close the pool
+    device_connection.commit()
+    netmiko_pool.release(device_connection.connection)
+    netmiko_pool.close_all()
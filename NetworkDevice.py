@@ -1,7 +1,8 @@
 import pexpect
 import logging
 import getpass
-import difflib
+
+from config_diff import diff_configs
 
 class NetworkDeviceConfigurator:
     def __init__(self, ip, username, password, enable_password):
@@ -10,6 +11,7 @@ class NetworkDeviceConfigurator:
         self.password = password
         self.enable_password = enable_password
         self.session = None
+        self.running_config = None
 
     def connect(self):
         try:
@@ -81,6 +83,7 @@ class NetworkDeviceConfigurator:
                 return False
 
             running_config = self.session.before  # Get the output before the prompt
+            self.running_config = running_config
 
             with open(output_file, 'w') as f:
                 f.write(running_config)
@@ -101,9 +104,9 @@ class NetworkDeviceConfigurator:
 
             startup_config = self.session.before  # Get the output before the prompt
 
-            # You can now compare the running and startup configurations
-            diff = difflib.unified_diff(self.session.before.splitlines(), startup_config.splitlines())
-            diff_str = '\n'.join(diff)
+            # Compare the parsed running and startup configurations block by block
+            running_config = self.running_config if self.running_config is not None else ''
+            diff_str = str(diff_configs(running_config, startup_config))
 
             print(f'--- Differences between running and startup configurations for {self.ip}:')
             print(diff_str)
@@ -118,9 +121,9 @@ class NetworkDeviceConfigurator:
             with open(local_config_path, 'r') as f:
                 local_config = f.read()
 
-            # You can now compare the running and local configurations
-            diff = difflib.unified_diff(self.session.before.splitlines(), local_config.splitlines())
-            diff_str = '\n'.join(diff)
+            # Compare the parsed running and local configurations block by block
+            running_config = self.running_config if self.running_config is not None else self.session.before
+            diff_str = str(diff_configs(running_config, local_config))
 
             print(f'--- Differences between running and local configurations for {self.ip}:')
             print(diff_str)
@@ -0,0 +1,96 @@
+import os
+import json
+import math
+import threading
+
+# Key under which fleet-wide samples are kept, used for devices without history
+FLEET = '*'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ResponseHistory:
+    """
+    Per-device response times and output sizes, used to pick timeouts.
+
+    Every successful read records (seconds, bytes) for the device and the
+    command. The timeout for the next read is a high percentile of the past
+    latencies times a margin, stretched when the expected output is larger
+    than what the device usually sends at its observed throughput. Devices
+    without history fall back to fleet-wide samples for the same command,
+    then to the caller's default. The history is kept in a JSON file
+    between runs.
+    """
+
+    def __init__(self, path='response_history.json', max_samples=50, pct=95, margin=1.5, slack=1.0,
+                 min_timeout=2, max_timeout=600):
+        self.path = path
+        self.max_samples = max_samples
+        self.pct = pct
+        self.margin = margin
+        self.slack = slack
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.samples = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.samples = json.load(f)
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.samples)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(data)
+        os.replace(temp_path, self.path)
+
+    def record(self, device, command, seconds, size=0):
+        """
+        Record one successful read.
+
+        :device: Device IP address or name
+        :command: Command or login step the read belonged to
+        :seconds: Time from sending to seeing the prompt
+        :size: Bytes of output received
+        """
+        with self._lock:
+            for key in (device, FLEET):
+                samples = self.samples.setdefault(key, {}).setdefault(command, [])
+                samples.append([round(seconds, 4), size])
+                del samples[:-self.max_samples]
+
+    def timeout(self, device, command, default=20, expected_bytes=None):
+        """
+        Get the deadline for the next read of a command on a device.
+
+        :device: Device IP address or name
+        :command: Command or login step
+        :default: Timeout to use when there is no history at all
+        :expected_bytes: Output size to plan for, the largest seen by default
+        =return: Timeout in seconds
+        """
+        with self._lock:
+            samples = self.samples.get(device, {}).get(command) or self.samples.get(FLEET, {}).get(command)
+            samples = list(samples) if samples else None
+
+        if not samples:
+            return default
+
+        latencies = [seconds for seconds, _ in samples]
+        timeout = percentile(latencies, self.pct) * self.margin + self.slack
+
+        # Big outputs take as long as the device's slowest observed throughput needs
+        rates = [size / seconds for seconds, size in samples if size and seconds > 0]
+        if rates:
+            expected = expected_bytes if expected_bytes is not None else max(size for _, size in samples)
+            timeout = max(timeout, expected / percentile(rates, 100 - self.pct) * self.margin + self.slack)
+
+        return min(self.max_timeout, max(self.min_timeout, timeout))
@@ -0,0 +1,289 @@
+import os
+import re
+import pty
+import fcntl
+import asyncio
+import logging
+import termios
+
+from prompts import prompt_profile
+
+
+class TIMEOUT(Exception):
+    """Raised, or matched as a pattern, when expect() runs out of time."""
+
+
+class EOF(Exception):
+    """Raised, or matched as a pattern, when the device closes the session."""
+
+
+class AsyncDeviceSession:
+    """
+    asyncio counterpart of the pexpect session in NetworkDeviceConfigurator.
+
+    The session runs either over a TCP stream (telnet-style CLI servers and
+    the fake IOS device in fake_ios.py) or over an 'ssh' child process on a
+    pty whose output is read by the event loop, so one loop can hold
+    thousands of sessions without a thread per device.
+    """
+
+    def __init__(self, ip, username, password, enable_password, port=None, transport='ssh', timeout=20):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.enable_password = enable_password
+        self.port = port
+        self.transport = transport
+        self.timeout = timeout
+        self.hostname = None
+        self.prompt = None
+        self.before = ''
+        self.after = ''
+        self.buffer = ''
+        self._reader = None
+        self._writer = None
+        self._process = None
+
+    async def _open_tcp(self):
+        self._reader, self._writer = await asyncio.open_connection(self.ip, self.port or 23, limit=2 ** 20)
+
+    async def _open_ssh(self):
+        # ssh reads the password from its controlling terminal, so run it on a pty
+        master, slave = pty.openpty()
+
+        def make_controlling_tty():
+            os.setsid()
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+        command = ['ssh', '-o', 'StrictHostKeyChecking=accept-new', f'{self.username}@{self.ip}']
+        if self.port:
+            command[1:1] = ['-p', str(self.port)]
+
+        self._process = await asyncio.create_subprocess_exec(*command, stdin=slave, stdout=slave, stderr=slave,
+                                                             preexec_fn=make_controlling_tty)
+        os.close(slave)
+
+        loop = asyncio.get_running_loop()
+        self._reader = asyncio.StreamReader(limit=2 ** 20)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(self._reader),
+                                     os.fdopen(master, 'rb', 0))
+        write_transport, write_protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin,
+                                                                        os.fdopen(os.dup(master), 'wb', 0))
+        self._writer = asyncio.StreamWriter(write_transport, write_protocol, None, loop)
+
+    async def sendline(self, line=''):
+        self._writer.write(f'{line}\n'.encode('utf-8'))
+        await self._writer.drain()
+
+    async def send(self, data):
+        self._writer.write(data.encode('utf-8'))
+        await self._writer.drain()
+
+    async def expect(self, patterns, timeout=-1):
+        """
+        Wait until one of the patterns shows up in the session output.
+
+        Works like pexpect's expect(): TIMEOUT and EOF can be given as
+        patterns, otherwise they are raised.
+
+        :patterns: List of regex strings/compiled patterns, TIMEOUT or EOF
+        :timeout: Seconds to wait, -1 for the session default
+        =return: Index of the pattern that matched
+        """
+        if not isinstance(patterns, list):
+            patterns = [patterns]
+        compiled = [p if p in (TIMEOUT, EOF) else re.compile(p) for p in patterns]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout if timeout == -1 else timeout)
+
+        while True:
+            # The earliest match in the buffer wins, like pexpect
+            best = None
+            for index, pattern in enumerate(compiled):
+                if pattern in (TIMEOUT, EOF):
+                    continue
+                match = pattern.search(self.buffer)
+                if match and (best is None or match.start() < best[1].start()):
+                    best = (index, match)
+
+            if best:
+                index, match = best
+                self.before = self.buffer[:match.start()]
+                self.after = match.group()
+                self.buffer = self.buffer[match.end():]
+                return index
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return self._no_match(compiled, TIMEOUT)
+
+            try:
+                data = await asyncio.wait_for(self._reader.read(65536), remaining)
+            except asyncio.TimeoutError:
+                continue
+            except OSError:
+                # A pty raises EIO once the ssh child exits
+                data = b''
+
+            if not data:
+                return self._no_match(compiled, EOF)
+            self.buffer += data.decode('utf-8', 'replace')
+
+    def _no_match(self, compiled, condition):
+        self.before = self.buffer
+        self.after = condition
+        self.buffer = ''
+        if condition in compiled:
+            return compiled.index(condition)
+        raise condition(f'{condition.__name__} waiting for output from {self.ip}')
+
+    async def connect(self):
+        try:
+            if self.transport == 'ssh':
+                await self._open_ssh()
+            else:
+                await self._open_tcp()
+
+            login_patterns = ['Are you sure you want to continue connecting', 'Username:', 'Password:', TIMEOUT, EOF]
+            result = await self.expect(login_patterns)
+            if result == 0:
+                await self.sendline('yes')
+                result = await self.expect(login_patterns)
+            if result == 1:
+                await self.sendline(self.username)
+                result = await self.expect(login_patterns)
+
+            if result != 2:
+                logging.error(f'Failed to create a session for {self.ip}')
+                return False
+
+            await self.sendline(self.password)
+            result = await self.expect([r'[\r\n]([\w.-]+)>', r'[\r\n]([\w.-]+)#', TIMEOUT, EOF])
+
+            if result > 1:
+                logging.error(f'Failed to enter the password for {self.ip}')
+                return False
+
+            self.hostname = self.after.strip()[:-1]
+            self._learn_prompt()
+
+            # A '>' prompt is user exec mode and still needs enable; privilege 15 accounts land on '#'
+            if result == 0:
+                return await self.enable()
+
+            return True
+        except Exception as e:
+            logging.error(f'Failed to establish a session to {self.ip}: {e}')
+            return False
+
+    def _learn_prompt(self):
+        self.prompt = prompt_profile(self.hostname).any_prompt
+
+    async def enable(self):
+        await self.sendline('enable')
+        result = await self.expect(['Password:', TIMEOUT, EOF])
+
+        if result != 0:
+            logging.error(f'Failed to enter enable mode for {self.ip}')
+            return False
+
+        await self.sendline(self.enable_password)
+        result = await self.expect([self.prompt, TIMEOUT, EOF])
+
+        if result != 0 or not self.after.endswith('#'):
+            logging.error(f'Failed to enter enable mode after sending the password for {self.ip}')
+            return False
+
+        return True
+
+    async def send_command(self, command, timeout=-1):
+        """
+        Send a command and return its output up to the next prompt.
+
+        :command: CLI command to run
+        :timeout: Seconds to wait for the prompt, -1 for the session default
+        =return: Command output without the echoed command and the prompt
+        """
+        await self.sendline(command)
+
+        # Hostname changes show up in the prompt of this very command
+        if command.startswith('hostname '):
+            self.hostname = command.split(None, 1)[1]
+            self._learn_prompt()
+
+        # Keep paging until the prompt comes back
+        output = ''
+        while await self.expect([self.prompt, r' ?--More-- ?'], timeout=timeout) == 1:
+            output += self.before
+            await self.send(' ')
+        output += self.before
+
+        # Drop the backspaces IOS uses to erase the --More-- marker
+        output = re.sub(r'\x08+ *\x08+', '', output)
+
+        # Drop the echoed command
+        if output.lstrip().startswith(command):
+            output = output.lstrip()[len(command):]
+
+        # The prompt pattern takes the '\n' of the last line ending, its '\r' is left over
+        return output.replace('\r\n', '\n').strip('\r\n')
+
+    async def configure_hostname(self, new_hostname):
+        try:
+            await self.send_command('configure terminal')
+            await self.send_command(f'hostname {new_hostname}')
+            await self.send_command('end')
+            return True
+        except (TIMEOUT, EOF) as e:
+            logging.error(f'Configuration failed for {self.ip}: {e}')
+            return False
+
+    async def disconnect(self):
+        if self._writer:
+            try:
+                await self.sendline('exit')
+            except (ConnectionError, OSError):
+                pass
+            self._writer.close()
+            self._writer = None
+        if self._process and self._process.returncode is None:
+            self._process.terminate()
+            await self._process.wait()
+        self._process = None
+
+
+async def run_command_on_all(sessions, command):
+    """
+    Run the same command on every connected session concurrently.
+
+    :sessions: List of connected AsyncDeviceSession objects
+    :command: CLI command to run
+    =return: Dict of ip -> output (or the exception that was raised)
+    """
+    outputs = await asyncio.gather(*(session.send_command(command) for session in sessions), return_exceptions=True)
+    return {session.ip: output for session, output in zip(sessions, outputs)}
+
+
+async def main():
+    from fake_ios import FakeIOSServer
+
+    server = await FakeIOSServer().start()
+
+    # Hold many concurrent CLI sessions on one event loop
+    sessions = [AsyncDeviceSession('127.0.0.1', 'cisco', 'cisco', 'class', port=server.port, transport='tcp')
+                for _ in range(200)]
+    connected = await asyncio.gather(*(session.connect() for session in sessions))
+    print(f'--- Connected sessions: {sum(connected)} of {len(sessions)}')
+
+    await run_command_on_all(sessions, 'terminal length 0')
+    outputs = await run_command_on_all(sessions, 'show running-config')
+    print(f"--- Running configuration lines per session: {len(outputs['127.0.0.1'].splitlines())}")
+
+    await asyncio.gather(*(session.disconnect() for session in sessions))
+    await server.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename='network_device_configurator.log', level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+
+"""
+Offline compliance audit of saved configuration files.
+
+Walks a directory of saved running configurations (running_config_*.txt
+and the like), checks every file against compliance rules and optionally
+diffs it with a baseline configuration. Files are parsed and checked on a
+pool of worker processes, one per CPU core by default, and every result
+is written as one JSON line as soon as it is ready, so memory stays flat
+however large the archive is.
+
+Usage:
+    python3 audit.py config_archive/ --rules rules/ --output audit.jsonl
+    python3 audit.py config_archive/ --baseline golden.txt --pattern '*.cfg'
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import multiprocessing
+
+from compliance import RuleError, rule_set
+from config_diff import diff_configs
+from config_parser import IOSConfig
+
+# Rules shipped with the scripts
+DEFAULT_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules')
+
+# Set once per worker process by _init_worker
+_rules = None
+_baseline = None
+
+
+def find_configs(root, pattern='*.txt'):
+    """
+    Yield the config files under a directory, walking it lazily.
+
+    :root: Directory to walk
+    :pattern: Shell pattern the file names must match
+    """
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                    yield entry.path
+
+
+def _init_worker(rules_path, baseline_path):
+    # Compile the rules and parse the baseline once per process, not once per file
+    global _rules, _baseline
+    _rules = rule_set(rules_path)
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            _baseline = IOSConfig(f.read())
+
+
+def audit_file(path):
+    """
+    Check one saved configuration.
+
+    :path: Path of the config file
+    =return: Result dict, ready to be written as a JSON line
+    """
+    result = {'file': path, 'hostname': None, 'lines': 0, 'compliant': False, 'findings': [], 'error': None}
+
+    try:
+        with open(path, 'r', errors='replace') as f:
+            config = IOSConfig(f.read())
+
+        hostname = config.find('hostname')
+        result['hostname'] = hostname[0].text.split(None, 1)[-1] if hostname else None
+        result['lines'] = len(config)
+        result['findings'] = [
+            {
+                'rule': finding.rule.id,
+                'severity': finding.rule.severity,
+                'section': finding.section,
+                'line': finding.line,
+                'line_number': finding.line_number,
+                'message': finding.message,
+            }
+            for finding in _rules.evaluate(config)
+        ]
+        result['compliant'] = not result['findings']
+
+        if _baseline is not None:
+            result['diff'] = diff_configs(_baseline, config).lines()
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+
+    return result
+
+
+def audit(paths, rules_path=DEFAULT_RULES, baseline_path=None, workers=None, chunksize=16):
+    """
+    Audit config files on a process pool.
+
+    :paths: Iterable of config file paths
+    :rules_path: Rule file or directory
+    :baseline_path: Optional config every file is diffed against
+    :workers: Worker processes, one per CPU core by default
+    :chunksize: Files handed to a worker at a time
+    =return: Generator of result dicts, in completion order
+    """
+    # Fail in the parent on bad rules instead of once in every worker
+    rule_set(rules_path)
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(rules_path, baseline_path)) as pool:
+        yield from pool.imap_unordered(audit_file, paths, chunksize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Audit saved device configurations against compliance rules.')
+    parser.add_argument('directory', help='directory with saved configurations')
+    parser.add_argument('--rules', default=DEFAULT_RULES, help='rule file or directory (default: %(default)s)')
+    parser.add_argument('--baseline', help='configuration every file is diffed against')
+    parser.add_argument('--pattern', default='*.txt', help='file name pattern (default: %(default)s)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU core)')
+    parser.add_argument('--output', help='JSON lines output file (default: stdout)')
+    args = parser.parse_args(argv)
+
+    try:
+        rule_set(args.rules)
+    except (OSError, RuleError) as e:
+        parser.error(f'cannot load rules from {args.rules}: {e}')
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    started = time.monotonic()
+    counts = {'files': 0, 'compliant': 0, 'failed': 0, 'errors': 0}
+
+    try:
+        for result in audit(find_configs(args.directory, args.pattern), args.rules, args.baseline, args.workers):
+            output.write(json.dumps(result) + '\n')
+
+            counts['files'] += 1
+            if result['error']:
+                counts['errors'] += 1
+            elif result['compliant']:
+                counts['compliant'] += 1
+            else:
+                counts['failed'] += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"--- Audited {counts['files']} files in {round(time.monotonic() - started, 1)}s: "
+          f"{counts['compliant']} compliant, {counts['failed']} not compliant, {counts['errors']} unreadable",
+          file=sys.stderr)
+
+    return 0 if counts['failed'] == 0 and counts['errors'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import re
+import logging
+from collections import namedtuple
+
+# Error lines IOS prints right after the command that caused them
+IOS_ERROR = re.compile(r'^% ?(Invalid input|Incomplete command|Ambiguous command|Unknown command|.*[Ee]rror|'
+                       r'.*[Ff]ailed|.*not allowed)')
+
+# Exec prompt the device returns to after 'end'; config prompts have '(config...)' before the '#'
+EXEC_PROMPT = re.compile(r'[\r\n][\w.-]+#')
+
+PushError = namedtuple('PushError', ['command', 'message'])
+
+
+class ConfigPushError(Exception):
+    def __init__(self, host, errors):
+        self.host = host
+        self.errors = errors
+        super().__init__(f'{len(errors)} command(s) rejected by {host}: '
+                         + '; '.join(f'{e.command!r}: {e.message}' for e in errors))
+
+
+def change_set(commands):
+    """
+    Wrap config commands into one block that is written to the device at once.
+
+    :commands: Config-mode commands, without 'configure terminal' and 'end'
+    =return: Text to send in a single write
+    """
+    lines = ['configure terminal'] + [command.strip() for command in commands] + ['end']
+    return '\n'.join(lines) + '\n'
+
+
+def parse_push_output(commands, output):
+    """
+    Find the commands the device rejected in the echoed output of a change set.
+
+    The device echoes each line before it runs it, so an error line belongs
+    to the last command echoed before it.
+
+    :commands: The commands that were pushed (as given to change_set)
+    :output: Everything the device printed while applying them
+    =return: List of PushError(command, message)
+    """
+    sent = ['configure terminal'] + [command.strip() for command in commands] + ['end']
+    errors = []
+    current = -1
+
+    for line in output.replace('\r', '').split('\n'):
+        text = line.strip()
+        if not text:
+            continue
+
+        if IOS_ERROR.match(text):
+            command = sent[current] if current >= 0 else None
+            errors.append(PushError(command, text))
+            continue
+
+        # Echoes come bare or behind a prompt such as 'R1(config-if)#'
+        following = current + 1
+        if following < len(sent) and sent[following] and text.endswith(sent[following]):
+            current = following
+
+    return errors
+
+
+def push_config(session, commands, timeout=30):
+    """
+    Push a change set through a pexpect session with one write and one wait.
+
+    :session: pexpect spawn object sitting at the exec prompt
+    :commands: Config-mode commands
+    :timeout: Seconds to wait for the exec prompt after 'end'
+    =return: List of PushError, empty when every command was accepted
+    """
+    session.send(change_set(commands))
+    session.expect(EXEC_PROMPT, timeout=timeout)
+
+    errors = parse_push_output(commands, session.before)
+    for error in errors:
+        logging.error(f'Device rejected {error.command!r}: {error.message}')
+    return errors
@@ -0,0 +1,86 @@
+import time
+import threading
+
+# Commands that only read state and can be answered from the cache
+READ_ONLY_PREFIXES = ('show ', 'sh ')
+
+
+def is_read_only(command):
+    return command.strip().lower().startswith(READ_ONLY_PREFIXES)
+
+
+class CommandCache:
+    """
+    Outputs of show commands for one session, kept for a short time.
+
+    A repeated read inside one workflow is answered from memory. Anything
+    that can change the device - a config push or any command that is not a
+    show command - must call invalidate(), so a read after a change always
+    goes to the device. A read that was already running when invalidate()
+    was called may have seen the device before the change; its output is
+    returned to its caller but not cached.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(command):
+        return ' '.join(command.split())
+
+    def get(self, command):
+        """
+        =return: Cached output of a command, None if missing or expired
+        """
+        key = self._key(command)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, command, output, generation=None):
+        """
+        :generation: Value of self.generation when the read started; the
+                     output is dropped if the cache was invalidated since
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[self._key(command)] = (time.monotonic(), output)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def fetch(self, command, read):
+        """
+        Get the output of a command, running it only on a cache miss.
+
+        :command: CLI command
+        :read: Callable that runs the command on the device and returns its output
+        =return: Command output
+        """
+        if not is_read_only(command):
+            # The command may change the device, so nothing cached can be trusted afterwards
+            self.invalidate()
+            try:
+                return read(command)
+            finally:
+                self.invalidate()
+
+        output = self.get(command)
+        if output is None:
+            generation = self.generation
+            output = read(command)
+            self.put(command, output, generation)
+        return output
@@ -1,37 +1,24 @@
 # ...
 
-    def compare_with_cisco_hardening(self):
-        try:
-            self.session.sendline('show running-config')
-            result = self.session.expect(['#', pexpect.TIMEOUT, pexpect.EOF])
+import os
 
-            if result != 0:
-                logging.error(f'Failed to capture the running configuration for {self.ip}')
-                return False
+from compliance import rule_set
+
+# Cisco device hardening advice as compliance rules
+HARDENING_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'cisco_hardening.yaml')
 
-            running_config = self.session.before  # Get the output before the prompt
+# ...
+
+    def compare_with_cisco_hardening(self):
+        try:
+            # Parses the file captured by save_running_config, only asks the device when nothing was captured
+            running_config = self.running_config()
 
-            # Cisco device hardening advice from provided text
-            cisco_hardening_advice = """
-            en
-            conf t
-            int g0/0
-            ip address 192.168.1.1 255.255.255.0
-            no shut
-            exit
-            line vty 0 4
-            transport input all
-            login local
-            username cisco password cisco
-            ip domain-name domain.com
-            hostname R1
-            enable secret class
-            crypto key generate rsa modulus 2048
-            ip ssh version 2
-            """
+            # Hardening advice lives in a rule file, compiled once and checked in one pass
+            findings = rule_set(HARDENING_RULES).evaluate(running_config)
 
             # Compare the running configuration with the hardening advice
-            if all(line.strip() in running_config.strip() for line in cisco_hardening_advice.split('\n') if line.strip()):
+            if not findings:
                 print('------------------------------------------------------')
                 print(f'--- Running configuration complies with Cisco device hardening advice for {self.ip}')
                 print('------------------------------------------------------')
@@ -39,6 +26,9 @@
             else:
                 print('------------------------------------------------------')
                 print(f'--- Running configuration does not comply with Cisco device hardening advice for {self.ip}')
+                for finding in findings:
+                    where = f' in {finding.section}' if finding.section else ''
+                    print(f'--- {finding.rule.id}{where}: {finding.message}')
                 print('------------------------------------------------------')
                 return False
         except Exception as e:
@@ -46,19 +36,11 @@
             return False
 
     def enable_syslog(self):
-        try:
-            self.session.sendline('configure terminal')
-            self.session.sendline('logging enable')  # Enable syslog
-            self.session.sendline('end')
-            result = self.session.expect(['#', pexpect.TIMEOUT, pexpect.EOF])
-
-            if result != 0:
-                logging.error(f'Failed to enable syslog for {self.ip}')
-                return False
-
-            return True
-        except Exception as e:
-            logging.error(f"Failed to enable syslog: {e}")
+        # Enable syslog with a single batched push
+        if not self.push_config(['logging enable']):
+            logging.error(f'Failed to enable syslog for {self.ip}')
             return False
 
+        return True
+
 # ...
@@ -1,11 +1,10 @@
-import netmiko
-import difflib
+from config_diff import diff_configs
+from connection_pool import netmiko_pool
 
 # Function to compare configurations
 def compare_configs(current_config, baseline_config):
-    d = difflib.Differ()
-    diff = list(d.compare(current_config.splitlines(), baseline_config.splitlines()))
-    return '\n'.join(diff)
+    diff = diff_configs(current_config, baseline_config)
+    return str(diff)
 
 # Function to enable syslog on the device
 def enable_syslog(session):
@@ -25,9 +24,9 @@ connection_info = {
     "secret": "class",
 }
 
-# Connect to the device
-session = netmiko.ConnectHandler(**connection_info)
-session.enable()
+# Borrow an authenticated, enabled connection from the shared pool
+connect_args = dict(connection_info)
+session = netmiko_pool.acquire(connect_args.pop("host"), connect_args.pop("username"), **connect_args)
 
 # Get the running configuration
 run_config = session.send_command("show running-config")
@@ -47,5 +46,6 @@ print(config_diff)
 # Enable syslog on the device
 enable_syslog(session)
 
-# Close the session
-session.disconnect()
+# Hand the session back and close the pool
+netmiko_pool.release(session)
+netmiko_pool.close_all()
@@ -0,0 +1,242 @@
+import os
+import re
+import json
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from config_parser import IOSConfig, normalize
+
+# Kinds of checks a rule can make, each takes a config line or a regex
+RULE_KINDS = ('must_have', 'must_not_have', 'must_match', 'must_not_match')
+
+Finding = namedtuple('Finding', ['rule', 'section', 'line', 'line_number', 'message'])
+
+
+class RuleError(ValueError):
+    pass
+
+
+class Rule:
+    """
+    One compliance check.
+
+    must_have / must_not_have take a config line and also match longer
+    lines that start with it ('enable secret' matches 'enable secret 9 ...').
+    must_match / must_not_match take a regex matched against whole lines.
+    With a section regex the rule is checked inside every block whose
+    parent line matches it ('^line vty', '^interface GigabitEthernet'),
+    otherwise against the top-level lines.
+    """
+
+    def __init__(self, id, kind, pattern, section=None, description='', severity='medium'):
+        if kind not in RULE_KINDS:
+            raise RuleError(f'Rule {id}: unknown kind {kind!r}, expected one of {", ".join(RULE_KINDS)}')
+
+        self.id = id
+        self.kind = kind
+        self.pattern = pattern
+        self.section = section
+        self.description = description
+        self.severity = severity
+
+        try:
+            self.section_regex = re.compile(section) if section else None
+        except re.error as e:
+            raise RuleError(f'Rule {id}: invalid section regex {section!r}: {e}')
+
+        if kind in ('must_have', 'must_not_have'):
+            self.text = normalize(pattern)
+            self.keyword = self.text.split()[0]
+            self.regex = None
+        else:
+            try:
+                self.regex = re.compile(pattern)
+            except re.error as e:
+                raise RuleError(f'Rule {id}: invalid regex {pattern!r}: {e}')
+
+    @property
+    def required(self):
+        return self.kind in ('must_have', 'must_match')
+
+    def matches(self, text):
+        if self.regex is not None:
+            return self.regex.search(text) is not None
+        return text == self.text or text.startswith(self.text + ' ')
+
+    @classmethod
+    def from_dict(cls, data):
+        kinds = [kind for kind in RULE_KINDS if kind in data]
+        if len(kinds) != 1:
+            raise RuleError(f'Rule {data.get("id")}: needs exactly one of {", ".join(RULE_KINDS)}')
+
+        kind = kinds[0]
+        return cls(data.get('id', data[kind]), kind, data[kind], data.get('section'),
+                   data.get('description', ''), data.get('severity', 'medium'))
+
+    def __repr__(self):
+        return f'Rule({self.id!r}, {self.kind}={self.pattern!r})'
+
+
+class _Scope:
+    """
+    All rules sharing one section, compiled into lookup structures.
+
+    Line rules are indexed by their first word, so a config line is only
+    compared with rules that start with the same keyword. Regex rules are
+    each tried on their own: joined into one alternation, inline flags and
+    back-references of one rule would break or change the others.
+    """
+
+    def __init__(self, section, rules):
+        self.section = rules[0][1].section_regex if rules else None
+        self.rules = rules
+        self.required = [index for index, rule in rules if rule.required]
+
+        self.by_keyword = {}
+        regex_rules = []
+        for index, rule in rules:
+            if rule.regex is None:
+                self.by_keyword.setdefault(rule.keyword, []).append((index, rule))
+            else:
+                regex_rules.append((index, rule))
+
+        self.regex_rules = regex_rules
+
+    def matching(self, text):
+        """
+        =return: (index, rule) of every rule of this scope that matches a line
+        """
+        hits = [(index, rule) for index, rule in self.by_keyword.get(text.split()[0], ()) if rule.matches(text)]
+        hits.extend((index, rule) for index, rule in self.regex_rules if rule.regex.search(text))
+        return hits
+
+
+class RuleSet:
+    """
+    Compiled set of compliance rules, evaluated in one pass over a config.
+
+    Rules are grouped by section once at load time. Evaluating a config
+    walks its lines once; each line costs a keyword lookup plus one match
+    per regex rule of its scopes, so line rules, usually most of a set, do
+    not add to the work per line.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+        duplicates = sorted(str(rule_id) for rule_id, count in Counter(rule.id for rule in self.rules).items()
+                            if count > 1)
+        if duplicates:
+            raise RuleError(f'Duplicate rule ids: {", ".join(duplicates)}')
+
+        grouped = {}
+        for index, rule in enumerate(self.rules):
+            grouped.setdefault(rule.section, []).append((index, rule))
+
+        self.global_scope = _Scope(None, grouped.pop(None, []))
+        self.section_scopes = [_Scope(section, rules) for section, rules in grouped.items()]
+
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_rules(path))
+
+    def _scopes(self, parent):
+        if parent.text is None:
+            return [self.global_scope]
+        return [scope for scope in self.section_scopes if scope.section.search(parent.text)]
+
+    def evaluate(self, config):
+        """
+        Check a configuration against every rule.
+
+        :config: IOSConfig or configuration text
+        =return: List of Finding, empty when the config complies
+        """
+        if not isinstance(config, IOSConfig):
+            config = IOSConfig(config)
+
+        findings = []
+        # Scopes that apply to each block, with the required rules seen in it
+        blocks = {}
+
+        for node in config:
+            # Banner bodies are kept verbatim and may be blank
+            if not node.text.strip():
+                continue
+
+            parent = node.parent
+            block = blocks.get(id(parent))
+            if block is None:
+                block = blocks[id(parent)] = (parent, self._scopes(parent), set())
+
+            for scope in block[1]:
+                for index, rule in scope.matching(node.text):
+                    if rule.required:
+                        block[2].add(index)
+                    else:
+                        findings.append(Finding(rule, parent.text, node.text, node.line_number,
+                                                f'{node.text!r} is not allowed'))
+
+            # A section without lines still has to hold its required lines
+            if not node.children and self.section_scopes:
+                scopes = self._scopes(node)
+                if scopes:
+                    blocks.setdefault(id(node), (node, scopes, set()))
+
+        # The global scope applies even to an empty config
+        blocks.setdefault(id(config.root), (config.root, [self.global_scope], set()))
+
+        for parent, scopes, seen in blocks.values():
+            for scope in scopes:
+                for index in scope.required:
+                    if index not in seen:
+                        rule = self.rules[index]
+                        findings.append(Finding(rule, parent.text, None, parent.line_number,
+                                                f'missing {rule.pattern!r}'))
+
+        return findings
+
+    def __len__(self):
+        return len(self.rules)
+
+
+def _read_rules(path):
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        data = data.get('rules', [])
+    return [Rule.from_dict(item) for item in data or []]
+
+
+def load_rules(path):
+    """
+    Read rules from a YAML or JSON file, or from every such file in a directory.
+
+    A file holds a list of rules, or a mapping with a 'rules' list. Each
+    rule has an id, exactly one of must_have, must_not_have, must_match or
+    must_not_match, and optionally section, description and severity.
+
+    =return: List of Rule
+    """
+    if not os.path.isdir(path):
+        return _read_rules(path)
+
+    rules = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith(('.yaml', '.yml', '.json')):
+            rules.extend(_read_rules(os.path.join(path, name)))
+    return rules
+
+
+@lru_cache(maxsize=None)
+def rule_set(path):
+    """
+    Get the compiled rule set of a file or directory, compiling it on first use.
+    """
+    return RuleSet.from_file(path)
@@ -0,0 +1,205 @@
+import re
+
+from config_parser import ConfigLine, IOSConfig
+
+# Lines that change on their own and say nothing about the configuration
+VOLATILE = [
+    re.compile(r'^ntp clock-period '),
+    re.compile(r'^banner '),
+    re.compile(r'^(Building configuration|Current configuration|Using \d+ out of)'),
+]
+
+# Blocks whose child order matters to the device
+ORDERED = re.compile(r'^(ip access-list |ipv6 access-list |route-map |ip prefix-list )')
+
+# Numbered ACLs are top-level lines, the lines of one list are an ordered group
+NUMBERED = re.compile(r'^(access-list \d+) ')
+
+
+class ConfigDiff:
+    """
+    Block-aware difference between two IOS configurations.
+
+    Children are matched by their text under the same parent, so moving a
+    block around is not a change and each line is visited once. ACLs,
+    route-maps and prefix-lists, including numbered 'access-list N' lines,
+    keep their order: the same lines in another order are a change. Volatile
+    lines (ntp clock-period, banners) are ignored. The result
+    lists added and removed lines by path and can be turned into the IOS
+    commands that take the old configuration to the new one.
+    """
+
+    def __init__(self, old, new, ignore=VOLATILE):
+        self.old = old if isinstance(old, IOSConfig) else IOSConfig(old)
+        self.new = new if isinstance(new, IOSConfig) else IOSConfig(new)
+        self.ignore = ignore
+        # One combined regex is cheaper than trying each pattern per line
+        self._ignore = re.compile('|'.join(f'(?:{pattern.pattern})' for pattern in ignore)) if ignore else None
+        self.added = []
+        self.removed = []
+        self.reordered = []
+        self._compare(self.old.root, self.new.root)
+        self.rebuilt = self._rebuilt()
+
+    def _volatile(self, node):
+        return self._ignore is not None and self._ignore.search(node.text) is not None
+
+    def _compare(self, old, new):
+        old_children = {child.text: child for child in old.children if not self._volatile(child)}
+        new_children = {child.text: child for child in new.children if not self._volatile(child)}
+
+        for text, child in old_children.items():
+            if text not in new_children:
+                self.removed.append(child)
+
+        for text, child in new_children.items():
+            if text not in old_children:
+                self.added.append(child)
+            elif child.children or old_children[text].children:
+                self._compare(old_children[text], child)
+
+        # In ACLs and route-maps a line moved, or added or removed in the middle, shifts the lines after it
+        if new.text and ORDERED.match(new.text) and self._out_of_order(list(old_children), list(new_children)):
+            self.reordered.append(new)
+
+        if new.text is None:
+            old_groups = self._numbered(old_children)
+            for name, texts in self._numbered(new_children).items():
+                if self._out_of_order(old_groups.get(name, []), texts):
+                    self.reordered.append(self._group(name))
+
+    @staticmethod
+    def _out_of_order(old, new):
+        """
+        Whether an ordered block needs a rebuild to go from the old lines to the new ones.
+
+        Lines can only be appended to an ordered block or removed from its
+        end one by one; a line added or removed anywhere else, or common
+        lines in another order, change the place of the lines after it.
+        """
+        kept = len(set(old) & set(new))
+        return old[:kept] != new[:kept] or not set(old[:kept]) <= set(new)
+
+    @staticmethod
+    def _numbered(children):
+        # Lines of each numbered ACL, in config order
+        groups = {}
+        for text in children:
+            match = NUMBERED.match(text)
+            if match:
+                groups.setdefault(match.group(1), []).append(text)
+        return groups
+
+    def _group(self, name):
+        """
+        Numbered ACL of the new configuration as one block, so it can be rebuilt like a named one.
+        """
+        group = ConfigLine(name, self.new.root)
+        for child in self.new.root.children:
+            match = NUMBERED.match(child.text)
+            if match and match.group(1) == name:
+                if not group.children:
+                    group.line_number = child.line_number
+                group.add(ConfigLine(child.text, group, child.line_number))
+        return group
+
+    def _rebuilt(self):
+        """
+        Blocks commands() rebuilds from scratch instead of adding and removing their lines one by one.
+        """
+        rebuilt = list(self.reordered)
+        paths = {node.path for node in rebuilt}
+        remaining = self._numbered(child.text for child in self.new.root.children)
+
+        # 'no access-list N ...' deletes the whole numbered ACL, not just that line
+        for node in self.removed:
+            name = self._block(node)
+            if len(node.path) == 1 and name and name not in paths and name[0] in remaining:
+                rebuilt.append(self._group(name[0]))
+                paths.add(name)
+        return rebuilt
+
+    @staticmethod
+    def _block(node):
+        # Path of the block a line belongs to, a numbered ACL counting as a block
+        match = NUMBERED.match(node.text) if len(node.path) == 1 else None
+        return (match.group(1),) if match else node.path[:-1]
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.reordered)
+
+    def lines(self):
+        """
+        Human readable diff, one line per change with its parent blocks.
+        """
+        output = []
+        changes = [('-', node) for node in self.removed] + [('+', node) for node in self.added] \
+            + [('~', node) for node in self.reordered]
+
+        # Group the changes under their parent blocks, in config order
+        for sign, node in sorted(changes, key=lambda change: (change[1].path[:-1], change[1].line_number)):
+            parents = node.path[:-1]
+            context = ' > '.join(parents)
+            prefix = f'{context} > ' if context else ''
+            output.append(f'{sign} {prefix}{node.text}')
+            if sign != '~':
+                output.extend(f'{sign} {prefix}{node.text} > {line.strip()}' for line in node.lines())
+        return output
+
+    def commands(self):
+        """
+        IOS commands that turn the old configuration into the new one.
+        """
+        commands = []
+        blocks = {}
+        rebuilt = {node.path for node in self.rebuilt}
+
+        def kept(node):
+            # Lines of a rebuilt block are written with it, not one by one
+            block = self._block(node)
+            return not any(block[:depth] in rebuilt for depth in range(1, len(block) + 1))
+
+        # Removals first, so a changed value is replaced rather than duplicated
+        for node in filter(kept, self.removed):
+            blocks.setdefault(node.path[:-1], []).append(f'no {node.text}' if not node.text.startswith('no ')
+                                                         else node.text[3:])
+        for node in filter(kept, self.added):
+            blocks.setdefault(node.path[:-1], []).append(node.text)
+            blocks[node.path[:-1]].extend(node.lines(' '))
+            if node.children:
+                blocks[node.path[:-1]].append('exit')
+
+        # ACLs and route-maps whose order changed are rebuilt from scratch, a numbered ACL as top-level lines
+        for node in self.rebuilt:
+            parents = node.path[:-1]
+            blocks.setdefault(parents, []).append(f'no {node.text}')
+            if node.text.startswith('access-list '):
+                blocks[parents].extend(node.lines())
+            else:
+                blocks[parents].append(node.text)
+                blocks[parents].extend(node.lines(' '))
+                blocks[parents].append('exit')
+
+        for parents, lines in sorted(blocks.items()):
+            indent = ''
+            for parent in parents:
+                commands.append(indent + parent)
+                indent += ' '
+            commands.extend(indent + line for line in lines)
+            commands.extend(['exit'] * len(parents))
+        return commands
+
+    def __str__(self):
+        return '\n'.join(self.lines())
+
+
+def diff_configs(old, new, ignore=VOLATILE):
+    """
+    Diff two configurations given as text or parsed IOSConfig objects.
+
+    :old: The reference configuration
+    :new: The configuration to compare against it
+    :ignore: Regexes of lines to leave out of the comparison
+    =return: ConfigDiff
+    """
+    return ConfigDiff(old, new, ignore)
@@ -0,0 +1,168 @@
+import re
+
+# Lines of 'show running-config' output that are not configuration, including the echoed command
+NOISE = re.compile(r'^(Building configuration\.\.\.|Current configuration\s*:.*|Using \d+ out of \d+ bytes|end|show\s.*)$')
+BANNER = re.compile(r'^banner\s+\S+\s+(\^C|\S)')
+
+
+def normalize(line):
+    """
+    Collapse the whitespace of a config line so lookups ignore spacing.
+    """
+    return ' '.join(line.split())
+
+
+class ConfigLine:
+    """
+    One line of an IOS configuration with its child lines.
+    """
+
+    def __init__(self, text, parent=None, line_number=0):
+        self.text = text
+        self.parent = parent
+        self.line_number = line_number
+        self.children = []
+        self._children = {}
+        self.path = parent.path + (text,) if parent else ()
+
+    @property
+    def keyword(self):
+        return self.text.split()[0] if self.text else ''
+
+    def add(self, child):
+        self.children.append(child)
+        self._children.setdefault(child.text, child)
+        return child
+
+    def child(self, text):
+        return self._children.get(normalize(text))
+
+    def walk(self):
+        for child in self.children:
+            yield child
+            yield from child.walk()
+
+    def lines(self, indent=''):
+        for child in self.children:
+            yield indent + child.text
+            yield from child.lines(indent + ' ')
+
+    def __repr__(self):
+        return f'ConfigLine({self.text!r}, children={len(self.children)})'
+
+
+class IOSConfig:
+    """
+    IOS configuration parsed into a tree of parent/child blocks.
+
+    Every line is indexed by its full path (parents + line), and by the
+    first word of the line under each parent, so checks like "does
+    'line vty 0 4' contain 'login local'" are dict lookups instead of
+    substring scans over the whole text.
+    """
+
+    def __init__(self, text):
+        self.root = ConfigLine(None)
+        self.index = {}
+        self.keywords = {}
+        self.parse(text.splitlines() if isinstance(text, str) else text)
+
+    def parse(self, lines):
+        # Stack of (indent, node) for the blocks we are inside of
+        stack = [(-1, self.root)]
+        banner_end = None
+
+        for line_number, raw in enumerate(lines, 1):
+            raw = raw.rstrip('\r\n')
+
+            # Banner bodies are kept verbatim under the banner line
+            if banner_end:
+                stack[-1][1].add(ConfigLine(raw, stack[-1][1], line_number))
+                if banner_end in raw:
+                    banner_end = None
+                    stack.pop()
+                continue
+
+            text = normalize(raw)
+            if not text or text.startswith('!') or NOISE.match(text):
+                continue
+
+            indent = len(raw) - len(raw.lstrip())
+            while indent <= stack[-1][0]:
+                stack.pop()
+
+            parent = stack[-1][1]
+            node = parent.add(ConfigLine(text, parent, line_number))
+            self.index.setdefault(node.path, node)
+            self.keywords.setdefault((parent.path, node.keyword), []).append(node)
+            stack.append((indent, node))
+
+            match = BANNER.match(text)
+            if match:
+                delimiter = match.group(1)
+                # Single-line banners close on the same line
+                if text.count(delimiter) < 2:
+                    banner_end = delimiter
+
+    @staticmethod
+    def _section(section):
+        if section is None:
+            return ()
+        if isinstance(section, str):
+            return (normalize(section),)
+        return tuple(normalize(s) for s in section)
+
+    def _path(self, line, section=None):
+        return self._section(section) + (normalize(line),)
+
+    def get(self, line, section=None):
+        """
+        Look up a line, optionally inside a section.
+
+        :line: The config line, e.g. 'login local'
+        :section: Parent line ('line vty 0 4') or tuple of parent lines
+        =return: ConfigLine or None
+        """
+        return self.index.get(self._path(line, section))
+
+    def has(self, line, section=None):
+        return self._path(line, section) in self.index
+
+    def section(self, name):
+        return self.get(name)
+
+    def sections(self, keyword):
+        """
+        All top-level blocks starting with a keyword, e.g. 'interface'.
+        """
+        return [node for node in self.keywords.get(((), keyword), []) if node.children]
+
+    def find(self, prefix, section=None):
+        """
+        Lines that start with a prefix, e.g. 'enable secret' or 'logging host'.
+
+        Only lines sharing the prefix's first word are scanned.
+        """
+        prefix = normalize(prefix)
+        candidates = self.keywords.get((self._section(section), prefix.split()[0]), [])
+        return [node for node in candidates if node.text == prefix or node.text.startswith(prefix + ' ')]
+
+    def missing(self, expected):
+        """
+        Lines of another configuration that are not in this one.
+
+        :expected: IOSConfig with the lines that must be present
+        =return: List of paths (tuples of lines) that are missing
+        """
+        return [node.path for node in expected.root.walk() if node.path not in self.index]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return self.root.walk()
+
+
+def parse_file(path):
+    with open(path, 'r') as f:
+        return IOSConfig(f.read())
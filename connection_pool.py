@@ -0,0 +1,320 @@
+import re
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from batch_push import ConfigPushError, change_set, parse_push_output
+from prompts import prompt_profile
+from stream_reader import PromptReader, read_until_prompt
+from transports import TelnetTransport
+
+# Exec prompt at the end of the output, as opposed to 'R1(config)#'
+EXEC_PROMPT_LINE = re.compile(r'^[\w.-]+#\s*$')
+
+# Prompts read before the hostname is known
+ANY_PROMPT_LINE = re.compile(r'[\w.-]+[>#]\s*$')
+PASSWORD_LINE = re.compile(r'Password:\s*$')
+
+
+class ShellSession:
+    """
+    Authenticated, enabled interactive shell on a device over paramiko.
+
+    Exposes the same send_command/send_config_set/disconnect calls as a
+    netmiko connection so the pool can hand out either kind.
+    """
+
+    def __init__(self, host, username, password, enable_password=None, port=22, timeout=20):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.enable_password = enable_password
+        self.port = port
+        self.timeout = timeout
+        self.client = None
+        self.shell = None
+        self.prompt = None
+
+    def connect(self):
+        # Third-party required modules/packages/library
+        import paramiko
+
+        self.client = paramiko.SSHClient()
+        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.client.connect(self.host, port=self.port, username=self.username, password=self.password,
+                            timeout=self.timeout, look_for_keys=False, allow_agent=False)
+
+        self.shell = self.client.invoke_shell()
+        return self._start()
+
+    def _start(self):
+        # Logged in: learn the prompt, enter enable mode and turn paging off
+        reader = PromptReader(self.shell, ANY_PROMPT_LINE, self.timeout)
+        reader.read()
+        self.prompt = prompt_profile(reader.prompt_text[:-1]).line_prompt
+
+        if reader.prompt_text.endswith('>'):
+            self.enable()
+
+        self.send_command('terminal length 0')
+        return self
+
+    def enable(self):
+        self.shell.send('enable\n')
+        read_until_prompt(self.shell, PASSWORD_LINE, self.timeout)
+        self.shell.send(f'{self.enable_password}\n')
+
+        reader = PromptReader(self.shell, self.prompt, self.timeout)
+        reader.read()
+        if not reader.prompt_text.endswith('#'):
+            raise ConnectionError(f'Failed to enter enable mode for {self.host}')
+
+    def stream_command(self, command, timeout=None):
+        """
+        Send a command and yield its output in chunks as the device sends it.
+
+        :command: CLI command to run
+        :timeout: Seconds of silence to allow, None for the session default
+        """
+        self.shell.send(command + '\n')
+        reader = PromptReader(self.shell, self.prompt, timeout or self.timeout)
+
+        echo = True
+        for chunk in reader.chunks():
+            chunk = chunk.replace('\r\n', '\n')
+
+            # Drop the echoed command
+            if echo:
+                echo = False
+                first_line, _, rest = chunk.partition('\n')
+                if first_line.strip() == command.strip():
+                    chunk = rest
+
+            if chunk:
+                yield chunk
+
+    def send_command(self, command, timeout=None):
+        return ''.join(self.stream_command(command, timeout)).rstrip('\n')
+
+    def send_config_set(self, commands):
+        # Send the whole change set in one write and wait for the exec prompt once
+        self.shell.send(change_set(commands))
+        reader = PromptReader(self.shell, EXEC_PROMPT_LINE, self.timeout)
+        output = reader.read()
+
+        # The change set may have renamed the device
+        self.prompt = prompt_profile(reader.prompt_text[:-1]).line_prompt
+
+        errors = parse_push_output(commands, output)
+        if errors:
+            raise ConfigPushError(self.host, errors)
+        return output
+
+    def is_alive(self):
+        if not self.shell or self.shell.closed or not self.client.get_transport().is_active():
+            return False
+        try:
+            self.send_command('', timeout=5)
+            return True
+        except (TimeoutError, EOFError, OSError):
+            return False
+
+    def disconnect(self):
+        if self.client:
+            self.client.close()
+            self.client = None
+            self.shell = None
+
+
+class TelnetShellSession(ShellSession):
+    """
+    ShellSession over an in-process telnet connection.
+
+    Same calls and prompt handling as the SSH session, so a pool can hold
+    devices that only speak telnet next to SSH ones.
+    """
+
+    def __init__(self, host, username, password, enable_password=None, port=23, timeout=20):
+        super().__init__(host, username, password, enable_password, port, timeout)
+
+    def connect(self):
+        session = TelnetTransport(self.port).open(self.host, self.username, self.password, self.timeout)
+        if session is None:
+            raise ConnectionError(f'Failed to log in over telnet to {self.host}')
+
+        # Read the channel directly from here on, like a paramiko shell
+        self.shell = session.channel
+        return self._start()
+
+    def is_alive(self):
+        if not self.shell or self.shell.closed:
+            return False
+        try:
+            self.send_command('', timeout=5)
+            return True
+        except (TimeoutError, EOFError, OSError):
+            return False
+
+    def disconnect(self):
+        if self.shell:
+            self.shell.close()
+            self.shell = None
+
+
+def open_shell_session(host, username, password, enable_password=None, **kwargs):
+    return ShellSession(host, username, password, enable_password, **kwargs).connect()
+
+
+def open_telnet_session(host, username, password, enable_password=None, **kwargs):
+    return TelnetShellSession(host, username, password, enable_password, **kwargs).connect()
+
+
+def open_netmiko_session(host, username, **device_info):
+    # Third-party required modules/packages/library
+    from netmiko import ConnectHandler
+
+    connection = ConnectHandler(host=host, username=username, **device_info)
+    connection.enable()
+    return connection
+
+
+class PooledConnection:
+    def __init__(self, key, connection):
+        self.key = key
+        self.connection = connection
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+
+
+class ConnectionPool:
+    """
+    Pool of already-authenticated, already-enabled device sessions.
+
+    Sessions are keyed by (host, username). Idle sessions are health
+    checked before they are handed out again and closed once they sit idle
+    longer than idle_timeout. At most max_per_device sessions per key are in
+    use at once; further callers wait for one to be released.
+    """
+
+    def __init__(self, factory=open_shell_session, max_per_device=1, idle_timeout=300, max_uses=None):
+        self.factory = factory
+        self.max_per_device = max_per_device
+        self.idle_timeout = idle_timeout
+        self.max_uses = max_uses
+        self._idle = {}
+        self._in_use = {}
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _limit(self, key):
+        with self._lock:
+            if key not in self._limits:
+                self._limits[key] = threading.BoundedSemaphore(self.max_per_device)
+            return self._limits[key]
+
+    def _healthy(self, pooled):
+        if self.max_uses and pooled.uses >= self.max_uses:
+            return False
+        is_alive = getattr(pooled.connection, 'is_alive', None)
+        return is_alive() if is_alive else True
+
+    def acquire(self, host, username, timeout=None, **connect_args):
+        """
+        Get a session for (host, username), reusing an idle one when possible.
+
+        :host: Device IP address or name
+        :username: Login user
+        :timeout: Seconds to wait for a free slot on the device, None to wait forever
+        :connect_args: Passed to the factory when a new session is needed
+        =return: Connection object, hand it back with release()
+        """
+        key = (host, username)
+        limit = self._limit(key)
+        if not limit.acquire(timeout=timeout):
+            raise TimeoutError(f'No free session for {username}@{host}')
+
+        try:
+            self.evict_idle()
+
+            while True:
+                with self._lock:
+                    idle = self._idle.get(key)
+                    pooled = idle.pop() if idle else None
+                if pooled is None:
+                    break
+                if self._healthy(pooled):
+                    return self._check_out(pooled)
+                logging.info(f'Dropping unhealthy session to {host}')
+                self._close(pooled)
+
+            return self._check_out(PooledConnection(key, self.factory(host, username, **connect_args)))
+        except Exception:
+            limit.release()
+            raise
+
+    def _check_out(self, pooled):
+        pooled.uses += 1
+        with self._lock:
+            self._in_use[id(pooled.connection)] = pooled
+        return pooled.connection
+
+    def release(self, connection, discard=False):
+        with self._lock:
+            pooled = self._in_use.pop(id(connection))
+
+        if discard:
+            self._close(pooled)
+        else:
+            pooled.last_used = time.monotonic()
+            with self._lock:
+                self._idle.setdefault(pooled.key, []).append(pooled)
+        self._limit(pooled.key).release()
+
+    @contextmanager
+    def connection(self, host, username, **connect_args):
+        connection = self.acquire(host, username, **connect_args)
+        try:
+            yield connection
+        except Exception:
+            # A failed operation may leave the CLI in an unknown mode
+            self.release(connection, discard=True)
+            raise
+        self.release(connection)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = [p for p in idle if now - p.last_used < self.idle_timeout]
+                expired += [p for p in idle if now - p.last_used >= self.idle_timeout]
+                self._idle[key] = keep
+
+        for pooled in expired:
+            self._close(pooled)
+        return len(expired)
+
+    def _close(self, pooled):
+        try:
+            pooled.connection.disconnect()
+        except Exception as e:
+            logging.error(f'Failed to close session to {pooled.key[0]}: {e}')
+
+    def close_all(self):
+        with self._lock:
+            idle = [p for sessions in self._idle.values() for p in sessions]
+            self._idle = {}
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self):
+        with self._lock:
+            return {f'{username}@{host}': len(idle) for (host, username), idle in self._idle.items()}
+
+
+# Pools shared by the workflows in this repository
+shell_pool = ConnectionPool(open_shell_session)
+telnet_pool = ConnectionPool(open_telnet_session)
+netmiko_pool = ConnectionPool(open_netmiko_session)
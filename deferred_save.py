@@ -0,0 +1,124 @@
+import logging
+import threading
+
+# Commands that copy the running configuration to NVRAM
+SAVE_COMMANDS = ('write memory', 'write mem', 'wr mem', 'write', 'wr', 'copy running-config startup-config',
+                 'copy run start')
+
+
+def is_save_command(command):
+    return ' '.join(command.split()).lower() in SAVE_COMMANDS
+
+
+class DeferredSave:
+    """
+    Dirty state of one session's running configuration.
+
+    Every change marks the session dirty and every save request is only
+    noted, so a workflow that asks for a save after each of its changes
+    still costs one 'write memory' in the end, at commit(). flush() writes
+    straight away for steps that need the change to survive a reload
+    before going on. A save with nothing changed since the last one is
+    skipped.
+
+    :write: Callable that runs 'write memory' on the device
+    :host: Device name for log messages
+    """
+
+    def __init__(self, write, host=None):
+        self.write = write
+        self.host = host
+        self.dirty = False
+        self.requested = False
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def changed(self):
+        # Call before sending a change: a change set that fails half way may still be applied in part
+        with self._lock:
+            self.dirty = True
+
+    def request(self):
+        # Coalesced with every other request until commit() or flush()
+        with self._lock:
+            self.requested = True
+
+    @property
+    def pending(self):
+        return self.requested and self.dirty
+
+    def flush(self, force=False):
+        """
+        Save the running configuration now if it changed since the last save.
+
+        :force: Write even if this session changed nothing, e.g. to save a
+                change made by an earlier session
+        =return: True if 'write memory' was sent
+        """
+        with self._lock:
+            if not self.dirty and not force:
+                self.requested = False
+                return False
+
+            self.write()
+            self.writes += 1
+            self.dirty = False
+            self.requested = False
+            return True
+
+    def commit(self):
+        """
+        Carry out the requested saves with a single write.
+
+        Changes nobody asked to save stay unsaved, as they would without
+        this class.
+
+        =return: True if 'write memory' was sent
+        """
+        if not self.requested:
+            return False
+        return self.flush()
+
+
+class DeferredSaveConnection:
+    """
+    netmiko-style connection whose saves are deferred until commit.
+
+    send_config_set() marks the configuration dirty and save() requests a
+    save; commit() or disconnect() then write it once. Everything else is
+    passed through to the wrapped connection.
+    """
+
+    def __init__(self, connection, host=None):
+        self.connection = connection
+        self.saves = DeferredSave(lambda: self.connection.send_command('write memory'), host)
+
+    def send_config_set(self, commands, *args, **kwargs):
+        self.saves.changed()
+        return self.connection.send_config_set(commands, *args, **kwargs)
+
+    def send_command(self, command, *args, **kwargs):
+        # A save sent as a plain command is coalesced like save()
+        if is_save_command(command):
+            self.saves.request()
+            return ''
+        return self.connection.send_command(command, *args, **kwargs)
+
+    def save(self):
+        self.saves.request()
+
+    def flush(self, force=False):
+        return self.saves.flush(force)
+
+    def commit(self):
+        return self.saves.commit()
+
+    def disconnect(self):
+        try:
+            self.commit()
+        except Exception as e:
+            logging.error(f'Failed to save the configuration of {self.saves.host}: {e}')
+        self.connection.disconnect()
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
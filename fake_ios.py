@@ -0,0 +1,523 @@
+import re
+import time
+import asyncio
+import logging
+import threading
+
+# Running configuration the fake device boots with (without the header and 'end')
+DEFAULT_CONFIG = """version 16.9
+service timestamps debug datetime msec
+service timestamps log datetime msec
+no service password-encryption
+!
+hostname R1
+!
+boot-start-marker
+boot-end-marker
+!
+enable secret 5 $1$mERr$hx5rVt7rPNoS4wqbXKX7m0
+!
+username cisco privilege 15 password 0 cisco
+!
+ip domain name domain.com
+!
+interface GigabitEthernet0/0
+ ip address 192.168.1.1 255.255.255.0
+ no shutdown
+!
+interface GigabitEthernet0/1
+ no ip address
+ shutdown
+!
+line con 0
+ logging synchronous
+line vty 0 4
+ login local
+ transport input ssh
+!"""
+
+SHOW_VERSION = """Cisco IOS XE Software, Version 16.09.05
+Cisco IOS Software [Fuji], Virtual XE Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), Version 16.9.5, RELEASE SOFTWARE (fc1)
+Technical Support: http://www.cisco.com/techsupport
+Copyright (c) 1986-2020 by Cisco Systems, Inc.
+
+ROM: IOS-XE ROMMON
+
+{hostname} uptime is {uptime}
+Uptime for this control processor is {uptime}
+System image file is "bootflash:packages.conf"
+
+cisco CSR1000V (VXE) processor (revision VXE) with 2392579K/3075K bytes of memory.
+Processor board ID {serial}
+3 Gigabit Ethernet interfaces
+32768K bytes of non-volatile configuration memory.
+
+Configuration register is 0x2102"""
+
+INVALID_INPUT = "% Invalid input detected at '^' marker."
+
+# Global config commands that enter a sub-mode, and the prompt of that sub-mode
+SUB_MODES = [
+    (re.compile(r'interface \S+'), 'config-if'),
+    (re.compile(r'line \S+'), 'config-line'),
+    (re.compile(r'router \S+'), 'config-router'),
+    (re.compile(r'ip access-list standard \S+'), 'config-std-nacl'),
+    (re.compile(r'ip access-list extended \S+'), 'config-ext-nacl'),
+    (re.compile(r'crypto map \S+ \d+'), 'config-crypto-map'),
+    (re.compile(r'crypto isakmp policy \d+'), 'config-isakmp'),
+    (re.compile(r'crypto ipsec transform-set \S+'), 'cfg-crypto-trans'),
+    (re.compile(r'policy-map \S+'), 'config-pmap'),
+    (re.compile(r'class-map \S+'), 'config-cmap'),
+    (re.compile(r'vlan \d+'), 'config-vlan'),
+]
+
+# Commands that are only valid in global configuration mode
+GLOBAL_ONLY = {
+    'aaa', 'access-list', 'archive', 'banner', 'boot', 'class-map', 'clock', 'enable', 'hostname',
+    'interface', 'license', 'line', 'ntp', 'policy-map', 'router', 'service', 'snmp-server',
+    'spanning-tree', 'username', 'version', 'vlan',
+}
+
+# First words accepted in global configuration mode
+GLOBAL_KEYWORDS = GLOBAL_ONLY | {'crypto', 'default', 'ip', 'ipv6', 'logging', 'no'}
+
+
+def command_matches(command, full_command):
+    """
+    Check an abbreviated IOS command against its full form ('sh run').
+
+    :command: The command as typed
+    :full_command: The full form of the command
+    =return: True if every typed word is a prefix of the matching full word
+    """
+    words = command.split()
+    full_words = full_command.split()
+    if len(words) != len(full_words):
+        return False
+    return all(full.startswith(word) for word, full in zip(words, full_words))
+
+
+class FakeIOSDevice:
+    """
+    State of one fake IOS device, shared by every session connected to it.
+    """
+
+    def __init__(self, hostname='R1', config=DEFAULT_CONFIG, serial='9ZL3V6JJ5XE'):
+        self.lines = config.splitlines()
+        self.startup_lines = list(self.lines)
+        self.serial = serial
+        self.booted = time.time()
+        self.last_change = None
+        self.change_count = 0
+        self.write_count = 0
+        self.set_hostname(hostname)
+
+    @property
+    def hostname(self):
+        for line in self.lines:
+            if line.startswith('hostname '):
+                return line.split(None, 1)[1]
+        return 'Router'
+
+    def set_hostname(self, hostname):
+        # 'no hostname' drops the line and the device falls back to Router, so bring it back if needed
+        if not any(line.startswith('hostname ') for line in self.lines):
+            self.lines.insert(0, f'hostname {hostname}')
+        self.lines = [f'hostname {hostname}' if line.startswith('hostname ') else line for line in self.lines]
+
+    def mark_changed(self, username):
+        self.change_count += 1
+        self.last_change = (time.gmtime(), username)
+
+    def header(self, lines):
+        size = sum(len(line) + 1 for line in lines)
+        header = ['Building configuration...', '', f'Current configuration : {size} bytes', '!']
+        if self.last_change:
+            stamp, username = self.last_change
+            header.append(time.strftime('! Last configuration change at %H:%M:%S UTC %a %b %d %Y', stamp)
+                          + f' by {username}')
+            header.append('!')
+        return header
+
+    def running_config(self):
+        return self.header(self.lines) + self.lines + ['end']
+
+    def startup_config(self):
+        size = sum(len(line) + 1 for line in self.startup_lines)
+        return [f'Using {size} out of 33554432 bytes', '!'] + self.startup_lines + ['end']
+
+    def uptime(self):
+        minutes = int(time.time() - self.booted) // 60
+        return f'{minutes // 1440} days, {minutes // 60 % 24} hours, {minutes % 60} minutes'
+
+    def find_block(self, parent):
+        try:
+            start = self.lines.index(parent)
+        except ValueError:
+            # New blocks go before the trailing '!' of the config
+            self.lines[-1:-1] = ['!', parent]
+            start = len(self.lines) - 2
+        end = start + 1
+        while end < len(self.lines) and self.lines[end].startswith(' '):
+            end += 1
+        return start, end
+
+    def apply(self, command, parent=None):
+        """
+        Apply a configuration command globally or inside a parent block.
+        """
+        if command.startswith('hostname '):
+            self.set_hostname(command.split(None, 1)[1])
+            return
+
+        if parent is None:
+            lines, indent = self.lines, ''
+            start, end = 0, len(self.lines)
+        else:
+            start, end = self.find_block(parent)
+            lines, indent = self.lines, ' '
+            start += 1
+
+        opposite = command[3:] if command.startswith('no ') else f'no {command}'
+        block = lines[start:end]
+
+        # 'no X' removes X, and X replaces an earlier 'no X'
+        if indent + opposite in block:
+            index = start + block.index(indent + opposite)
+            del lines[index]
+            end -= 1
+
+            # Removing a block header removes the whole block
+            while parent is None and index < len(lines) and lines[index].startswith(' '):
+                del lines[index]
+                end -= 1
+            if command.startswith('no ') and parent is None:
+                return
+        if indent + command not in lines[start:end]:
+            if parent is None:
+                lines.insert(end - 1 if lines and lines[-1] == '!' else end, command)
+            else:
+                lines.insert(end, indent + command)
+
+
+class FakeIOSSession:
+    """
+    One CLI session on a fake IOS device, driven over an asyncio stream.
+    """
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.device = server.device
+        self.reader = reader
+        self.writer = writer
+        self.pending = b''
+        self.mode = 'user'
+        self.parent = None
+        self.sub_mode = None
+        self.terminal_length = 24
+        self.username = None
+
+    async def read_line(self, echo=True):
+        while True:
+            for sep in (b'\r\n', b'\n', b'\r'):
+                index = self.pending.find(sep)
+                if index != -1:
+                    line = self.pending[:index]
+                    self.pending = self.pending[index + len(sep):]
+                    text = line.decode('utf-8', 'replace')
+                    if echo:
+                        await self.write(text + '\r\n')
+                    return text
+            data = await self.reader.read(4096)
+            if not data:
+                raise EOFError
+            self.pending += data
+
+    async def read_key(self):
+        while not self.pending:
+            data = await self.reader.read(4096)
+            if not data:
+                raise EOFError
+            self.pending += data
+        key, self.pending = self.pending[:1], self.pending[1:]
+        # Swallow the line ending that follows a paging key
+        if self.pending[:1] in (b'\r', b'\n'):
+            self.pending = self.pending.lstrip(b'\r\n')
+        return key
+
+    async def write(self, text):
+        self.writer.write(text.encode('utf-8'))
+        await self.writer.drain()
+
+    def prompt(self):
+        hostname = self.device.hostname
+        if self.mode == 'user':
+            return f'{hostname}>'
+        if self.mode == 'enable':
+            return f'{hostname}#'
+        if self.mode == 'config':
+            return f'{hostname}(config)#'
+        return f'{hostname}({self.sub_mode})#'
+
+    async def login(self):
+        await self.write('\r\nUser Access Verification\r\n\r\nUsername: ')
+        username = await self.read_line()
+        await self.write('Password: ')
+        password = await self.read_line(echo=False)
+        await self.write('\r\n')
+
+        if self.server.login_delay:
+            await asyncio.sleep(self.server.login_delay)
+
+        if username != self.server.username or password != self.server.password:
+            await self.write('% Authentication failed\r\n')
+            return False
+
+        self.username = username
+        return True
+
+    async def run(self):
+        try:
+            if not await self.login():
+                return
+
+            while True:
+                await self.write(self.prompt())
+                line = (await self.read_line()).strip()
+                if not line:
+                    continue
+
+                if self.server.delay:
+                    await asyncio.sleep(self.server.delay)
+
+                if not await self.handle(line):
+                    return
+        except (EOFError, ConnectionError, OSError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def handle(self, line):
+        if self.mode in ('user', 'enable'):
+            return await self.handle_exec(line)
+        return await self.handle_config(line)
+
+    async def handle_exec(self, line):
+        command, _, pipe = line.partition(' | ')
+
+        if any(command_matches(command, c) for c in ('exit', 'quit', 'logout')):
+            return False
+
+        if command_matches(command, 'enable'):
+            if self.mode == 'user':
+                await self.write('Password: ')
+                password = await self.read_line(echo=False)
+                await self.write('\r\n')
+                if password == self.server.enable_password:
+                    self.mode = 'enable'
+                else:
+                    await self.write('% Access denied\r\n')
+            return True
+
+        if command_matches(command, 'show version'):
+            await self.output(SHOW_VERSION.format(hostname=self.device.hostname, uptime=self.device.uptime(),
+                                                  serial=self.device.serial).splitlines(), pipe)
+            return True
+
+        if command.startswith('terminal length '):
+            self.terminal_length = int(command.split()[-1])
+            return True
+
+        if self.mode == 'user':
+            await self.write(f'{INVALID_INPUT}\r\n')
+            return True
+
+        if command_matches(command, 'disable'):
+            self.mode = 'user'
+        elif command_matches(command, 'configure terminal'):
+            await self.write('Enter configuration commands, one per line.  End with CNTL/Z.\r\n')
+            self.mode = 'config'
+        elif command_matches(command, 'show running-config'):
+            await self.output(self.device.running_config(), pipe)
+        elif command_matches(command, 'show startup-config'):
+            await self.output(self.device.startup_config(), pipe)
+        elif command_matches(command, 'show clock'):
+            await self.output([time.strftime('*%H:%M:%S.000 UTC %a %b %d %Y', time.gmtime())], pipe)
+        elif command_matches(command, 'write memory') or command_matches(command, 'write') \
+                or command_matches(command, 'copy running-config startup-config'):
+            await self.write('Building configuration...\r\n')
+            if self.server.write_delay:
+                await asyncio.sleep(self.server.write_delay)
+            self.device.startup_lines = list(self.device.lines)
+            self.device.write_count += 1
+            await self.write('[OK]\r\n')
+        else:
+            await self.write(f'{INVALID_INPUT}\r\n')
+        return True
+
+    async def handle_config(self, line):
+        if line == 'end':
+            self.mode, self.parent, self.sub_mode = 'enable', None, None
+            return True
+
+        if line == 'exit':
+            if self.mode == 'config':
+                self.mode = 'enable'
+            else:
+                self.mode, self.parent, self.sub_mode = 'config', None, None
+            return True
+
+        if line.startswith('do '):
+            mode = self.mode
+            self.mode = 'enable'
+            try:
+                return await self.handle_exec(line[3:])
+            finally:
+                self.mode = mode
+
+        for pattern, sub_mode in SUB_MODES:
+            if pattern.match(line):
+                self.device.find_block(line)
+                self.mode, self.parent, self.sub_mode = 'sub', line, sub_mode
+                return True
+
+        first_word = line.split()[0]
+        if self.mode == 'sub' and first_word not in GLOBAL_ONLY:
+            self.device.apply(line, self.parent)
+            self.device.mark_changed(self.username)
+            return True
+
+        if first_word not in GLOBAL_KEYWORDS:
+            await self.write(f'{INVALID_INPUT}\r\n')
+            return True
+
+        # A global command typed inside a sub-mode drops back to global config
+        self.mode, self.parent, self.sub_mode = 'config', None, None
+        self.device.apply(line)
+        self.device.mark_changed(self.username)
+        return True
+
+    async def output(self, lines, pipe=''):
+        lines = self.filter(lines, pipe)
+
+        if self.server.output_delay:
+            await asyncio.sleep(self.server.output_delay)
+
+        # Page the output the way IOS does unless 'terminal length 0' was sent
+        page = self.terminal_length or len(lines) or 1
+        for index in range(0, len(lines), page):
+            await self.write(''.join(f'{line}\r\n' for line in lines[index:index + page]))
+            if index + page < len(lines):
+                await self.write(' --More-- ')
+                key = await self.read_key()
+                await self.write('\b' * 10 + ' ' * 10 + '\b' * 10)
+                if key not in (b' ', b'\r', b'\n'):
+                    break
+
+    def filter(self, lines, pipe):
+        if not pipe:
+            return lines
+        action, _, expression = pipe.partition(' ')
+        pattern = re.compile(expression)
+        if command_matches(action, 'include'):
+            return [line for line in lines if pattern.search(line)]
+        if command_matches(action, 'exclude'):
+            return [line for line in lines if not pattern.search(line)]
+        if command_matches(action, 'begin'):
+            for index, line in enumerate(lines):
+                if pattern.search(line):
+                    return lines[index:]
+            return []
+        return lines
+
+
+class FakeIOSServer:
+    """
+    Local TCP server that speaks a small subset of the IOS CLI.
+
+    Used to exercise the session layer without a real router: it asks for
+    Username/Password, supports enable, configure terminal, sub-modes,
+    show running-config/startup-config/version, write memory, output
+    filters and --More-- paging.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, username='cisco', password='cisco', enable_password='class',
+                 device=None, delay=0.0, login_delay=0.0, output_delay=0.0, write_delay=0.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.enable_password = enable_password
+        self.device = device or FakeIOSDevice()
+        self.delay = delay
+        self.login_delay = login_delay
+        self.output_delay = output_delay
+        self.write_delay = write_delay
+        self.sessions = 0
+        self.clients = {}
+        self.server = None
+        self.loop = None
+
+    async def handle_client(self, reader, writer):
+        self.sessions += 1
+        self.clients[asyncio.current_task()] = writer
+        try:
+            await FakeIOSSession(self, reader, writer).run()
+        finally:
+            self.sessions -= 1
+            del self.clients[asyncio.current_task()]
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=2 ** 20)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+
+            # Hang up on connected clients so their sessions end with EOF
+            for writer in self.clients.values():
+                writer.close()
+            if self.clients:
+                await asyncio.wait(list(self.clients), timeout=1)
+            await self.server.wait_closed()
+            self.server = None
+
+    def serve_in_thread(self):
+        """
+        Start the server on its own event loop in a daemon thread.
+
+        Handy for driving the fake device from blocking clients.
+        =return: The server, already listening on self.port
+        """
+        started = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            started.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        return self
+
+    def stop_thread(self):
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self.close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+async def main():
+    server = await FakeIOSServer(host='127.0.0.1', port=2323).start()
+    logging.info(f'Fake IOS device listening on {server.host}:{server.port}')
+    print(f'--- Fake IOS device listening on {server.host}:{server.port} (cisco/cisco, enable: class)')
+    await server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+    asyncio.run(main())
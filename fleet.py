@@ -0,0 +1,197 @@
+import os
+import time
+import json
+import logging
+import getpass
+import threading
+
+from networkconfignew import NetworkDeviceConfigurator
+from snapshot_store import SnapshotStore
+from adaptive_timeout import ResponseHistory
+from governor import Governor
+from retry import RetryScheduler, SessionFailure
+from inventory import load_inventory
+
+
+class FleetRunner:
+    """
+    Run the NetworkDeviceConfigurator workflow against many devices at once.
+
+    Every device goes through connect -> configure_hostname ->
+    save_running_config -> compare on a bounded pool of worker threads, so
+    the fleet takes about as long as its slowest device. With the paramiko
+    transport every session is a channel in this process instead of a
+    forked ssh binary. A governor caps the sessions per device and site and
+    paces the logins; workers over a limit wait for a free slot. Devices
+    whose login times out, drops or finds no free vty line are retried with
+    backoff while the rest of the fleet goes on.
+    """
+
+    def __init__(self, devices, max_workers=32, output_dir='.', store=None, history=None, transport=None,
+                 governor=None, scheduler=None):
+        self.devices = devices
+        self.max_workers = max_workers
+        self.output_dir = output_dir
+        self.store = store
+        self.history = history
+        self.transport = transport
+        self.governor = governor
+        self.scheduler = scheduler or RetryScheduler(max_workers)
+        self.results = []
+        self._lock = threading.Lock()
+
+    def run_device(self, device):
+        """
+        Run the full workflow for one device.
+
+        :device: dict with ip, username, password, enable_password and
+                 optionally hostname, local_config, transport and site
+        =return: Result dict for the report
+        """
+        ip = device['ip']
+        result = {'ip': ip, 'success': False, 'steps': {}, 'error': None, 'failure': None, 'attempts': 1}
+        started = time.monotonic()
+
+        configurator = None
+        output_file = f'{self.output_dir}/running_config_{ip}.txt'
+
+        try:
+            # Inside the try, so a device with e.g. an unknown transport fails alone
+            configurator = NetworkDeviceConfigurator(ip, device['username'], device['password'],
+                                                     device['enable_password'], self.history,
+                                                     device.get('transport') or self.transport,
+                                                     governor=self.governor, site=device.get('site'))
+            steps = [('connect', configurator.connect)]
+
+            if device.get('hostname'):
+                steps.append(('configure_hostname', lambda: configurator.configure_hostname(device['hostname'])))
+
+            steps.append(('save_running_config',
+                          lambda: configurator.save_running_config(output_file, self.store)))
+
+            if device.get('local_config'):
+                steps.append(('compare', lambda: configurator.compare_local_config(device['local_config'])))
+            else:
+                steps.append(('compare', configurator.compare_startup_config))
+
+            for name, step in steps:
+                ok = step()
+                result['steps'][name] = ok
+
+                # Stop at the first failed step, later steps depend on it
+                if not ok:
+                    result['error'] = f'{name} failed'
+                    result['failure'] = configurator.failure if name == 'connect' else None
+                    break
+            else:
+                result['success'] = True
+                result['running_config'] = output_file
+        except Exception as e:
+            logging.error(f'Fleet run failed for {ip}: {e}')
+            result['error'] = str(e)
+        finally:
+            if configurator is not None:
+                configurator.disconnect()
+
+        result['duration'] = round(time.monotonic() - started, 3)
+        return result
+
+    def _attempt(self, device):
+        result = self.run_device(device)
+
+        # Only a failed login is retried, nothing has been changed on the device yet
+        if result['steps'].get('connect') is False and result['failure'] in self.scheduler.retryable:
+            raise SessionFailure(result['failure'], f"{result['error']} ({result['failure']})", result)
+        return result
+
+    def run(self):
+        """
+        Run the workflow for every device on the worker pool.
+
+        =return: Report dict with a summary and the per-device results
+        """
+        started = time.monotonic()
+        self.results = []
+
+        tasks = ((device['ip'], lambda device=device: self._attempt(device)) for device in self.devices)
+
+        for outcome in self.scheduler.run(tasks):
+            result = outcome.result
+            if result is None and isinstance(outcome.error, SessionFailure):
+                # Out of attempts, report the last one
+                result = outcome.error.detail
+            elif result is None:
+                # The task itself failed; report it and let the rest of the fleet go on
+                result = {'ip': outcome.key, 'success': False, 'steps': {}, 'error': repr(outcome.error),
+                          'failure': outcome.failure, 'duration': 0}
+            result['attempts'] = outcome.attempts
+
+            with self._lock:
+                self.results.append(result)
+
+            if result['success']:
+                logging.info(f"Fleet run of {result['ip']} successful in {result['duration']}s.")
+            else:
+                logging.error(f"Fleet run of {result['ip']} failed after {outcome.attempts} attempt(s): "
+                              f"{result['error']}")
+
+        # Keep the learned response times for the next run
+        if self.history is not None:
+            self.history.save()
+
+        return self.report(time.monotonic() - started)
+
+    def report(self, elapsed):
+        succeeded = [r for r in self.results if r['success']]
+        return {
+            'total': len(self.results),
+            'succeeded': len(succeeded),
+            'failed': len(self.results) - len(succeeded),
+            'elapsed': round(elapsed, 3),
+            'slowest': max((r['duration'] for r in self.results), default=0),
+            'devices': sorted(self.results, key=lambda r: r['ip']),
+        }
+
+
+def write_report(report, output_file):
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    # Initialize logging for error tracking
+    logging.basicConfig(filename='network_device_configurator.log', level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
+
+    # Set the shared user credentials for devices without a credentials entry
+    username = 'prne'
+    password = getpass.getpass(f'Enter password for user {username}: ')
+    password_enable = 'class123!'
+
+    # Read the devices from the inventory, with named credentials when there is a credentials file
+    credentials_file = 'credentials.yaml' if os.path.exists('credentials.yaml') else None
+    inventory = load_inventory('devices-15.txt', credentials=credentials_file)
+
+    devices = []
+    for device in inventory:
+        login = inventory.login(device)
+        devices.append({
+            'ip': device.host,
+            'username': login.username if login else username,
+            'password': login.password if login else password,
+            'enable_password': login.enable_password if login else password_enable,
+            'transport': device.transport,
+            'site': device.site,
+            # Devices without a new_hostname attribute keep their name
+            'hostname': device.attributes.get('new_hostname'),
+        })
+
+    runner = FleetRunner(devices, max_workers=64, store=SnapshotStore(), history=ResponseHistory(),
+                         governor=Governor(max_sessions=64, max_per_device=2, login_rate=10))
+    fleet_report = runner.run()
+    write_report(fleet_report, 'fleet_report.json')
+
+    print('------------------------------------------------------')
+    print(f"--- Fleet run finished in {fleet_report['elapsed']}s (slowest device {fleet_report['slowest']}s)")
+    print(f"--- Succeeded: {fleet_report['succeeded']}  Failed: {fleet_report['failed']}")
+    print('--- Report saved to fleet_report.json')
+    print('------------------------------------------------------')
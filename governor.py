@@ -0,0 +1,149 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Login rate limit: rate logins per second, with bursts of up to burst.
+
+    acquire() waits for a token instead of failing, so a burst of workers
+    starting at once is spread out to the rate the AAA servers can take.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, waiting until one is available.
+
+        =return: Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+            waited += wait
+
+
+class _SessionSlot:
+    """
+    Session slots taken from a Governor, given back together by release().
+    """
+
+    def __init__(self, semaphores):
+        self.semaphores = semaphores
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            for semaphore in reversed(self.semaphores):
+                semaphore.release()
+
+
+class Governor:
+    """
+    Concurrency and login limits shared by every session of a run.
+
+    A session needs a slot on its device, on its site and in the global
+    pool, and each new login waits for a token from the login rate bucket.
+    Work over a limit waits for a free slot instead of failing, so a large
+    fleet runs at the highest rate the limits allow. The default of 2
+    sessions per device leaves 3 of the 5 lines of 'line vty 0 4' to
+    operators.
+
+    Slots are taken device first, then site, then global, so a session
+    waiting for a busy device never holds a global slot another device could
+    use. A thread must not wait for a second slot while it holds one: with
+    enough threads doing that, every slot is held by a thread that waits
+    for another and none is ever released. Close a session before opening
+    the next one, as the rollout does between its steps.
+
+    :max_sessions: Sessions open at once across all devices, None for no limit
+    :max_per_device: Sessions open at once per device (vty lines), None for no limit
+    :max_per_site: Sessions open at once per site, None for no limit
+    :login_rate: New logins per second, None for no limit
+    :login_burst: Logins allowed at once before the rate applies
+    """
+
+    def __init__(self, max_sessions=64, max_per_device=2, max_per_site=None, login_rate=10.0, login_burst=None):
+        self.max_per_device = max_per_device
+        self.max_per_site = max_per_site
+        self.logins = TokenBucket(login_rate, login_burst) if login_rate else None
+        self._global = threading.BoundedSemaphore(max_sessions) if max_sessions else None
+        self._devices = {}
+        self._sites = {}
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waited = 0.0
+
+    def _semaphore(self, table, key, size):
+        with self._lock:
+            if key not in table:
+                table[key] = threading.BoundedSemaphore(size)
+            return table[key]
+
+    def acquire(self, device, site=None):
+        """
+        Wait for a session slot on a device.
+
+        :device: Device IP address or name
+        :site: Site of the device, None if it has none
+        =return: Slot to give back with release() once the session is closed
+        """
+        semaphores = []
+        if self.max_per_device:
+            semaphores.append(self._semaphore(self._devices, device, self.max_per_device))
+        if self.max_per_site and site is not None:
+            semaphores.append(self._semaphore(self._sites, site, self.max_per_site))
+        if self._global is not None:
+            semaphores.append(self._global)
+
+        started = time.monotonic()
+        taken = []
+        try:
+            for semaphore in semaphores:
+                semaphore.acquire()
+                taken.append(semaphore)
+        except BaseException:
+            _SessionSlot(taken).release()
+            raise
+
+        with self._lock:
+            self.active += 1
+            self.waited += time.monotonic() - started
+
+        return _SessionSlot(semaphores)
+
+    def release(self, slot):
+        if not slot.released:
+            slot.release()
+            with self._lock:
+                self.active -= 1
+
+    def login(self):
+        # Wait for a login token before authenticating, to stay under the AAA lockout thresholds
+        if self.logins is not None:
+            waited = self.logins.acquire()
+            if waited:
+                with self._lock:
+                    self.waited += waited
+
+    def stats(self):
+        with self._lock:
+            return {'active': self.active, 'waited': round(self.waited, 3)}
+
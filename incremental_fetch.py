@@ -0,0 +1,80 @@
+import re
+import logging
+
+# Header line IOS puts in the running configuration after every change
+LAST_CHANGE = re.compile(r'! Last configuration change at (.+)')
+
+# Asks the device for just that line instead of the whole configuration
+SIGNAL_COMMAND = 'show running-config | include Last configuration change'
+
+
+def config_signal(send_command):
+    """
+    Get the cheap change marker of a device.
+
+    :send_command: Function that runs a CLI command and returns its output
+    =return: The 'Last configuration change' timestamp, or None if the
+             device does not report one
+    """
+    match = LAST_CHANGE.search(send_command(SIGNAL_COMMAND))
+    return match.group(1).strip() if match else None
+
+
+def fetch_running_config(device, send_command, store):
+    """
+    Get the running configuration, pulling it only if it changed.
+
+    The change marker is compared with the one stored with the device's
+    latest snapshot. When they match, the snapshot is reused and the
+    capture recorded as unchanged; otherwise the full configuration is
+    pulled and saved with its new marker.
+
+    :device: Device name or IP address used as the snapshot key
+    :send_command: Function that runs a CLI command and returns its output
+    :store: SnapshotStore with the device history
+    =return: (running_config, fetched) where fetched is False when the
+             stored snapshot was reused
+    """
+    signal = config_signal(send_command)
+
+    if signal is not None and signal == store.latest_signal(device):
+        latest = store.latest(device)
+        if latest is not None:
+            store.touch(device)
+            logging.info(f'Running configuration of {device} unchanged since {signal}')
+            return latest[1], False
+
+    running_config = send_command('show running-config')
+    store.save(device, running_config, signal=signal)
+    return running_config, True
+
+
+def fetch_running_config_to_file(device, send_command, capture, store, output_file):
+    """
+    Write the running configuration to a file, pulling it only if it changed.
+
+    Same as fetch_running_config, but the configuration never has to fit
+    in memory: an unchanged snapshot is copied out of the store and a
+    changed one is streamed to the file by capture() and stored from there.
+
+    :device: Device name or IP address used as the snapshot key
+    :send_command: Function that runs a CLI command and returns its output
+    :capture: Function that streams the output of a command to a file
+    :store: SnapshotStore with the device history
+    :output_file: Path of the file to write
+    =return: True if the configuration was pulled, False if the stored
+             snapshot was reused
+    """
+    signal = config_signal(send_command)
+
+    if signal is not None and signal == store.latest_signal(device):
+        digest = store.latest_hash(device)
+        if digest is not None:
+            store.export(digest, output_file)
+            store.touch(device)
+            logging.info(f'Running configuration of {device} unchanged since {signal}')
+            return False
+
+    capture('show running-config', output_file)
+    store.save_file(device, output_file, signal=signal)
+    return True
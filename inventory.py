@@ -0,0 +1,300 @@
+import os
+import csv
+import json
+import hashlib
+import logging
+from collections import namedtuple
+
+from transports import TRANSPORTS
+
+Credentials = namedtuple('Credentials', ['username', 'password', 'enable_password'])
+
+# Device fields every inventory format can set; anything else ends up in attributes
+FIELDS = ('name', 'host', 'platform', 'transport', 'credentials', 'site', 'groups', 'tags')
+
+# Bump when the cached format changes, so old caches are not trusted
+CACHE_VERSION = 3
+
+
+class InventoryError(ValueError):
+    pass
+
+
+class Device(namedtuple('Device', FIELDS + ('attributes',))):
+    """
+    One inventory entry.
+
+    A namedtuple, so a cached inventory of 100k devices loads quickly.
+    Build entries with Device.create(), which fills in defaults.
+
+    :name: Unique device name, the host when not given
+    :host: IP address or DNS name to connect to
+    :platform: e.g. 'ios', 'iosxe'
+    :transport: Session transport name, see transports.TRANSPORTS
+    :credentials: Name of the credentials entry to log in with
+    :site: Site the device belongs to
+    :groups: Group names
+    :tags: Free-form tags
+    :attributes: Any other per-device fields from the inventory
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, name=None, host=None, platform='ios', transport=None, credentials=None, site=None,
+               groups=(), tags=(), **attributes):
+        if not host and not name:
+            raise InventoryError(f'Inventory entry without host or name: {attributes}')
+
+        # Caught here, not as a failed session half way through a fleet run
+        if transport is not None and transport not in TRANSPORTS:
+            raise InventoryError(f'Inventory entry {name or host}: unknown transport {transport!r}, '
+                                 f'expected one of {", ".join(TRANSPORTS)}')
+
+        return cls(str(name or host), str(host or name), platform, transport, credentials, site,
+                   tuple(_split(groups)), tuple(_split(tags)), attributes)
+
+    def as_dict(self):
+        data = {field: getattr(self, field) for field in FIELDS}
+        data.update(self.attributes)
+        return data
+
+
+def _split(value):
+    # Groups and tags come as lists (YAML/JSON) or as 'a;b' strings (CSV)
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.replace(',', ';').split(';') if item.strip()]
+    return [str(item) for item in value]
+
+
+class Inventory:
+    """
+    Set of devices with lookups by name, group, tag and site.
+
+    The group, tag and site indexes are built on first use, so loading a
+    large inventory only to iterate over it costs nothing extra.
+    """
+
+    def __init__(self, devices, credentials=None):
+        self.devices = list(devices)
+        self.credentials = credentials or {}
+        self._by_name = None
+        self._indexes = {}
+
+        names = set()
+        for device in self.devices:
+            if device.name in names:
+                raise InventoryError(f'Duplicate device name in inventory: {device.name}')
+            names.add(device.name)
+
+    def _index(self, field):
+        index = self._indexes.get(field)
+        if index is None:
+            index = {}
+            for device in self.devices:
+                values = getattr(device, field)
+                for value in values if isinstance(values, tuple) else (values,):
+                    index.setdefault(value, []).append(device)
+            self._indexes[field] = index
+        return index
+
+    def get(self, name):
+        if self._by_name is None:
+            self._by_name = {device.name: device for device in self.devices}
+        return self._by_name.get(name)
+
+    def filter(self, groups=None, tags=None, site=None, platform=None, **attributes):
+        """
+        Devices matching every given condition.
+
+        :groups: Group name or list of names, the device must be in one of them
+        :tags: Tag or list of tags, the device must have all of them
+        :site: Site name
+        :platform: Platform name
+        :attributes: Other fields that must be equal
+        =return: New Inventory with the matching devices
+        """
+        candidates = None
+
+        def narrow(devices):
+            nonlocal candidates
+            ids = {id(device) for device in devices}
+            candidates = ids if candidates is None else candidates & ids
+
+        if groups:
+            index = self._index('groups')
+            narrow([device for group in _split(groups) for device in index.get(group, [])])
+        for tag in _split(tags):
+            narrow(self._index('tags').get(tag, []))
+        if site is not None:
+            narrow(self._index('site').get(site, []))
+        if platform is not None:
+            narrow(self._index('platform').get(platform, []))
+
+        devices = [device for device in self.devices if candidates is None or id(device) in candidates]
+        for key, value in attributes.items():
+            devices = [device for device in devices
+                       if (getattr(device, key) if key in FIELDS else device.attributes.get(key)) == value]
+
+        return Inventory(devices, self.credentials)
+
+    def login(self, device):
+        """
+        Credentials of a device, from its credentials reference.
+
+        =return: Credentials, or None if the device has no usable reference
+        """
+        return self.credentials.get(device.credentials) or self.credentials.get('default')
+
+    def hosts(self):
+        return [device.host for device in self.devices]
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __len__(self):
+        return len(self.devices)
+
+
+def _yaml_load(f):
+    import yaml
+    # The C loader is several times faster on big inventories when libyaml is there
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    return yaml.load(f, Loader=loader)
+
+
+def _records(path):
+    """
+    Read the raw device records and the group definitions of an inventory file.
+
+    =return: (list of dicts, dict of group name -> attributes, defaults dict)
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    with open(path, 'r', newline='') as f:
+        if extension in ('.yaml', '.yml'):
+            data = _yaml_load(f)
+        elif extension == '.json':
+            data = json.load(f)
+        elif extension == '.csv':
+            rows = [{key: value for key, value in row.items() if value not in (None, '')} for row in csv.DictReader(f)]
+            return rows, {}, {}
+        else:
+            # Plain list of IP addresses, one per line, like devices-15.txt
+            hosts = [line.strip() for line in f]
+            return [{'host': host} for host in hosts if host and not host.startswith('#')], {}, {}
+
+    if isinstance(data, list):
+        return data, {}, {}
+    if not isinstance(data, dict):
+        raise InventoryError(f'{path}: expected a list of devices or a mapping with a devices list')
+    return data.get('devices') or [], data.get('groups') or {}, data.get('defaults') or {}
+
+
+def _build(records, groups, defaults):
+    devices = []
+    for record in records:
+        if isinstance(record, str):
+            record = {'host': record}
+
+        # Defaults, then group attributes in listed order, then the device's own fields
+        merged = dict(defaults)
+        for group in _split(record.get('groups')):
+            merged.update({key: value for key, value in (groups.get(group) or {}).items() if key != 'groups'})
+        merged.update(record)
+
+        devices.append(Device.create(**merged))
+    return devices
+
+
+def _cache_path(path, cache_dir):
+    key = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{key}.json')
+
+
+def _read_cache(cache_path, stamp):
+    # Plain JSON rows, so a cache file planted in the directory can hold data but never code
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        if cached.get('stamp') != list(stamp):
+            return None
+        return [Device(*row[:6], tuple(row[6]), tuple(row[7]), row[8]) for row in cached['devices']]
+    except (OSError, ValueError, TypeError, KeyError, IndexError, AttributeError):
+        return None
+
+
+def load_inventory(path, credentials=None, cache_dir='.inventory_cache'):
+    """
+    Load an inventory from a YAML, JSON, CSV or plain IP list file.
+
+    YAML and JSON files hold a list of devices, or a mapping with
+    'devices', optional 'groups' (name -> shared attributes) and
+    'defaults'. CSV files have one device per row with a header; groups
+    and tags are ';'-separated. Any other file is a list of hosts, one per
+    line.
+
+    The parsed devices are cached as JSON in cache_dir, keyed by the
+    file's path, size and modification time, so reloading an unchanged
+    100k-device inventory skips parsing.
+
+    :path: Inventory file
+    :credentials: Credentials file (see load_credentials) or dict
+    :cache_dir: Directory for the parsed cache, None to disable it
+    =return: Inventory
+    """
+    stat = os.stat(path)
+    stamp = (CACHE_VERSION, stat.st_size, stat.st_mtime_ns)
+    devices = None
+
+    if cache_dir:
+        cache_path = _cache_path(path, cache_dir)
+        devices = _read_cache(cache_path, stamp)
+
+    if devices is None:
+        devices = _build(*_records(path))
+
+        if cache_dir:
+            temp_path = f'{cache_path}.{os.getpid()}.tmp'
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(temp_path, 'w') as f:
+                    json.dump({'stamp': stamp, 'devices': devices}, f, separators=(',', ':'))
+                os.replace(temp_path, cache_path)
+            except (OSError, TypeError, ValueError) as e:
+                # Attribute values JSON cannot hold (e.g. YAML dates) leave the inventory uncached
+                logging.error(f'Failed to cache inventory {path}: {e}')
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    if credentials is not None and not isinstance(credentials, dict):
+        credentials = load_credentials(credentials)
+
+    return Inventory(devices, credentials)
+
+
+def load_credentials(path):
+    """
+    Load named credentials from a YAML or JSON file.
+
+    The file maps a name to username, password and enable_password. A
+    value written as '$NAME' is read from the environment variable NAME,
+    so the file itself can stay free of secrets.
+
+    =return: dict of name -> Credentials
+    """
+    with open(path, 'r') as f:
+        data = _yaml_load(f) if path.endswith(('.yaml', '.yml')) else json.load(f)
+
+    def value(text):
+        if isinstance(text, str) and text.startswith('$'):
+            return os.environ.get(text[1:])
+        return text
+
+    return {
+        name: Credentials(value(entry.get('username')), value(entry.get('password')),
+                          value(entry.get('enable_password')))
+        for name, entry in (data or {}).items()
+    }
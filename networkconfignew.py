@@ -1,90 +1,256 @@
+import time
 import pexpect
 import logging
 import getpass
-import difflib
+
+from batch_push import push_config
+from command_cache import CommandCache
+from config_diff import diff_configs
+from config_parser import IOSConfig
+from deferred_save import DeferredSave, is_save_command
+from incremental_fetch import fetch_running_config_to_file
+from prompts import HOSTNAME_PATTERNS, prompt_profile
+from retry import AUTH, EOF, TIMEOUT, UNREACHABLE, classify, classify_output
+from stream_reader import capture_to_file, iter_file_lines
+from transports import get_transport
 
 class NetworkDeviceConfigurator:
-    def __init__(self, ip, username, password, enable_password):
+    def __init__(self, ip, username, password, enable_password, history=None, transport=None, cache_ttl=60,
+                 governor=None, site=None):
         self.ip = ip
         self.username = username
         self.password = password
         self.enable_password = enable_password
+        self.history = history
+        self.transport = get_transport(transport)
+        self.cache = CommandCache(cache_ttl)
         self.session = None
+        self.prompts = None
+        self.running_config_file = None
+        self.saves = DeferredSave(self._write_memory, ip)
+        self.governor = governor
+        self.site = site
+        self.slot = None
+        self.failure = None
+
+    def _expect(self, patterns, step, timeout=20):
+        # Use a deadline learned from this device's response history when there is one
+        if self.history is not None:
+            timeout = self.history.timeout(self.ip, step, default=timeout)
+
+        started = time.monotonic()
+        result = self.session.expect_list(patterns, timeout=timeout)
+
+        if result == 0 and self.history is not None:
+            self.history.record(self.ip, step, time.monotonic() - started, len(self.session.before))
+
+        return result
+
+    def _login_failed(self, patterns, result, message):
+        # Remember why, so a retry scheduler can tell a flaky device from a wrong password
+        condition = patterns[result]
+        default = TIMEOUT if condition is pexpect.TIMEOUT else EOF if condition is pexpect.EOF else AUTH
+        self.failure = classify_output(self.session.before, default)
+
+        logging.error(f'{message} ({self.failure})')
+        return False
 
     def connect(self):
+        self.failure = None
         try:
-            # Establish an SSH session
-            self.session = pexpect.spawn(f'ssh {self.username}@{self.ip}', encoding='utf-8', timeout=20)
-            result = self.session.expect(['Password:', pexpect.TIMEOUT, pexpect.EOF])
-
-            if result != 0:
-                logging.error(f'Failed to create an SSH session for {self.ip}')
+            # Establish an SSH session through the selected transport
+            timeout = 20
+            if self.history is not None:
+                timeout = self.history.timeout(self.ip, f'login {self.transport.name}', default=timeout)
+
+            # Queue for a session slot and a login token rather than overload the device or AAA
+            if self.governor is not None:
+                if self.slot is None:
+                    self.slot = self.governor.acquire(self.ip, self.site)
+                self.governor.login()
+
+            started = time.monotonic()
+            self.session = self.transport.open(self.ip, self.username, self.password, timeout)
+
+            # Refused credentials raise SessionFailure(AUTH), None means the device was not reached
+            if self.session is None:
+                self.failure = UNREACHABLE
                 return False
 
-            self.session.sendline(self.password)
-            result = self.session.expect(['>', pexpect.TIMEOUT, pexpect.EOF])
+            if self.history is not None:
+                self.history.record(self.ip, f'login {self.transport.name}', time.monotonic() - started)
+
+            result = self._expect(HOSTNAME_PATTERNS, 'password')
 
             if result != 0:
-                logging.error(f'Failed to enter the password for {self.ip}')
-                return False
+                return self._login_failed(HOSTNAME_PATTERNS, result, f'Failed to enter the password for {self.ip}')
+
+            # Learn the exact prompt of this device once and reuse it from now on
+            self.prompts = prompt_profile(self.session.match.group(1))
+
+            # Accounts with privilege 15 land straight in enable mode
+            if self.session.match.group(2) == '#':
+                return self._disable_paging()
 
             self.session.sendline('enable')
-            result = self.session.expect(['Password:', pexpect.TIMEOUT, pexpect.EOF])
+            result = self._expect(self.prompts.password_patterns, 'enable')
 
             if result != 0:
-                logging.error(f'Failed to enter enable mode for {self.ip}')
-                return False
+                return self._login_failed(self.prompts.password_patterns, result,
+                                          f'Failed to enter enable mode for {self.ip}')
 
             self.session.sendline(self.enable_password)
-            result = self.session.expect(['#', pexpect.TIMEOUT, pexpect.EOF])
+            result = self._expect(self.prompts.enable_patterns, 'enable password')
 
             if result != 0:
-                logging.error(f'Failed to enter enable mode after sending the password for {self.ip}')
-                return False
+                return self._login_failed(self.prompts.enable_patterns, result,
+                                          f'Failed to enter enable mode after sending the password for {self.ip}')
 
-            return True
+            return self._disable_paging()
         except Exception as e:
+            self.failure = classify(e)
             logging.error(f"Failed to establish an SSH connection: {e}")
             return False
 
-    def configure_hostname(self, new_hostname):
+    def _disable_paging(self):
+        # Long outputs would otherwise stop at every --More--
+        self.session.sendline('terminal length 0')
+        result = self._expect(self.prompts.enable_patterns, 'terminal length 0')
+
+        if result != 0:
+            return self._login_failed(self.prompts.enable_patterns, result, f'Failed to disable paging for {self.ip}')
+
+        return True
+
+    def push_config(self, commands, timeout=30):
+        # Whatever was read before the change is stale now, even if the push fails half way
+        self.cache.invalidate()
+        self.running_config_file = None
+        self.saves.changed()
+
         try:
-            self.session.sendline('configure terminal')
-            result = self.session.expect([r'\(config\)#', pexpect.TIMEOUT, pexpect.EOF])
+            if self.history is not None:
+                timeout = self.history.timeout(self.ip, 'push', default=timeout)
 
-            if result != 0:
-                logging.error(f'Failed to enter config mode for {self.ip}')
-                return False
+            # One write for the whole change set, then one wait for the exec prompt
+            started = time.monotonic()
+            errors = push_config(self.session, commands, timeout)
 
-            self.session.sendline(f'hostname {new_hostname}')
-            result = self.session.expect([fr'{new_hostname}\(config\)#', pexpect.TIMEOUT, pexpect.EOF])
+            if self.history is not None:
+                self.history.record(self.ip, 'push', time.monotonic() - started, len(self.session.before))
 
-            if result != 0:
-                logging.error(f'Failed to set the hostname for {self.ip}')
-                return False
+            # The change set may have renamed the device, so relearn the prompt
+            self.prompts = prompt_profile(self.session.after.strip()[:-1])
 
-            self.session.sendline('exit')
-            self.session.sendline('exit')
+            if errors:
+                logging.error(f'{len(errors)} configuration command(s) rejected by {self.ip}')
+                return False
 
             return True
         except Exception as e:
             logging.error(f"Configuration failed: {e}")
             return False
 
-    def save_running_config(self, output_file):
+    def configure_hostname(self, new_hostname):
+        return self.push_config([f'hostname {new_hostname}'])
+
+    def send_command(self, command, timeout=30):
+        # A save is only noted here and written once, at flush() or disconnect()
+        if is_save_command(command):
+            self.saves.request()
+            return ''
+
+        # Show commands repeated within the cache TTL cost no round-trip
+        return self.cache.fetch(command, lambda command: self._send_command(command, timeout))
+
+    def _send_command(self, command, timeout=30):
+        self.session.sendline(command)
+        result = self._expect(self.prompts.enable_patterns, command, timeout)
+
+        if result != 0:
+            raise pexpect.TIMEOUT(f'No prompt after {command!r} from {self.ip}')
+
+        # Drop the echoed command from the output; with no output at all only the echo is left
+        return self.session.before.partition('\n')[2]
+
+    def _write_memory(self):
+        output = self._send_command('write memory', 60)
+
+        if '[OK]' not in output:
+            raise RuntimeError(f'write memory failed on {self.ip}: {output.strip()}')
+
+    def save(self):
+        # Request a save; every request in this session is coalesced into one write memory
+        self.saves.request()
+
+    def flush(self, force=False):
+        # Write memory now if anything changed since the last save, for steps that need it durable
         try:
-            self.session.sendline('show running-config')
-            result = self.session.expect(['#', pexpect.TIMEOUT, pexpect.EOF], timeout=30)
+            self.saves.flush(force)
+            return True
+        except Exception as e:
+            logging.error(f"Failed to save the configuration: {e}")
+            return False
 
-            if result != 0:
-                logging.error(f'Failed to capture the running configuration for {self.ip}')
-                return False
+    def collect(self, commands, timeout=30):
+        # Run show commands side by side on exec channels when the transport shares one
+        # connection per device, otherwise one after another on this session
+        outputs = {command: self.cache.get(command) for command in commands}
+        missing = [command for command, output in outputs.items() if output is None]
+
+        if missing and hasattr(self.transport, 'exec_commands'):
+            generation = self.cache.generation
+            fetched = self.transport.exec_commands(self.ip, self.username, self.password, missing, timeout)
+            for command, output in fetched.items():
+                if output is not None:
+                    self.cache.put(command, output, generation)
+            outputs.update(fetched)
+        else:
+            for command in missing:
+                outputs[command] = self.send_command(command, timeout)
+
+        return outputs
+
+    def sibling(self):
+        # Second configurator for the same device; on a multiplexing transport its
+        # connect() only opens another channel, without a new key exchange or login
+        # It runs under this session's governor slot: a caller holding one slot while waiting
+        # for a second on the same device or a full global pool would wait on itself
+        configurator = NetworkDeviceConfigurator(self.ip, self.username, self.password, self.enable_password,
+                                                 self.history, self.transport, site=self.site)
+
+        # Share the cache, so a push through either one invalidates reads made by both
+        configurator.cache = self.cache
+        return configurator
+
+    def capture(self, command, output_file, timeout=30):
+        # Stream the output straight to disk, however large it is
+        if self.history is not None:
+            timeout = self.history.timeout(self.ip, command, default=timeout)
+
+        started = time.monotonic()
+        written = capture_to_file(self.session, command, self.prompts.line_prompt, output_file, timeout)
+
+        if self.history is not None:
+            self.history.record(self.ip, command, time.monotonic() - started, written)
 
-            running_config = self.session.before  # Get the output before the prompt
+        return written
 
-            with open(output_file, 'w') as f:
-                f.write(running_config)
+    def running_config(self):
+        # Parse the saved capture line by line from disk, or ask the device
+        if self.running_config_file is not None:
+            return IOSConfig(iter_file_lines(self.running_config_file))
+        return IOSConfig(self.send_command('show running-config'))
 
+    def save_running_config(self, output_file, store=None):
+        try:
+            if store is not None:
+                # Only pull the full configuration when the device reports a change
+                fetch_running_config_to_file(self.ip, self.send_command, self.capture, store, output_file)
+            else:
+                self.capture('show running-config', output_file)
+
+            self.running_config_file = output_file
             return True
         except Exception as e:
             logging.error(f"Failed to save the running configuration: {e}")
@@ -94,12 +260,19 @@ class NetworkDeviceConfigurator:
         try:
             # Increase the timeout for the expect call
             self.session.sendline('show startup')
-            result = self.session.expect(['Password:', '#', pexpect.TIMEOUT, pexpect.EOF], timeout=60)
+            if self.history is not None:
+                timeout = self.history.timeout(self.ip, 'show startup', default=60)
+            else:
+                timeout = 60
+            result = self.session.expect_list(self.prompts.password_or_enable_patterns, timeout=timeout)
 
             if result == 0:
                 # Send the enable password if prompted
                 self.session.sendline(self.enable_password)
-                result = self.session.expect(['#', pexpect.TIMEOUT, pexpect.EOF], timeout=10)
+                result = self._expect(self.prompts.enable_patterns, 'show startup', 10)
+            elif result == 1:
+                # Got the prompt straight away
+                result = 0
 
             if result != 0:
                 logging.error(f'Failed to capture the startup configuration for {self.ip}')
@@ -115,9 +288,8 @@ class NetworkDeviceConfigurator:
             print(f'--- Prompt for {self.ip}:')
             print(self.session.after)
 
-            # You can now compare the running and startup configurations
-            diff = difflib.unified_diff(self.session.before.splitlines(), startup_config.splitlines())
-            diff_str = '\n'.join(diff)
+            # Compare the parsed running and startup configurations block by block
+            diff_str = str(diff_configs(self.running_config(), startup_config))
 
             print(f'--- Differences between running and startup configurations for {self.ip}:')
             print(diff_str)
@@ -129,12 +301,9 @@ class NetworkDeviceConfigurator:
 
     def compare_local_config(self, local_config_path):
         try:
-            with open(local_config_path, 'r') as f:
-                local_config = f.read()
-
-            # You can now compare the running and local configurations
-            diff = difflib.unified_diff(self.session.before.splitlines(), local_config.splitlines())
-            diff_str = '\n'.join(diff)
+            # Both sides are parsed straight from memory-mapped files, without full text copies
+            local_config = IOSConfig(iter_file_lines(local_config_path))
+            diff_str = str(diff_configs(self.running_config(), local_config))
 
             print(f'--- Differences between running and local configurations for {self.ip}:')
             print(diff_str)
@@ -146,9 +315,16 @@ class NetworkDeviceConfigurator:
 
     def disconnect(self):
         if self.session:
+            if self.saves.pending:
+                self.flush()
             self.session.close()
             self.session = None
 
+        # The vty line is free again, even if the login never finished
+        if self.slot is not None:
+            self.governor.release(self.slot)
+            self.slot = None
+
 if __name__ == "__main__":
     # Initialize logging for error tracking
     logging.basicConfig(filename='network_device_configurator.log', level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
@@ -0,0 +1,58 @@
+import re
+from functools import lru_cache
+
+import pexpect
+
+# Patterns used before the hostname is known
+PASSWORD_PROMPT = re.compile(r'[Pp]assword:')
+USERNAME_PROMPT = re.compile(r'[Uu]sername:')
+NEW_HOST_KEY = re.compile(r'Are you sure you want to continue connecting')
+LOGIN_PROMPT = re.compile(r'[\r\n]([\w.-]+)([>#])')
+
+# Answers to a wrong password: an error, or the login prompts again
+LOGIN_REFUSED = re.compile(r'% ?(Authentication failed|Login invalid|Bad passwords?|Access denied)|'
+                           r'Permission denied|[Uu]sername:|[Pp]assword:')
+
+# Pattern lists for the login steps, shared by every session
+LOGIN_PATTERNS = [PASSWORD_PROMPT, pexpect.TIMEOUT, pexpect.EOF]
+HOSTNAME_PATTERNS = [LOGIN_PROMPT, LOGIN_REFUSED, pexpect.TIMEOUT, pexpect.EOF]
+
+
+class PromptProfile:
+    """
+    Compiled prompt patterns for one device hostname.
+
+    Every pattern is anchored to the start of a line and to the exact
+    hostname, so a '#' or '>' inside command output never ends a read early.
+    The pexpect pattern lists are built once and reused for every expect.
+    """
+
+    def __init__(self, hostname):
+        self.hostname = hostname
+        name = re.escape(hostname)
+
+        self.exec_prompt = re.compile(rf'[\r\n]{name}>')
+        self.enable_prompt = re.compile(rf'[\r\n]{name}#')
+        self.config_prompt = re.compile(rf'[\r\n]{name}\(config[\w.-]*\)#')
+        self.any_prompt = re.compile(rf'[\r\n]{name}(\([\w.-]+\))?[>#]')
+
+        # Same prompts for line-based readers that look at the last line only
+        self.line_prompt = re.compile(rf'^{name}(\([\w.-]+\))?[>#]\s*$')
+
+        # Ready-made pattern lists for pexpect's expect_list()
+        self.exec_patterns = [self.exec_prompt, pexpect.TIMEOUT, pexpect.EOF]
+        self.enable_patterns = [self.enable_prompt, pexpect.TIMEOUT, pexpect.EOF]
+        self.config_patterns = [self.config_prompt, pexpect.TIMEOUT, pexpect.EOF]
+        self.password_patterns = [PASSWORD_PROMPT, pexpect.TIMEOUT, pexpect.EOF]
+        self.password_or_enable_patterns = [PASSWORD_PROMPT, self.enable_prompt, pexpect.TIMEOUT, pexpect.EOF]
+
+
+@lru_cache(maxsize=None)
+def prompt_profile(hostname):
+    """
+    Get the prompt profile of a hostname, compiling it on first use.
+
+    :hostname: Device hostname as shown in its prompt
+    =return: PromptProfile shared by every session to that hostname
+    """
+    return PromptProfile(hostname)
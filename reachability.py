@@ -0,0 +1,121 @@
+import time
+import errno
+import socket
+import logging
+import selectors
+
+# Management ports checked before any session is spawned
+SSH_PORT = 22
+TELNET_PORT = 23
+
+
+def _resolve(host, port):
+    try:
+        family, _, _, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+        return family, address
+    except (socket.gaierror, OSError) as e:
+        logging.error(f'Failed to resolve {host}: {e}')
+        return None
+
+
+def sweep(hosts, ports=(SSH_PORT, TELNET_PORT), timeout=2.0, max_open=512):
+    """
+    Check which hosts accept TCP connections on the given ports.
+
+    Every connect is started non-blocking and the whole inventory is
+    watched by one selector, so the sweep takes about one timeout per
+    max_open probes instead of one timeout per unreachable host.
+
+    :hosts: Device IP addresses or names
+    :ports: TCP ports to probe on every host
+    :timeout: Seconds to wait for each connect
+    :max_open: Most sockets to keep open at once
+    =return: dict of host -> {port: True/False}
+    """
+    results = {host: {port: False for port in ports} for host in hosts}
+    probes = iter([(host, port) for host in results for port in ports])
+    selector = selectors.DefaultSelector()
+    resolved = {}
+    open_count = 0
+
+    def start(host, port):
+        # Resolve each host once, not once per port
+        if host not in resolved:
+            resolved[host] = _resolve(host, port)
+        if resolved[host] is None:
+            return False
+
+        family, address = resolved[host]
+        address = (address[0], port) + tuple(address[2:])
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        code = sock.connect_ex(address)
+
+        if code == 0:
+            results[host][port] = True
+            sock.close()
+            return False
+        if code not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+            sock.close()
+            return False
+
+        selector.register(sock, selectors.EVENT_WRITE, (host, port, time.monotonic() + timeout))
+        return True
+
+    def finish(key):
+        selector.unregister(key.fileobj)
+        key.fileobj.close()
+
+    try:
+        exhausted = False
+        while True:
+            # Keep up to max_open connects in flight
+            while not exhausted and open_count < max_open:
+                probe = next(probes, None)
+                if probe is None:
+                    exhausted = True
+                    break
+                if start(*probe):
+                    open_count += 1
+
+            if open_count == 0:
+                break
+
+            keys = selector.get_map().values()
+            wait = max(0, min(deadline for _, _, deadline in (key.data for key in keys)) - time.monotonic())
+
+            for key, _ in selector.select(wait):
+                host, port, _ = key.data
+                results[host][port] = key.fileobj.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0
+                finish(key)
+                open_count -= 1
+
+            # Drop connects that ran out of time
+            now = time.monotonic()
+            for key in list(selector.get_map().values()):
+                if key.data[2] <= now:
+                    finish(key)
+                    open_count -= 1
+    finally:
+        for key in list(selector.get_map().values()):
+            finish(key)
+        selector.close()
+
+    return results
+
+
+def live_hosts(hosts, port=SSH_PORT, **kwargs):
+    """
+    Filter an inventory down to the hosts that answer on a port.
+
+    :hosts: Device IP addresses or names
+    :port: TCP port the session layer will use
+    =return: List of reachable hosts, in inventory order
+    """
+    results = sweep(hosts, ports=(port,), **kwargs)
+    unreachable = [host for host in hosts if not results[host][port]]
+
+    for host in unreachable:
+        logging.error(f'{host} is not reachable on TCP/{port}, skipping')
+
+    return [host for host in hosts if results[host][port]]
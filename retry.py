@@ -0,0 +1,162 @@
+import re
+import time
+import heapq
+import random
+import logging
+import itertools
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pexpect
+
+# Why a session failed
+TIMEOUT = 'timeout'
+EOF = 'eof'
+AUTH = 'auth'
+VTY_FULL = 'vty_full'
+UNREACHABLE = 'unreachable'
+ERROR = 'error'
+
+# Failures that may go away on their own; a refused login is never retried, it would lock the account
+RETRYABLE = frozenset((TIMEOUT, EOF, VTY_FULL, UNREACHABLE))
+
+# What devices and clients print for each kind of failure, checked in order
+FAILURE_PATTERNS = [
+    (AUTH, re.compile(r'% ?(Authentication failed|Login invalid|Bad passwords?|Access denied)|Permission denied')),
+    (VTY_FULL, re.compile(r'(kex|ssh)_exchange_identification|Connection (closed|reset) by|'
+                          r'[Nn]o (free|available) (vty|lines)|vty lines? .*(busy|in use)')),
+]
+
+# Final result of one task: result is None and failure set when it failed for good
+Outcome = namedtuple('Outcome', ['key', 'result', 'failure', 'error', 'attempts'])
+
+
+class SessionFailure(Exception):
+    """
+    A session step failed in a known way.
+
+    :kind: One of TIMEOUT, EOF, AUTH, VTY_FULL, UNREACHABLE or ERROR
+    :detail: Anything the caller wants back when the task fails for good
+    """
+
+    def __init__(self, kind, message=None, detail=None):
+        self.kind = kind
+        self.detail = detail
+        super().__init__(message or kind)
+
+
+def classify_output(text, default=ERROR):
+    """
+    Kind of failure shown in what the device or the client printed.
+
+    =return: Failure kind, default when nothing matches
+    """
+    for kind, pattern in FAILURE_PATTERNS:
+        if text and pattern.search(text):
+            return kind
+    return default
+
+
+def classify(error):
+    """
+    Kind of failure behind an exception.
+
+    =return: Failure kind
+    """
+    if isinstance(error, SessionFailure):
+        return error.kind
+
+    # pexpect and socket errors carry the last output, which says more than the exception type
+    kind = classify_output(str(error), None)
+    if kind is not None:
+        return kind
+
+    if isinstance(error, (pexpect.TIMEOUT, TimeoutError)):
+        return TIMEOUT
+    if isinstance(error, (pexpect.EOF, EOFError, ConnectionResetError, BrokenPipeError, ConnectionAbortedError)):
+        return EOF
+    if isinstance(error, ConnectionRefusedError):
+        # IOS refuses telnet connections when every vty line is taken
+        return VTY_FULL
+    if isinstance(error, OSError):
+        return UNREACHABLE
+    return ERROR
+
+
+def backoff(attempt, base_delay=2.0, max_delay=60.0, jitter=0.5):
+    """
+    Delay before the next try of a task that failed attempt times.
+
+    Doubles with every attempt up to max_delay. The jitter takes up to
+    that fraction off at random, so devices that failed together do not
+    all come back at the same moment.
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    return delay * (1 - jitter * random.random())
+
+
+class RetryScheduler:
+    """
+    Run tasks on a thread pool and retry the ones that fail transiently.
+
+    A task that raises is classified; a retryable failure puts it back in
+    the queue after an exponential backoff with jitter, anything else ends
+    it. Waiting tasks hold no worker, so the rest of the batch keeps
+    running while a flaky device backs off, and no single failure stops the
+    batch.
+    """
+
+    def __init__(self, max_workers=32, max_attempts=4, base_delay=2.0, max_delay=60.0, jitter=0.5,
+                 retryable=RETRYABLE):
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retryable = retryable
+        self.retries = 0
+
+    def run(self, tasks):
+        """
+        Run every task until it succeeds, fails for good or runs out of attempts.
+
+        :tasks: Iterable of (key, callable) pairs, the callable takes no arguments
+        =return: Generator of Outcome, in completion order
+        """
+        order = itertools.count()
+        delayed = []
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for key, task in tasks:
+                running[executor.submit(task)] = (key, task, 1)
+
+            while running or delayed:
+                # Start the tasks whose backoff is over
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    _, _, key, task, attempt = heapq.heappop(delayed)
+                    running[executor.submit(task)] = (key, task, attempt)
+
+                timeout = max(0, delayed[0][0] - now) if delayed else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    key, task, attempt = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        error = e
+                    else:
+                        yield Outcome(key, result, None, None, attempt)
+                        continue
+
+                    kind = classify(error)
+                    if kind in self.retryable and attempt < self.max_attempts:
+                        delay = backoff(attempt, self.base_delay, self.max_delay, self.jitter)
+                        logging.info(f'{key}: {kind} on attempt {attempt}, retrying in {delay:.1f}s')
+                        heapq.heappush(delayed, (time.monotonic() + delay, next(order), key, task, attempt + 1))
+                        self.retries += 1
+                    else:
+                        logging.error(f'{key}: {kind} on attempt {attempt}, giving up: {error}')
+                        yield Outcome(key, None, kind, error, attempt)
@@ -0,0 +1,330 @@
+#!/usr/bin/python3
+
+"""
+Roll a configuration change out to many devices in waves.
+
+The change goes to a small canary wave first and is verified on every
+device with post-change show commands. Only when the wave passes is it
+saved with 'write memory' and the next, larger wave started. When a wave
+fails more devices than allowed, every device changed so far is rolled
+back in parallel to the running configuration captured just before the
+change.
+
+Usage:
+    python3 rollout.py devices.yaml acl_change.txt \\
+        --check 'show ip access-lists MY_ACL' 'permit 192.168.56.0'
+"""
+
+import re
+import sys
+import time
+import getpass
+import logging
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from config_diff import diff_configs
+from governor import Governor
+from inventory import load_inventory
+from networkconfignew import NetworkDeviceConfigurator
+
+# Post-change verification: the output of command must (or must not) match pattern
+Check = namedtuple('Check', ['command', 'pattern', 'present'])
+Check.__new__.__defaults__ = (True,)
+
+# Default wave sizes: one canary device, then 10%, 30% and the rest of the fleet
+DEFAULT_WAVES = (1, 0.1, 0.3, 1.0)
+
+
+def plan_waves(devices, waves=DEFAULT_WAVES):
+    """
+    Split devices into waves.
+
+    :devices: Devices in rollout order
+    :waves: Cumulative wave sizes, ints are device counts and floats
+            fractions of the fleet; the last wave always takes the rest
+    =return: List of lists of devices
+    """
+    total = len(devices)
+    planned = []
+    start = 0
+
+    for size in waves:
+        end = size if isinstance(size, int) else int(round(size * total))
+        end = min(total, max(end, start + 1))
+        if start < end:
+            planned.append(devices[start:end])
+            start = end
+
+    if start < total:
+        planned.append(devices[start:])
+    return planned
+
+
+class Rollout:
+    """
+    Canary-first rollout of one change set with automatic rollback.
+
+    Every device in a wave is handled concurrently: capture the running
+    configuration, push the change in one batch, then run the checks.
+    The wave passes when its failures stay within max_failure_rate (the
+    canary wave tolerates none); its devices are then saved. Otherwise
+    the rollout stops and all changed devices, from this and earlier
+    waves, are rolled back in parallel to their captured configuration.
+    """
+
+    def __init__(self, devices, commands, checks=(), waves=DEFAULT_WAVES, max_failure_rate=0.05,
+                 max_workers=32, history=None, transport=None, store=None, governor=None):
+        self.devices = devices
+        self.commands = commands
+        self.checks = [check if isinstance(check, Check) else Check(*check) for check in checks]
+        self.waves = plan_waves(devices, waves)
+        self.max_failure_rate = max_failure_rate
+        self.max_workers = max_workers
+        self.history = history
+        self.transport = transport
+        self.store = store
+        self.governor = governor
+        self.snapshots = {}
+        self.results = {}
+        self._lock = threading.Lock()
+
+    def _configurator(self, device):
+        return NetworkDeviceConfigurator(device['ip'], device['username'], device['password'],
+                                         device['enable_password'], self.history,
+                                         device.get('transport') or self.transport, governor=self.governor,
+                                         site=device.get('site'))
+
+    def _result(self, device, wave, **fields):
+        with self._lock:
+            result = self.results.setdefault(device['ip'], {'ip': device['ip'], 'wave': wave, 'status': None,
+                                                            'error': None, 'saved': False})
+            result.update(fields)
+            return result
+
+    def verify(self, configurator):
+        """
+        Run the post-change checks on a device.
+
+        =return: None when every check passes, otherwise the first failure
+        """
+        for check in self.checks:
+            output = configurator.send_command(check.command)
+            found = re.search(check.pattern, output) is not None
+            if found != check.present:
+                expected = 'missing' if check.present else 'unexpected'
+                return f'{check.command!r}: {expected} {check.pattern!r}'
+        return None
+
+    def change_device(self, device, wave):
+        """
+        Capture, change and verify one device.
+
+        The session is closed before returning, so it gives back its
+        governor slot: a wave larger than the session cap would otherwise
+        wait forever on its own open sessions. Saving and rolling back log
+        in again.
+
+        =return: True when the device was captured and may have been changed
+        """
+        configurator = self._configurator(device)
+
+        try:
+            if not configurator.connect():
+                self._result(device, wave, status='failed', error='connect failed')
+                return False
+
+            snapshot = configurator.send_command('show running-config')
+            with self._lock:
+                self.snapshots[device['ip']] = snapshot
+            if self.store is not None:
+                self.store.save(device['ip'], snapshot)
+
+            if not configurator.push_config(self.commands):
+                self._result(device, wave, status='failed', error='change rejected')
+                return True
+
+            error = self.verify(configurator)
+            if error:
+                self._result(device, wave, status='failed', error=f'check failed: {error}')
+            else:
+                self._result(device, wave, status='changed')
+            return True
+        except Exception as e:
+            logging.error(f'Rollout failed on {device["ip"]}: {e}')
+            self._result(device, wave, status='failed', error=str(e))
+
+            # Once captured, the device may have been changed and needs a rollback
+            return device['ip'] in self.snapshots
+        finally:
+            configurator.disconnect()
+
+    def rollback_device(self, device):
+        """
+        Put a device back to the running configuration captured before the change.
+
+        =return: True when the device matches its snapshot again
+        """
+        ip = device['ip']
+        snapshot = self.snapshots.get(ip)
+        if snapshot is None:
+            return True
+
+        configurator = self._configurator(device)
+        try:
+            if not configurator.connect():
+                self._result(device, None, status='rollback_failed', error='connect failed')
+                return False
+
+            # ACLs and route-maps whose order changed are rebuilt as a whole from the snapshot
+            undo = diff_configs(configurator.send_command('show running-config'), snapshot).commands()
+            if undo:
+                configurator.push_config(undo)
+
+            remaining = diff_configs(configurator.send_command('show running-config'), snapshot)
+            if remaining:
+                self._result(device, None, status='rollback_failed',
+                             error=f'{len(remaining.lines())} line(s) still differ after rollback')
+                return False
+
+            # Devices saved in an earlier wave would boot into the change otherwise
+            if self.results.get(ip, {}).get('saved') and not configurator.flush(force=True):
+                self._result(device, None, status='rollback_failed', error='write memory failed')
+                return False
+
+            self._result(device, None, status='rolled_back')
+            return True
+        except Exception as e:
+            logging.error(f'Rollback failed on {ip}: {e}')
+            self._result(device, None, status='rollback_failed', error=str(e))
+            return False
+        finally:
+            configurator.disconnect()
+
+    def _save(self, device):
+        # Saved right away, the next wave only starts once this one survives a reload
+        configurator = self._configurator(device)
+        try:
+            if not configurator.connect():
+                self._result(device, None, status='failed', error='connect failed before write memory')
+            # The change was made by the earlier session, so this one has nothing marked to save
+            elif configurator.flush(force=True):
+                self._result(device, None, saved=True)
+            else:
+                self._result(device, None, status='failed', error='write memory failed')
+        finally:
+            configurator.disconnect()
+
+    def run(self):
+        """
+        Roll the change out wave by wave.
+
+        =return: Report dict with the outcome of every device
+        """
+        started = time.monotonic()
+        changed = []
+        aborted_wave = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for number, wave in enumerate(self.waves):
+                captured = list(executor.map(lambda device: self.change_device(device, number), wave))
+                touched = [device for device, was_captured in zip(wave, captured) if was_captured]
+                changed.extend(touched)
+
+                failed = sum(1 for device in wave if self.results[device['ip']]['status'] == 'failed')
+                allowed = 0 if number == 0 else int(self.max_failure_rate * len(wave))
+                logging.info(f'Rollout wave {number + 1}/{len(self.waves)}: {len(wave) - failed} changed, '
+                             f'{failed} failed')
+
+                if failed > allowed:
+                    aborted_wave = number
+                    logging.error(f'Rollout wave {number + 1} failed on {failed} of {len(wave)} devices, '
+                                  f'rolling back {len(changed)} devices')
+                    list(executor.map(self.rollback_device, changed))
+                    break
+
+                # The wave passed: keep the change across reloads, failed devices are undone
+                list(executor.map(lambda device: self._save(device) if self.results[device['ip']]['status'] == 'changed'
+                                  else self.rollback_device(device), touched))
+
+        return self.report(time.monotonic() - started, aborted_wave)
+
+    def report(self, elapsed, aborted_wave=None):
+        results = sorted(self.results.values(), key=lambda result: result['ip'])
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+
+        return {
+            'aborted': aborted_wave is not None,
+            'aborted_wave': aborted_wave + 1 if aborted_wave is not None else None,
+            'waves': [len(wave) for wave in self.waves],
+            'elapsed': round(elapsed, 3),
+            'counts': counts,
+            'devices': results,
+        }
+
+
+def read_commands(path):
+    with open(path, 'r') as f:
+        return [line.rstrip() for line in f if line.strip() and not line.lstrip().startswith('!')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Roll a configuration change out in canary waves.')
+    parser.add_argument('inventory', help='inventory file')
+    parser.add_argument('change', help='file with the config-mode commands to push')
+    parser.add_argument('--check', nargs=2, action='append', default=[], metavar=('COMMAND', 'REGEX'),
+                        help='show command whose output must match REGEX after the change')
+    parser.add_argument('--check-absent', nargs=2, action='append', default=[], metavar=('COMMAND', 'REGEX'),
+                        help='show command whose output must not match REGEX after the change')
+    parser.add_argument('--credentials', help='named credentials file for the inventory')
+    parser.add_argument('--username', default='cisco', help='login for devices without credentials')
+    parser.add_argument('--max-failure-rate', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--max-per-device', type=int, default=2, help='sessions per device (default: %(default)s)')
+    parser.add_argument('--max-per-site', type=int, help='sessions per site (default: no limit)')
+    parser.add_argument('--login-rate', type=float, default=10, help='logins per second (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    inventory = load_inventory(args.inventory, credentials=args.credentials)
+    password = getpass.getpass(f'Enter password for user {args.username}: ')
+    enable_password = getpass.getpass('Enter enable password: ')
+
+    devices = []
+    for device in inventory:
+        login = inventory.login(device)
+        devices.append({
+            'ip': device.host,
+            'username': login.username if login else args.username,
+            'password': login.password if login else password,
+            'enable_password': login.enable_password if login else enable_password,
+            'transport': device.transport,
+            'site': device.site,
+        })
+
+    checks = [Check(command, pattern, True) for command, pattern in args.check] \
+        + [Check(command, pattern, False) for command, pattern in args.check_absent]
+    rollout = Rollout(devices, read_commands(args.change), checks, max_failure_rate=args.max_failure_rate,
+                      max_workers=args.workers,
+                      governor=Governor(args.workers, args.max_per_device, args.max_per_site, args.login_rate))
+    report = rollout.run()
+
+    print('------------------------------------------------------')
+    if report['aborted']:
+        print(f"--- Rollout aborted in wave {report['aborted_wave']} of {len(report['waves'])}")
+    else:
+        print(f"--- Rollout finished in {report['elapsed']}s over waves of {report['waves']}")
+    for status, count in sorted(report['counts'].items()):
+        print(f'--- {status}: {count}')
+    print('------------------------------------------------------')
+
+    return 1 if report['aborted'] or report['counts'].get('rollback_failed') else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename='network_device_configurator.log', level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s: %(message)s')
+    sys.exit(main())
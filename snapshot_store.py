@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import hashlib
+import datetime
+import threading
+
+# Lines that change on every capture without any configuration change
+UNSTABLE = re.compile(r'^ntp clock-period .*$\n?', re.MULTILINE)
+
+
+class SnapshotStore:
+    """
+    Local history of device configurations, stored by content hash.
+
+    Each distinct config body is compressed and written once under
+    objects/<hash>; a capture is just a (device, time, hash) row in an
+    SQLite index. Capturing an unchanged config again only adds a row, so
+    nightly fleet captures don't grow the store linearly.
+    """
+
+    def __init__(self, root='config_snapshots'):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                device TEXT NOT NULL,
+                taken_at REAL NOT NULL,
+                hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                signal TEXT
+            );
+            CREATE INDEX IF NOT EXISTS snapshots_device_time ON snapshots (device, taken_at);
+        """)
+
+        # Stores created before change signals were recorded lack the column
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(snapshots)')]
+        if 'signal' not in columns:
+            self.db.execute('ALTER TABLE snapshots ADD COLUMN signal TEXT')
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:])
+
+    def _write_object(self, digest, body):
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return False
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(zlib.compress(body))
+        os.replace(temp_path, path)
+        return True
+
+    def read_object(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read()).decode('utf-8')
+
+    def save(self, device, config, taken_at=None, signal=None):
+        """
+        Record a capture of a device configuration.
+
+        :device: Device name or IP address
+        :config: The configuration text
+        :taken_at: Capture time (epoch seconds or datetime), now by default
+        :signal: Cheap change marker reported by the device for this config
+        =return: (hash, changed) where changed is False for a re-capture of
+                 the same config as the device's latest snapshot
+        """
+        body = UNSTABLE.sub('', config.replace('\r\n', '\n')).encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()
+        taken_at = self._timestamp(taken_at) if taken_at is not None else time.time()
+
+        self._write_object(digest, body)
+
+        with self._lock:
+            previous = self._latest_row(device)
+            self.db.execute('INSERT INTO snapshots (device, taken_at, hash, size, signal) VALUES (?, ?, ?, ?, ?)',
+                            (device, taken_at, digest, len(body), signal))
+            self.db.commit()
+
+        return digest, previous is None or previous[1] != digest
+
+    def save_file(self, device, path, taken_at=None, signal=None):
+        """
+        Record a capture stored in a file, without reading it into memory.
+
+        The file is hashed and compressed line by line into a temporary
+        object that is kept only if the content is new.
+
+        :device: Device name or IP address
+        :path: File with the configuration text
+        =return: (hash, changed) as for save()
+        """
+        digest = hashlib.sha256()
+        compressor = zlib.compressobj()
+        size = 0
+        temp_path = os.path.join(self.root, 'objects', f'incoming.{os.getpid()}.{threading.get_ident()}.tmp')
+
+        try:
+            with open(path, 'rb') as source, open(temp_path, 'wb') as target:
+                for line in source:
+                    line = line.replace(b'\r\n', b'\n')
+                    if UNSTABLE.match(line.decode('utf-8', 'replace')):
+                        continue
+                    digest.update(line)
+                    size += len(line)
+                    target.write(compressor.compress(line))
+                target.write(compressor.flush())
+
+            digest = digest.hexdigest()
+            object_path = self._object_path(digest)
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(temp_path, object_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        taken_at = self._timestamp(taken_at) if taken_at is not None else time.time()
+        with self._lock:
+            previous = self._latest_row(device)
+            self.db.execute('INSERT INTO snapshots (device, taken_at, hash, size, signal) VALUES (?, ?, ?, ?, ?)',
+                            (device, taken_at, digest, size, signal))
+            self.db.commit()
+
+        return digest, previous is None or previous[1] != digest
+
+    def export(self, digest, path, chunk_size=1 << 20):
+        """
+        Write a stored config to a file, decompressing it chunk by chunk.
+        """
+        decompressor = zlib.decompressobj()
+        temp_path = f'{path}.part'
+
+        with open(self._object_path(digest), 'rb') as source, open(temp_path, 'wb') as target:
+            for chunk in iter(lambda: source.read(chunk_size), b''):
+                target.write(decompressor.decompress(chunk))
+            target.write(decompressor.flush())
+
+        os.replace(temp_path, path)
+
+    def touch(self, device, taken_at=None):
+        """
+        Record a capture that found the latest snapshot unchanged.
+
+        =return: Hash of the latest snapshot, or None if the device has none
+        """
+        taken_at = self._timestamp(taken_at) if taken_at is not None else time.time()
+        with self._lock:
+            self.db.execute('INSERT INTO snapshots (device, taken_at, hash, size, signal) '
+                            'SELECT device, ?, hash, size, signal FROM snapshots WHERE device = ? '
+                            'ORDER BY taken_at DESC LIMIT 1', (taken_at, device))
+            self.db.commit()
+            row = self._latest_row(device)
+        return row[1] if row else None
+
+    def latest_signal(self, device):
+        with self._lock:
+            row = self.db.execute('SELECT signal FROM snapshots WHERE device = ? ORDER BY taken_at DESC LIMIT 1',
+                                  (device,)).fetchone()
+        return row[0] if row else None
+
+    def _latest_row(self, device, before=None):
+        if before is None:
+            query = 'SELECT taken_at, hash FROM snapshots WHERE device = ? ORDER BY taken_at DESC LIMIT 1'
+            return self.db.execute(query, (device,)).fetchone()
+        query = ('SELECT taken_at, hash FROM snapshots WHERE device = ? AND taken_at <= ? '
+                 'ORDER BY taken_at DESC LIMIT 1')
+        return self.db.execute(query, (device, before)).fetchone()
+
+    @staticmethod
+    def _timestamp(value):
+        if isinstance(value, datetime.datetime):
+            return value.timestamp()
+        return float(value)
+
+    def latest(self, device):
+        """
+        =return: (taken_at, config) of the newest snapshot, or None
+        """
+        with self._lock:
+            row = self._latest_row(device)
+        return (row[0], self.read_object(row[1])) if row else None
+
+    def latest_hash(self, device):
+        with self._lock:
+            row = self._latest_row(device)
+        return row[1] if row else None
+
+    def at(self, device, when):
+        """
+        =return: (taken_at, config) of the snapshot in effect at a given time, or None
+        """
+        with self._lock:
+            row = self._latest_row(device, self._timestamp(when))
+        return (row[0], self.read_object(row[1])) if row else None
+
+    def history(self, device):
+        with self._lock:
+            return self.db.execute('SELECT taken_at, hash FROM snapshots WHERE device = ? ORDER BY taken_at',
+                                   (device,)).fetchall()
+
+    def changes(self, device):
+        """
+        Captures where the configuration differed from the previous one.
+
+        =return: List of (taken_at, hash), oldest first
+        """
+        changes = []
+        previous = None
+        for taken_at, digest in self.history(device):
+            if digest != previous:
+                changes.append((taken_at, digest))
+            previous = digest
+        return changes
+
+    def devices(self):
+        with self._lock:
+            return [row[0] for row in self.db.execute('SELECT DISTINCT device FROM snapshots ORDER BY device')]
+
+    def close(self):
+        self.db.close()
@@ -1,6 +1,12 @@
+import os
 import pexpect
 import logging
 
+from compliance import RuleSet, rule_set
+
+# Cisco device hardening advice as compliance rules, found from any working directory
+HARDENING_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'cisco_hardening.yaml')
+
 class NetworkDeviceConfigurator:
     def __init__(self, ip, username, password, enable_password):
         self.ip = ip
@@ -52,13 +58,20 @@ class NetworkDeviceConfigurator:
             self.session.expect(['#', pexpect.TIMEOUT, pexpect.EOF])
             running_config = self.session.before  # Get the output before the prompt
 
-            # Compare configurations
-            if running_config.strip() == hardening_advice.strip():
+            # Check the configuration against the rules instead of requiring an exact copy
+            rules = hardening_advice if isinstance(hardening_advice, RuleSet) else rule_set(hardening_advice)
+            findings = rules.evaluate(running_config)
+
+            if not findings:
                 print("Running configuration is in compliance with Cisco device hardening advice.")
-            else:
-                print("Running configuration does not match Cisco device hardening advice.")
+                return True
 
-            return True
+            print("Running configuration does not match Cisco device hardening advice.")
+            for finding in findings:
+                where = f' in {finding.section}' if finding.section else ''
+                print(f'--- {finding.rule.id}{where}: {finding.message}')
+
+            return False
         except pexpect.ExceptionPexpect as e:
             logging.error(f"Comparison failed: {e}")
             return False
@@ -92,23 +105,7 @@ if __name__ == "__main__":
     password = 'cisco123!'
     enable_password = 'class123!'
     syslog_server_ip = 'IPhere'  # put right ip here when testing
-    hardening_advice = """
-    en
-    conf t
-    int g0/0
-    ip address 192.168.1.1 255.255.255.0
-    no shut
-    exit
-    line vty 0 4
-    transport input all
-    login local
-    username cisco password cisco
-    ip domain-name domain.com
-    hostname R1
-    enable secret class
-    crypto key generate rsa
-    ip ssh version 2
-    """
+    hardening_advice = HARDENING_RULES
 
     # Initialize logging for error tracking
     logging.basicConfig(filename='network_device_configurator.log', level=logging.INFO, format='%(asctime)s - %(levelname)s: %(message)s')
@@ -19,25 +19,22 @@ pydoc-example.py
 # Third-party required modules/packages/library
 import pexpect
 
+from inventory import load_inventory
+from prompts import LOGIN_REFUSED
+from reachability import live_hosts
+from retry import AUTH, EOF, TIMEOUT, RetryScheduler, SessionFailure, classify_output
+from version_collector import parse_show_version
+
 
 # Read device information from the file
 def get_devices_list():
     """
-    Get a list of devices from a text file.
+    Get a list of devices from the inventory file.
 
     =return: List of devices
     """
-    # Create empty list
-    devices_list = []
-
-    # Open the device file with the data
-    file = open('devices-15.txt', 'r')
-
-    # Retrieve the device IPs and append to list
-    for line in file:
-        devices_list.append(line.rstrip())
-
-    file.close()
+    # Any inventory format works here, a plain IP list like devices-15.txt included
+    devices_list = load_inventory('devices-15.txt').hosts()
 
     # Print list of devices
     print('\nDevices list: ', devices_list, end='\n\n')
@@ -52,7 +49,7 @@ def connect(ip_address, username, password):
     :ip_address: The IP address of the device we are connecting to
     :username: The username that we should use when logging in
     :password: The password that we should use when logging in
-    =return: pexpect session object if successful, 0 otherwise
+    =return: pexpect session object, raises SessionFailure if the login fails
     """
     print('Establishing SSH session: ', ip_address, username, password)
 
@@ -63,23 +60,27 @@ def connect(ip_address, username, password):
     result = session.expect([ssh_newkey, 'Password:', pexpect.TIMEOUT,
                             pexpect.EOF])
 
-    # Check for error, if so then print error and exit
+    # Check for error, if so then print error and give up on this device
     if result == 0:
         session.sendline('yes')
         result = session.expect([ssh_newkey, 'Password:', pexpect.TIMEOUT,
                                 pexpect.EOF])
-    elif result != 1:
+    if result != 1:
         print('!!! SSH failed creating session for: ', ip_address)
-        exit()
+        failure = TIMEOUT if result == 2 else classify_output(session.before, EOF)
+        session.close()
+        raise SessionFailure(failure, f'SSH failed creating session for {ip_address}')
 
     # Enter the username
     session.sendline(password)
-    result = session.expect(['#', pexpect.TIMEOUT, pexpect.EOF])
+    result = session.expect(['#', LOGIN_REFUSED, pexpect.TIMEOUT, pexpect.EOF])
 
-    # Check for error, if so then print error and exit
+    # Check for error, if so then print error and give up on this device
     if result != 0:
         print('!!! Password failed: ', password)
-        exit()
+        failure = AUTH if result == 1 else TIMEOUT if result == 2 else classify_output(session.before, EOF)
+        session.close()
+        raise SessionFailure(failure, f'Login failed for {ip_address}')
 
     print('--- Connected to: ', ip_address)
     return session
@@ -91,7 +92,7 @@ def get_version_info(session):
     Get the IOS version from the device.
 
     :session: The pexpect session object that we are using
-    =return: Version number
+    =return: Version number, None if it could not be read
     """
     print('--- Getting version information')
 
@@ -99,38 +100,65 @@ def get_version_info(session):
     session.sendline('show version | include Version')
     result = session.expect(['#', pexpect.TIMEOUT, pexpect.EOF])
 
-    # Check for error, if so then print error and exit
+    # Check for error, if so then print error and give up on this device
     if result != 0:
         print('!!! FAILED to get version information')
-        exit()
+        return None
 
-    # Extract the 'version' part of the output
-    version_output_lines = session.before.splitlines()
-    version_output_parts = version_output_lines[1].split(',')
-    version = version_output_parts[1].strip()
+    # Extract the 'version' part of the output, tolerating other banner layouts
+    version = parse_show_version(session.before)['version']
+    if version is None:
+        print('!!! No version found in the output')
+        return None
 
     print('--- Got version: ', version, end='\n\n')
     return version
 
 
+# Log in, read the version and log out again
+def get_device_version(ip_address):
+    """
+    Get the IOS version of one device.
+
+    :ip_address: The IP address of the device
+    =return: Version number, None if it could not be read
+    """
+    session = connect(ip_address, 'cisco', 'cisco123!')
+    try:
+        return get_version_info(session)
+    finally:
+        # Close the session
+        session.close()
+
+
 # Get list of devices
 devices_list = get_devices_list()
 
+# Check the whole list for SSH reachability at once, only live hosts get a session
+reachable_list = live_hosts(devices_list)
+for ip_address in devices_list:
+    if ip_address not in reachable_list:
+        print('!!! Unreachable on TCP/22, skipping: ', ip_address)
+
 # Create file to save output
 version_file_out = open('version-info-out.txt', 'w')
 
-# Loop through all the devices in the devices list
-for ip_address in devices_list:
+# Run all the devices side by side, logins that time out or drop are retried with backoff
+scheduler = RetryScheduler(max_workers=16)
+tasks = ((ip_address, lambda ip_address=ip_address: get_device_version(ip_address))
+         for ip_address in reachable_list)
 
-    # Connect to the device via CLI and get version information
-    session = connect(ip_address, 'cisco', 'cisco123!')
-    device_version = get_version_info(session)
+for outcome in scheduler.run(tasks):
+    if outcome.failure:
+        print('!!! Giving up on ', outcome.key, ' after ', outcome.attempts, ' attempt(s): ', outcome.failure)
+        continue
 
-    # Close the session
-    session.close()
+    device_version = outcome.result
+    if device_version is None:
+        continue
 
     # Write device data to output file
-    version_file_out.write('IP: '+ip_address+'  Version: '+device_version+'\n')
+    version_file_out.write('IP: '+outcome.key+'  Version: '+device_version+'\n')
 
 # Done with all devices and writing the file, so close
 version_file_out.close()
@@ -0,0 +1,172 @@
+import os
+import re
+import mmap
+import codecs
+import selectors
+
+import pexpect
+
+# IOS pager marker and the backspace/space/backspace run that erases it
+PAGER = re.compile(r' *-+ ?More ?-+\s*$')
+PAGER_ERASE = re.compile(r'\x08+ +\x08+')
+
+
+class PromptReader:
+    """
+    Stream CLI output from a channel until the device prompt comes back.
+
+    Works with anything that has fileno(), recv() and send(): paramiko
+    channels, sockets and the like. The reader sleeps in select() between
+    chunks, so an idle session costs no CPU, answers --More-- pages itself
+    and never stops at a single recv() the way a fixed-size read does.
+    """
+
+    def __init__(self, channel, prompt, timeout=20, pager_reply=' '):
+        self.channel = channel
+        self.prompt = prompt
+        self.timeout = timeout
+        self.pager_reply = pager_reply
+        self.prompt_text = None
+        self.bytes_read = 0
+
+    def chunks(self):
+        """
+        Yield output chunks as they arrive, up to (not including) the prompt.
+
+        Only complete lines are yielded; the last, unterminated line is held
+        back because that is where the prompt or a --More-- marker shows up.
+        Raises TimeoutError if the device goes quiet for longer than timeout
+        and EOFError if it closes the channel.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        selector = selectors.DefaultSelector()
+        selector.register(self.channel, selectors.EVENT_READ)
+        pending = ''
+
+        try:
+            while True:
+                if not selector.select(self.timeout):
+                    raise TimeoutError(f'No prompt from the device within {self.timeout}s')
+
+                try:
+                    data = self.channel.recv(65535)
+                except BlockingIOError:
+                    # Only protocol traffic such as telnet negotiation
+                    continue
+                if not data:
+                    raise EOFError('Device closed the session')
+                self.bytes_read += len(data)
+                pending += decoder.decode(data)
+
+                head, newline, last = pending.rpartition('\n')
+                last = PAGER_ERASE.sub('', last)
+
+                if PAGER.search(last):
+                    # Ask for the next page and drop the marker
+                    self.channel.send(self.pager_reply.encode('utf-8'))
+                    last = PAGER.sub('', last)
+                elif self.prompt.search(last) and not selector.select(0):
+                    if head:
+                        yield PAGER_ERASE.sub('', head + newline)
+                    self.prompt_text = last.strip()
+                    return
+
+                if head:
+                    yield PAGER_ERASE.sub('', head + newline)
+                pending = last
+        finally:
+            selector.close()
+
+    def read(self):
+        return ''.join(self.chunks())
+
+
+def read_until_prompt(channel, prompt, timeout=20):
+    """
+    Read everything up to the device prompt.
+
+    :channel: Channel or socket to read from
+    :prompt: Compiled regex that matches the prompt at the end of a line
+    :timeout: Seconds of silence after which to give up
+    =return: Output before the prompt
+    """
+    return PromptReader(channel, prompt, timeout).read()
+
+
+def capture_to_file(session, command, prompt, output_file, timeout=20, chunk_size=65536):
+    """
+    Run a command on a pexpect session and stream its output to a file.
+
+    Complete lines are written as they arrive and only the last, unfinished
+    line is kept in memory to look for the prompt, so a capture of any size
+    needs no more memory than a chunk. The output goes to a temporary file
+    that replaces output_file only once the prompt is back.
+
+    :session: pexpect session (spawn or ChannelSpawn) at the enable prompt
+    :command: Command to run, its echo is not written
+    :prompt: Compiled regex that matches the whole last line when it is the prompt
+    :output_file: Path of the file to write
+    :timeout: Seconds of silence after which to give up
+    =return: Number of characters written
+    """
+    session.sendline(command)
+
+    # Output that arrived with the previous expect is still in pexpect's buffer
+    pending = session.buffer
+    session.buffer = session.string_type()
+    echo = True
+    written = 0
+    temp_path = f'{output_file}.part'
+
+    try:
+        with open(temp_path, 'w') as f:
+            while True:
+                if echo and '\n' in pending:
+                    pending = pending.split('\n', 1)[1]
+                    echo = False
+
+                if not echo:
+                    head, newline, last = pending.rpartition('\n')
+                    if newline:
+                        text = (head + newline).replace('\r', '')
+                        f.write(text)
+                        written += len(text)
+                    pending = last
+
+                    # The prompt is only final when nothing follows it
+                    if prompt.search(last.strip()):
+                        try:
+                            pending += session.read_nonblocking(chunk_size, 0)
+                            continue
+                        except pexpect.TIMEOUT:
+                            break
+
+                pending += session.read_nonblocking(chunk_size, timeout)
+
+        os.replace(temp_path, output_file)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    session.before = session.string_type()
+    session.after = pending
+    return written
+
+
+def iter_file_lines(path, encoding='utf-8'):
+    """
+    Yield the lines of a file through a read-only memory map.
+
+    The file is paged in by the OS as the lines are read, so even a
+    multi-hundred-MB capture is never copied into memory as a whole.
+
+    :path: File to read
+    =return: Generator of lines without line endings
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b''):
+                yield line.decode(encoding, 'replace').rstrip('\r\n')
@@ -1,26 +1,32 @@
-import pexpect
 import logging
+import getpass
+
+import pexpect
+
+from batch_push import push_config
+from deferred_save import DeferredSave
+from transports import TelnetTransport
 
 # Configure the logging module
 logging.basicConfig(filename='telnet_log.txt', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def establish_telnet_connection(ip_address, username, password=None):
-    try:
-        # Create a Telnet session
-        session = pexpect.spawn(f'telnet {ip_address}', encoding='utf-8', timeout=20)
-        result = session.expect(['Username:', pexpect.TIMEOUT])
+def write_memory(session):
+    session.sendline('write memory')  # Save the configuration
+    session.expect(r'\[OK\]', timeout=60)
+    session.expect('#')
 
-        if result != 0:
-            raise Exception(f'Error: Failed to establish a connection to {ip_address}')
+def establish_telnet_connection(ip_address, username, password=None, saves=None):
+    try:
+        if password is None:
+            # Prompt for the password before connecting, so the device's login timer is not running
+            password = getpass.getpass('Enter password: ')
 
-        # Enter the username
-        session.sendline(username)
+        # Create a Telnet session in this process and log in
+        session = TelnetTransport().open(ip_address, username, password)
 
-        if password is None:
-            # Prompt for the password
-            password = input('Enter password: ')
+        if session is None:
+            raise Exception(f'Error: Failed to establish a connection to {ip_address}')
 
-        session.sendline(password)
         result = session.expect(['#', pexpect.TIMEOUT])
 
         if result != 0:
@@ -37,11 +43,18 @@ def establish_telnet_connection(ip_address, username, password=None):
         print('------------------------------------------------------')
 
         # Change the hostname (replace these commands with the actual commands)
-        session.sendline('configure terminal')
-        session.sendline('hostname NEW_HOSTNAME')
-        session.sendline('end')
-        session.sendline('write memory')  # Save the configuration
-        session.expect('#')
+        if saves is not None:
+            saves.changed()
+        errors = push_config(session, ['hostname NEW_HOSTNAME'])
+
+        if errors:
+            raise Exception(f'Error: {ip_address} rejected the hostname change')
+
+        # Written once, when the session is done
+        if saves is not None:
+            saves.request()
+        else:
+            write_memory(session)
 
         return session
 
@@ -54,9 +67,16 @@ def main():
     ip_address = '192.168.56.101'
     username = 'cisco'
 
-    session = establish_telnet_connection(ip_address, username)
+    saves = DeferredSave(lambda: write_memory(session), ip_address)
+    session = establish_telnet_connection(ip_address, username, saves=saves)
 
     if session:
+        # Save every change of the session with one write memory
+        try:
+            saves.commit()
+        except Exception as e:
+            logging.error(f'Failed to save the configuration of {ip_address}: {e}')
+
         # Terminate the Telnet session
         session.sendline('quit')
         session.close()
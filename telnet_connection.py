@@ -1,27 +1,19 @@
 import pexpect
 import logging
 
+from transports import TelnetTransport
+
 # Configure the logging module
 logging.basicConfig(filename='telnet_log.txt', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def establish_telnet_connection(ip_address, username, password):
     try:
-        # Create a Telnet session
-        session = pexpect.spawn(f'telnet {ip_address}', encoding='utf-8', timeout=20)
-        result = session.expect(['Username:', pexpect.TIMEOUT])
+        # Create a Telnet session in this process and log in
+        session = TelnetTransport().open(ip_address, username, password)
 
-        if result != 0:
+        if session is None:
             raise Exception(f'Error: Failed to establish a connection to {ip_address}')
 
-        # Enter the username
-        session.sendline(username)
-        result = session.expect(['Password:', pexpect.TIMEOUT])
-
-        if result != 0:
-            raise Exception(f'Error: Failed to enter username {username}')
-
-        # Enter the password
-        session.sendline(password)
         result = session.expect(['#', pexpect.TIMEOUT])
 
         if result != 0:
@@ -0,0 +1,46 @@
+import json
+
+from audit import audit, find_configs, main
+from fake_ios import FakeIOSServer
+
+
+def archive(tmp_path):
+    # Two saved device configs, one hardened, plus a file the pattern skips
+    config = FakeIOSServer().device.lines
+    (tmp_path / 'dc1').mkdir()
+    (tmp_path / 'dc1' / 'running_config_r1.txt').write_text('\n'.join(config + ['ip ssh version 2']))
+    (tmp_path / 'running_config_r2.txt').write_text('\n'.join(config))
+    (tmp_path / 'notes.md').write_text('not a config')
+    return tmp_path
+
+
+def test_find_configs_walks_subdirectories(tmp_path):
+    root = archive(tmp_path)
+    assert sorted(find_configs(str(root))) == [str(root / 'dc1' / 'running_config_r1.txt'),
+                                               str(root / 'running_config_r2.txt')]
+    assert list(find_configs(str(root), '*.md')) == [str(root / 'notes.md')]
+
+
+def test_audit_on_worker_processes(tmp_path):
+    root = archive(tmp_path)
+    results = {result['file']: result for result in audit(find_configs(str(root)), workers=2, chunksize=1)}
+
+    hardened = results[str(root / 'dc1' / 'running_config_r1.txt')]
+    assert hardened['compliant'] and hardened['hostname'] == 'R1' and hardened['error'] is None
+    plain = results[str(root / 'running_config_r2.txt')]
+    assert not plain['compliant']
+    assert [finding['rule'] for finding in plain['findings']] == ['ssh-version-2']
+
+
+def test_main_writes_json_lines(tmp_path, capsys):
+    root = archive(tmp_path)
+    baseline = tmp_path / 'golden.cfg'
+    baseline.write_text('\n'.join(FakeIOSServer().device.lines))
+    output = tmp_path / 'audit.jsonl'
+
+    assert main([str(root), '--baseline', str(baseline), '--workers', '2', '--output', str(output)]) == 1
+    results = {result['file']: result for result in map(json.loads, output.read_text().splitlines())}
+    assert len(results) == 2
+    assert results[str(root / 'running_config_r2.txt')]['diff'] == []
+    assert results[str(root / 'dc1' / 'running_config_r1.txt')]['diff']
+    assert '2 files' in capsys.readouterr().err
@@ -0,0 +1,80 @@
+import threading
+
+from command_cache import CommandCache, is_read_only
+
+
+def counting_read(outputs):
+    # Read that answers from outputs and counts the device round-trips
+    calls = []
+
+    def read(command):
+        calls.append(command)
+        return outputs[command]
+
+    return read, calls
+
+
+def test_is_read_only():
+    assert is_read_only(' show running-config')
+    assert is_read_only('sh ver')
+    assert not is_read_only('write memory')
+    assert not is_read_only('clear counters')
+
+
+def test_repeated_show_is_served_from_the_cache():
+    cache = CommandCache(ttl=60)
+    read, calls = counting_read({'show version': 'v1'})
+
+    assert cache.fetch('show version', read) == 'v1'
+    assert cache.fetch('show  version', read) == 'v1'
+    assert calls == ['show version']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_output_is_read_again():
+    cache = CommandCache(ttl=0)
+    read, calls = counting_read({'show version': 'v1'})
+
+    cache.fetch('show version', read)
+    cache.fetch('show version', read)
+    assert len(calls) == 2
+
+
+def test_change_command_invalidates_the_cache():
+    cache = CommandCache()
+    outputs = {'show running-config': 'hostname R1', 'clear counters': ''}
+    read, calls = counting_read(outputs)
+
+    cache.fetch('show running-config', read)
+    cache.fetch('clear counters', read)
+    outputs['show running-config'] = 'hostname R2'
+    assert cache.fetch('show running-config', read) == 'hostname R2'
+    assert calls == ['show running-config', 'clear counters', 'show running-config']
+
+
+def test_read_overtaken_by_invalidate_is_not_cached():
+    cache = CommandCache()
+    started, pushed = threading.Event(), threading.Event()
+    outputs = {'show running-config': 'hostname R1'}
+
+    def slow_read(command):
+        # The device answers before the push, the answer arrives after it
+        output = outputs[command]
+        started.set()
+        pushed.wait(5)
+        return output
+
+    results = []
+    reader = threading.Thread(target=lambda: results.append(cache.fetch('show running-config', slow_read)))
+    reader.start()
+    started.wait(5)
+
+    outputs['show running-config'] = 'hostname R2'
+    cache.invalidate()
+    pushed.set()
+    reader.join(5)
+
+    assert results == ['hostname R1']
+    read, calls = counting_read(outputs)
+    assert cache.fetch('show running-config', read) == 'hostname R2'
+    assert calls == ['show running-config']
@@ -0,0 +1,75 @@
+from config_diff import diff_configs
+
+EDGE = ('ip access-list extended EDGE\n'
+        ' permit tcp any any eq 22\n'
+        ' deny ip any any\n')
+
+ACL_10 = ('access-list 10 permit 10.0.0.1\n'
+          'access-list 10 deny any\n')
+
+
+def test_entry_appended_to_an_acl_is_added_alone():
+    new = EDGE + ' permit tcp any any eq 443\n' + ACL_10 + 'access-list 10 permit 10.0.0.2\n'
+
+    diff = diff_configs(EDGE + ACL_10, new)
+    assert diff.reordered == []
+    assert diff.commands() == ['access-list 10 permit 10.0.0.2', 'ip access-list extended EDGE',
+                               ' permit tcp any any eq 443', 'exit']
+
+
+def test_entry_inserted_in_the_middle_of_an_acl_rebuilds_it():
+    new = ('ip access-list extended EDGE\n'
+           ' permit tcp any any eq 22\n'
+           ' permit tcp any any eq 443\n'
+           ' deny ip any any\n'
+           'access-list 10 permit 10.0.0.1\n'
+           'access-list 10 permit 10.0.0.2\n'
+           'access-list 10 deny any\n')
+
+    assert diff_configs(EDGE + ACL_10, new).commands() == [
+        'no ip access-list extended EDGE',
+        'ip access-list extended EDGE',
+        ' permit tcp any any eq 22',
+        ' permit tcp any any eq 443',
+        ' deny ip any any',
+        'exit',
+        'no access-list 10',
+        'access-list 10 permit 10.0.0.1',
+        'access-list 10 permit 10.0.0.2',
+        'access-list 10 deny any',
+    ]
+
+
+def test_entry_removed_from_the_middle_of_an_acl_rebuilds_it():
+    old = ('ip access-list extended EDGE\n'
+           ' permit tcp any any eq 22\n'
+           ' permit tcp any any eq 443\n'
+           ' deny ip any any\n')
+
+    assert diff_configs(old, EDGE).commands() == [
+        'no ip access-list extended EDGE',
+        'ip access-list extended EDGE',
+        ' permit tcp any any eq 22',
+        ' deny ip any any',
+        'exit',
+    ]
+
+
+def test_last_entry_removed_from_a_named_acl_is_removed_alone():
+    assert diff_configs(EDGE + ' permit udp any any\n', EDGE).commands() == [
+        'ip access-list extended EDGE', ' no permit udp any any', 'exit']
+
+
+def test_entry_removed_from_a_numbered_acl_rebuilds_it():
+    # 'no access-list 10 ...' would delete the whole list
+    old = 'access-list 10 permit 10.0.0.1\naccess-list 10 permit 10.0.0.2\naccess-list 10 deny any\n'
+
+    assert diff_configs(old, ACL_10).commands() == [
+        'no access-list 10', 'access-list 10 permit 10.0.0.1', 'access-list 10 deny any']
+
+
+def test_unordered_blocks_ignore_line_order():
+    old = 'interface GigabitEthernet0/0\n description uplink\n no shutdown\n'
+    new = 'interface GigabitEthernet0/0\n no shutdown\n description uplink\n'
+
+    assert not diff_configs(old, new)
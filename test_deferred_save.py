@@ -0,0 +1,95 @@
+import pytest
+
+from deferred_save import DeferredSave, DeferredSaveConnection, is_save_command
+from fake_ios import FakeIOSServer
+from networkconfignew import NetworkDeviceConfigurator
+from transports import TelnetTransport
+
+
+def test_is_save_command():
+    assert is_save_command('write memory')
+    assert is_save_command(' Copy  Run  Start ')
+    assert not is_save_command('write erase')
+
+
+def test_requests_are_coalesced_into_one_write():
+    writes = []
+    saves = DeferredSave(lambda: writes.append(1))
+
+    saves.changed()
+    saves.request()
+    saves.changed()
+    saves.request()
+    assert saves.pending and writes == []
+
+    assert saves.commit()
+    assert writes == [1]
+    # Nothing changed since the last save
+    saves.request()
+    assert not saves.commit()
+    assert writes == [1]
+
+
+def test_changes_nobody_asked_to_save_stay_unsaved():
+    writes = []
+    saves = DeferredSave(lambda: writes.append(1))
+
+    saves.changed()
+    assert not saves.commit()
+    assert saves.flush()
+    assert saves.flush(force=True)
+    assert len(writes) == 2
+
+
+def test_connection_wrapper_defers_saves():
+    class Connection:
+        def __init__(self):
+            self.sent = []
+
+        def send_config_set(self, commands):
+            self.sent.extend(commands)
+
+        def send_command(self, command):
+            self.sent.append(command)
+            return ''
+
+        def disconnect(self):
+            self.sent.append('disconnect')
+
+    connection = DeferredSaveConnection(Connection(), 'r1')
+    connection.send_config_set(['hostname R2'])
+    connection.send_command('write mem')
+    connection.save()
+    connection.send_config_set(['ip ssh version 2'])
+    connection.disconnect()
+
+    assert connection.connection.sent == ['hostname R2', 'ip ssh version 2', 'write memory', 'disconnect']
+
+
+@pytest.fixture
+def server():
+    server = FakeIOSServer().serve_in_thread()
+    yield server
+    server.stop_thread()
+
+
+def test_configurator_writes_once_at_disconnect(server):
+    device = NetworkDeviceConfigurator('127.0.0.1', 'cisco', 'cisco', 'class', transport=TelnetTransport(server.port))
+    assert device.connect()
+    assert device.configure_hostname('R2')
+    device.save()
+    assert device.send_command('write memory') == ''
+    assert device.push_config(['ip ssh version 2'])
+    device.save()
+    assert server.device.write_count == 0
+
+    device.disconnect()
+    assert server.device.write_count == 1
+
+
+def test_configurator_without_save_request_does_not_write(server):
+    device = NetworkDeviceConfigurator('127.0.0.1', 'cisco', 'cisco', 'class', transport=TelnetTransport(server.port))
+    assert device.connect()
+    assert device.configure_hostname('R2')
+    device.disconnect()
+    assert server.device.write_count == 0
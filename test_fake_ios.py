@@ -0,0 +1,195 @@
+import os
+import asyncio
+
+import pytest
+
+from adaptive_timeout import ResponseHistory
+from async_session import AsyncDeviceSession
+from batch_push import PushError, parse_push_output, push_config
+from compliance import Rule, RuleSet, rule_set
+from config_diff import diff_configs
+from fake_ios import FakeIOSServer
+from networkconfignew import NetworkDeviceConfigurator
+from retry import AUTH
+from transports import TelnetTransport
+
+HARDENING_RULES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules', 'cisco_hardening.yaml')
+
+
+@pytest.fixture
+def server():
+    # A fresh fake device per test, so changes made by one test never leak into the next
+    server = FakeIOSServer().serve_in_thread()
+    yield server
+    server.stop_thread()
+
+
+def configurator(server, password='cisco', enable_password='class', history=None):
+    return NetworkDeviceConfigurator('127.0.0.1', 'cisco', password, enable_password, history,
+                                     transport=TelnetTransport(server.port))
+
+
+def running_config(server):
+    return '\n'.join(server.device.running_config())
+
+
+def test_login_and_enable(server):
+    device = configurator(server)
+    try:
+        assert device.connect()
+        assert device.session.after.strip() == 'R1#'
+        assert 'hostname R1' in device.send_command('show running-config')
+    finally:
+        device.disconnect()
+
+
+def test_login_with_wrong_password(server):
+    device = configurator(server, password='wrong')
+    try:
+        assert not device.connect()
+        assert device.failure == AUTH
+    finally:
+        device.disconnect()
+
+
+def test_enable_with_wrong_password(server):
+    # A refused enable ends at the '>' prompt, so the wait for '#' runs out; a learned deadline keeps it short
+    history = ResponseHistory(path=None, min_timeout=0.5, slack=0.5)
+    history.record('127.0.0.1', 'enable password', 0.01)
+
+    device = configurator(server, enable_password='wrong', history=history)
+    try:
+        assert not device.connect()
+        assert device.failure == AUTH
+    finally:
+        device.disconnect()
+
+
+def test_async_session_login_and_enable(server):
+    async def run():
+        session = AsyncDeviceSession('127.0.0.1', 'cisco', 'cisco', 'class', port=server.port, transport='tcp',
+                                     timeout=5)
+        try:
+            assert await session.connect()
+            assert session.hostname == 'R1'
+            assert await session.configure_hostname('R2')
+            return await session.send_command('show running-config | include hostname')
+        finally:
+            await session.disconnect()
+
+    assert asyncio.run(run()) == 'hostname R2'
+    assert server.device.hostname == 'R2'
+
+
+def test_push_reports_rejected_commands(server):
+    device = configurator(server)
+    try:
+        assert device.connect()
+        errors = push_config(device.session, ['interface GigabitEthernet0/1', 'description uplink', 'exit',
+                                              'bogus command', 'ip ssh version 2'], 30)
+    finally:
+        device.disconnect()
+
+    assert errors == [PushError('bogus command', "% Invalid input detected at '^' marker.")]
+    # The device keeps going after a rejected line
+    assert 'ip ssh version 2' in server.device.lines
+    assert ' description uplink' in server.device.lines
+
+
+def test_parse_push_output_attributes_errors_to_their_command():
+    output = ('configure terminal\r\n'
+              'Enter configuration commands, one per line.  End with CNTL/Z.\r\n'
+              'R1(config)#interface GigabitEthernet0/1\r\n'
+              'R1(config-if)#ip adress 10.0.0.1 255.255.255.0\r\n'
+              "% Invalid input detected at '^' marker.\r\n"
+              'R1(config-if)#exit\r\n'
+              'R1(config)#ip route 10.0.0.0\r\n'
+              '% Incomplete command.\r\n'
+              'R1(config)#end\r\n')
+    commands = ['interface GigabitEthernet0/1', 'ip adress 10.0.0.1 255.255.255.0', 'exit', 'ip route 10.0.0.0']
+
+    assert parse_push_output(commands, output) == [
+        PushError('ip adress 10.0.0.1 255.255.255.0', "% Invalid input detected at '^' marker."),
+        PushError('ip route 10.0.0.0', '% Incomplete command.'),
+    ]
+    assert parse_push_output(commands, output.replace('%', '')) == []
+
+
+def test_diff_commands_restore_the_device(server):
+    before = running_config(server)
+
+    device = configurator(server)
+    try:
+        assert device.connect()
+        assert device.push_config(['hostname R9', 'no ip domain name domain.com', 'ip http server',
+                                   'interface GigabitEthernet0/1', 'no shutdown', 'exit'])
+        changed = device.send_command('show running-config')
+        assert diff_configs(changed, before)
+
+        # Undo the change set the way the rollout does
+        assert device.push_config(diff_configs(changed, before).commands())
+    finally:
+        device.disconnect()
+
+    assert not diff_configs(running_config(server), before)
+
+
+def test_diff_commands_rebuild_reordered_acls_once():
+    old = ('ip access-list extended EDGE\n'
+           ' permit tcp any any eq 22\n'
+           ' deny ip any any\n'
+           'access-list 10 permit 10.0.0.1\n'
+           'access-list 10 deny any\n')
+    new = ('ip access-list extended EDGE\n'
+           ' deny ip any any\n'
+           ' permit tcp any any eq 22\n'
+           ' permit tcp any any eq 443\n'
+           'access-list 10 deny any\n'
+           'access-list 10 permit 10.0.0.1\n')
+
+    assert diff_configs(old, new).commands() == [
+        'no ip access-list extended EDGE',
+        'ip access-list extended EDGE',
+        ' deny ip any any',
+        ' permit tcp any any eq 22',
+        ' permit tcp any any eq 443',
+        'exit',
+        'no access-list 10',
+        'access-list 10 deny any',
+        'access-list 10 permit 10.0.0.1',
+    ]
+
+
+def test_rule_set_evaluate_device_config(server):
+    rules = rule_set(HARDENING_RULES)
+    assert [finding.rule.id for finding in rules.evaluate(running_config(server))] == ['ssh-version-2']
+
+    device = configurator(server)
+    try:
+        assert device.connect()
+        assert device.push_config(['ip ssh version 2', 'enable password cisco', 'interface GigabitEthernet0/0',
+                                   'shutdown', 'exit'])
+    finally:
+        device.disconnect()
+
+    findings = rules.evaluate(running_config(server))
+    assert sorted(finding.rule.id for finding in findings) == ['gi0-0-up', 'no-enable-password']
+    assert all(finding.line_number for finding in findings)
+
+
+def test_rule_set_evaluate_missing_section():
+    config = '\n'.join(line for line in FakeIOSServer().device.lines if 'GigabitEthernet0/0' not in line)
+    findings = rule_set(HARDENING_RULES).evaluate(config)
+    assert 'gi0-0-present' in [finding.rule.id for finding in findings]
+
+
+def test_rule_set_regex_rules_keep_flags_and_back_references():
+    rules = RuleSet([
+        Rule('http', 'must_not_match', r'(?i)^ip http server'),
+        Rule('repeated', 'must_not_match', r'^(\S+) \1$'),
+        Rule('hostname', 'must_have', 'hostname R1'),
+    ])
+
+    findings = rules.evaluate('hostname R1\nIP HTTP SERVER\nfoo foo\nfoo bar\n')
+    assert [(finding.rule.id, finding.line) for finding in findings] == [('http', 'IP HTTP SERVER'),
+                                                                         ('repeated', 'foo foo')]
@@ -0,0 +1,67 @@
+import time
+import threading
+
+from governor import Governor, TokenBucket
+
+
+def hold(governor, device, site, seconds=0.05):
+    slot = governor.acquire(device, site)
+    time.sleep(seconds)
+    governor.release(slot)
+
+
+def peak(governor, work):
+    # Highest number of sessions open at once while running work on threads
+    highest = []
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            highest.append(governor.stats()['active'])
+            time.sleep(0.002)
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    threads = [threading.Thread(target=hold, args=(governor, device, site)) for device, site in work]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    watcher.join()
+    return max(highest)
+
+
+def test_sessions_per_device_are_capped():
+    governor = Governor(max_sessions=None, max_per_device=2, login_rate=None)
+    assert peak(governor, [('r1', None)] * 6) <= 2
+    assert governor.stats()['active'] == 0
+
+
+def test_sessions_per_site_and_in_total_are_capped():
+    governor = Governor(max_sessions=3, max_per_device=None, max_per_site=1, login_rate=None)
+    assert peak(governor, [(f'r{number}', 'dc1') for number in range(4)]) == 1
+
+    governor = Governor(max_sessions=3, max_per_device=None, login_rate=None)
+    assert peak(governor, [(f'r{number}', None) for number in range(9)]) <= 3
+
+
+def test_release_is_idempotent():
+    governor = Governor(max_sessions=1, max_per_device=1, login_rate=None)
+    slot = governor.acquire('r1')
+    governor.release(slot)
+    governor.release(slot)
+
+    # A second release must not have freed an extra slot
+    governor.acquire('r1')
+    assert not governor._global.acquire(blocking=False)
+
+
+def test_token_bucket_paces_logins():
+    bucket = TokenBucket(rate=50, burst=2)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+
+    # Two from the burst, the other four at 50 per second
+    assert time.monotonic() - started >= 4 / 50 * 0.9
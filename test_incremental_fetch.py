@@ -0,0 +1,102 @@
+import os
+import time
+import sqlite3
+
+import pytest
+
+from fake_ios import FakeIOSServer
+from incremental_fetch import SIGNAL_COMMAND, config_signal, fetch_running_config
+from networkconfignew import NetworkDeviceConfigurator
+from snapshot_store import SnapshotStore
+from transports import TelnetTransport
+
+
+class Device:
+    # Answers the signal and show running-config commands and counts the full pulls
+    def __init__(self, signal):
+        self.signal = signal
+        self.config = 'hostname R1\n'
+        self.pulls = 0
+
+    def send_command(self, command):
+        if command == SIGNAL_COMMAND:
+            return f'! Last configuration change at {self.signal}' if self.signal else ''
+        self.pulls += 1
+        return self.config
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    yield store
+    store.close()
+
+
+def test_config_signal():
+    assert config_signal(lambda command: '! Last configuration change at 10:01:02 UTC Mon Jan 1 2024 by cisco') \
+        == '10:01:02 UTC Mon Jan 1 2024 by cisco'
+    assert config_signal(lambda command: '') is None
+
+
+def test_unchanged_device_is_not_pulled_again(store):
+    device = Device('10:00:00 UTC')
+    assert fetch_running_config('r1', device.send_command, store) == ('hostname R1\n', True)
+    assert fetch_running_config('r1', device.send_command, store) == ('hostname R1\n', False)
+    assert device.pulls == 1
+    assert len(store.history('r1')) == 2
+
+    device.signal, device.config = '11:00:00 UTC', 'hostname R2\n'
+    assert fetch_running_config('r1', device.send_command, store) == ('hostname R2\n', True)
+    assert device.pulls == 2
+
+
+def test_device_without_signal_is_always_pulled(store):
+    device = Device(None)
+    fetch_running_config('r1', device.send_command, store)
+    fetch_running_config('r1', device.send_command, store)
+    assert device.pulls == 2
+
+
+def test_store_without_signal_column_is_migrated(tmp_path):
+    root = tmp_path / 'snapshots'
+    os.makedirs(root)
+    db = sqlite3.connect(str(root / 'index.db'))
+    db.execute('CREATE TABLE snapshots (device TEXT NOT NULL, taken_at REAL NOT NULL, hash TEXT NOT NULL, '
+               'size INTEGER NOT NULL)')
+    db.execute("INSERT INTO snapshots VALUES ('r1', 100, 'abc', 10)")
+    db.commit()
+    db.close()
+
+    store = SnapshotStore(str(root))
+    try:
+        assert store.latest_signal('r1') is None
+        store.save('r1', 'hostname R1\n', taken_at=200, signal='10:00:00 UTC')
+        assert store.latest_signal('r1') == '10:00:00 UTC'
+        assert len(store.history('r1')) == 2
+    finally:
+        store.close()
+
+
+def test_configurator_reuses_the_snapshot_of_an_unchanged_device(store, tmp_path):
+    server = FakeIOSServer().serve_in_thread()
+    device = NetworkDeviceConfigurator('127.0.0.1', 'cisco', 'cisco', 'class', transport=TelnetTransport(server.port))
+    output_file = str(tmp_path / 'running_config.txt')
+    try:
+        assert device.connect()
+        # The fake device only reports a change marker once it was changed
+        assert device.push_config(['ip ssh version 2'])
+
+        assert device.save_running_config(output_file, store)
+        assert device.save_running_config(output_file, store)
+        assert [digest for _, digest in store.changes('127.0.0.1')] == [store.latest_hash('127.0.0.1')]
+
+        # The marker has a resolution of one second, like on IOS
+        time.sleep(1.1)
+        assert device.push_config(['hostname R2'])
+        assert device.save_running_config(output_file, store)
+        assert len(store.changes('127.0.0.1')) == 2
+        with open(output_file) as f:
+            assert 'hostname R2' in f.read()
+    finally:
+        device.disconnect()
+        server.stop_thread()
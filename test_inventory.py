@@ -0,0 +1,78 @@
+import os
+import json
+
+import pytest
+
+import inventory
+from inventory import InventoryError, load_inventory
+
+INVENTORY = """
+defaults:
+  platform: ios
+groups:
+  core:
+    site: dc1
+    transport: paramiko
+devices:
+  - {name: r1, host: 10.0.0.1, groups: [core], tags: [edge], new_hostname: R1}
+  - {host: 10.0.0.2, site: lab}
+"""
+
+
+@pytest.fixture
+def inventory_file(tmp_path):
+    path = tmp_path / 'devices.yaml'
+    path.write_text(INVENTORY)
+    return str(path)
+
+
+def test_load_yaml_with_groups_and_defaults(inventory_file, tmp_path):
+    devices = load_inventory(inventory_file, cache_dir=None)
+
+    assert devices.hosts() == ['10.0.0.1', '10.0.0.2']
+    r1 = devices.get('r1')
+    assert (r1.site, r1.transport, r1.groups, r1.tags) == ('dc1', 'paramiko', ('core',), ('edge',))
+    assert r1.attributes == {'new_hostname': 'R1'}
+    assert devices.get('10.0.0.2').site == 'lab'
+    assert devices.filter(site='dc1').hosts() == ['10.0.0.1']
+
+
+def test_unknown_transport_is_rejected(tmp_path):
+    path = tmp_path / 'devices.yaml'
+    path.write_text('- {host: 10.0.0.1, transport: ssh}\n')
+
+    with pytest.raises(InventoryError, match="10.0.0.1: unknown transport 'ssh'"):
+        load_inventory(str(path), cache_dir=None)
+
+
+def test_cache_is_json_and_reused(inventory_file, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    first = list(load_inventory(inventory_file, cache_dir=cache_dir))
+
+    names = os.listdir(cache_dir)
+    assert len(names) == 1 and names[0].endswith('.json')
+    with open(os.path.join(cache_dir, names[0])) as f:
+        assert len(json.load(f)['devices']) == 2
+
+    # An unchanged file is served from the cache without parsing
+    monkeypatch.setattr(inventory, '_build', lambda *args: pytest.fail('inventory parsed again'))
+    assert list(load_inventory(inventory_file, cache_dir=cache_dir)) == first
+
+
+def test_cache_is_refreshed_when_the_file_changes(inventory_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_inventory(inventory_file, cache_dir=cache_dir)
+
+    with open(inventory_file, 'a') as f:
+        f.write('  - {host: 10.0.0.3}\n')
+    assert load_inventory(inventory_file, cache_dir=cache_dir).hosts() == ['10.0.0.1', '10.0.0.2', '10.0.0.3']
+
+
+def test_unreadable_cache_is_ignored(inventory_file, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    load_inventory(inventory_file, cache_dir=cache_dir)
+
+    cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    with open(cache_path, 'wb') as f:
+        f.write(b'\x80\x04\x95 not json')
+    assert len(load_inventory(inventory_file, cache_dir=cache_dir)) == 2
@@ -0,0 +1,43 @@
+import socket
+
+import pytest
+
+from reachability import live_hosts, sweep
+
+
+@pytest.fixture
+def ports():
+    # One port that accepts connections and one that refuses them
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    yield listener.getsockname()[1], closed_port
+    listener.close()
+
+
+def test_sweep_reports_every_probe(ports):
+    open_port, closed_port = ports
+    results = sweep(['127.0.0.1', 'no-such-host.invalid'], ports=(open_port, closed_port), timeout=1)
+
+    assert results['127.0.0.1'] == {open_port: True, closed_port: False}
+    assert results['no-such-host.invalid'] == {open_port: False, closed_port: False}
+
+
+def test_sweep_with_few_open_sockets(ports):
+    open_port, _ = ports
+    hosts = ['127.0.0.1', '127.0.0.2', '127.0.0.3']
+    results = sweep(hosts, ports=(open_port,), timeout=1, max_open=1)
+
+    # The listener is bound to 127.0.0.1 only
+    assert [results[host][open_port] for host in hosts] == [True, False, False]
+
+
+def test_live_hosts_keeps_inventory_order(ports):
+    open_port, _ = ports
+    assert live_hosts(['no-such-host.invalid', '127.0.0.1'], port=open_port, timeout=1) == ['127.0.0.1']
@@ -0,0 +1,95 @@
+import pexpect
+import pytest
+
+from fake_ios import FakeIOSServer
+from fleet import FleetRunner
+from retry import (AUTH, EOF, ERROR, TIMEOUT, UNREACHABLE, VTY_FULL, RetryScheduler, SessionFailure, backoff,
+                   classify, classify_output)
+from transports import TelnetTransport
+
+
+@pytest.mark.parametrize('error, kind', [
+    (SessionFailure(AUTH, 'refused'), AUTH),
+    (pexpect.TIMEOUT('no prompt'), TIMEOUT),
+    (TimeoutError(), TIMEOUT),
+    (pexpect.EOF('closed'), EOF),
+    (ConnectionResetError(), EOF),
+    # IOS refuses telnet when every vty line is busy
+    (ConnectionRefusedError(), VTY_FULL),
+    (OSError('No route to host'), UNREACHABLE),
+    (pexpect.EOF('kex_exchange_identification: Connection closed by remote host'), VTY_FULL),
+    (pexpect.EOF('Permission denied (publickey,password).'), AUTH),
+    (ValueError('bug'), ERROR),
+])
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+def test_classify_output():
+    assert classify_output('% Authentication failed') == AUTH
+    assert classify_output('% Login invalid') == AUTH
+    assert classify_output('Connection reset by 10.0.0.1 port 22') == VTY_FULL
+    assert classify_output('R1>', TIMEOUT) == TIMEOUT
+
+
+def test_backoff_doubles_up_to_the_limit():
+    assert [backoff(attempt, 2.0, 10.0, jitter=0) for attempt in (1, 2, 3, 4)] == [2.0, 4.0, 8.0, 10.0]
+    assert 1.0 <= backoff(1, 2.0, 10.0, jitter=0.5) <= 2.0
+
+
+def flaky(failures, kind):
+    # Task that fails with kind the first failures times, then succeeds
+    calls = []
+
+    def task():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise SessionFailure(kind)
+        return len(calls)
+
+    return task
+
+
+def test_scheduler_retries_transient_failures():
+    scheduler = RetryScheduler(max_workers=4, max_attempts=3, base_delay=0.01, max_delay=0.01)
+    outcomes = {outcome.key: outcome for outcome in scheduler.run([
+        ('vty', flaky(2, VTY_FULL)),
+        ('down', flaky(5, UNREACHABLE)),
+        ('auth', flaky(1, AUTH)),
+        ('ok', flaky(0, TIMEOUT)),
+    ])}
+
+    assert outcomes['vty'].result == 3 and outcomes['vty'].attempts == 3
+    assert outcomes['down'].failure == UNREACHABLE and outcomes['down'].attempts == 3
+    # A refused login is never retried
+    assert outcomes['auth'].failure == AUTH and outcomes['auth'].attempts == 1
+    assert outcomes['ok'].result == 1
+    assert scheduler.retries == 4
+
+
+def test_fleet_run_survives_a_bad_device(tmp_path):
+    server = FakeIOSServer().serve_in_thread()
+    try:
+        login = {'username': 'cisco', 'password': 'cisco', 'enable_password': 'class'}
+        devices = [dict(login, ip='127.0.0.1', transport=TelnetTransport(server.port)),
+                   dict(login, ip='127.0.0.2', transport='ssh')]
+        report = FleetRunner(devices, max_workers=2, output_dir=str(tmp_path)).run()
+    finally:
+        server.stop_thread()
+
+    results = {result['ip']: result for result in report['devices']}
+    assert report['total'] == 2
+    assert results['127.0.0.1']['success']
+    assert not results['127.0.0.2']['success']
+    assert 'Unknown transport' in results['127.0.0.2']['error']
+
+
+def test_fleet_run_reports_tasks_that_raise(tmp_path):
+    class BrokenRunner(FleetRunner):
+        def _attempt(self, device):
+            raise RuntimeError('broken task')
+
+    report = BrokenRunner([{'ip': '10.0.0.1'}], output_dir=str(tmp_path)).run()
+    assert report['failed'] == 1
+    assert report['devices'][0]['ip'] == '10.0.0.1'
+    assert 'broken task' in report['devices'][0]['error']
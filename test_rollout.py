@@ -0,0 +1,61 @@
+import pytest
+
+from config_diff import diff_configs
+from fake_ios import DEFAULT_CONFIG, FakeIOSDevice, FakeIOSServer
+from rollout import Check, Rollout, plan_waves
+from transports import TelnetTransport
+
+CONFIG = DEFAULT_CONFIG.replace('line con 0', 'ip access-list extended EDGE\n'
+                                              ' permit tcp any any eq 22\n'
+                                              ' deny ip any any\n'
+                                              '!\n'
+                                              'line con 0')
+
+# Puts a new entry in the middle of the ACL
+CHANGE = ['no ip access-list extended EDGE', 'ip access-list extended EDGE', 'permit tcp any any eq 22',
+          'permit tcp any any eq 443', 'deny ip any any', 'exit']
+
+
+@pytest.fixture
+def servers():
+    # One address per device, the rollout keys its results by ip
+    servers = [FakeIOSServer(host=f'127.0.0.{number}', device=FakeIOSDevice(config=CONFIG)).serve_in_thread()
+               for number in (1, 2, 3)]
+    yield servers
+    for server in servers:
+        server.stop_thread()
+
+
+def devices(servers):
+    return [{'ip': server.host, 'username': 'cisco', 'password': 'cisco', 'enable_password': 'class',
+             'transport': TelnetTransport(server.port)} for server in servers]
+
+
+def running_config(server):
+    return '\n'.join(server.device.running_config())
+
+
+def test_plan_waves():
+    assert plan_waves(list(range(20)), (1, 0.25, 1.0)) == [[0], list(range(1, 5)), list(range(5, 20))]
+    assert plan_waves([1, 2], (1, 0.1, 1.0)) == [[1], [2]]
+
+
+def test_rollout_saves_every_wave(servers):
+    rollout = Rollout(devices(servers), CHANGE, [Check('show running-config', r'eq 443')], waves=(1, 1.0))
+    report = rollout.run()
+
+    assert not report['aborted']
+    assert report['counts'] == {'changed': 3}
+    assert all(server.device.write_count == 1 for server in servers)
+    assert all(' permit tcp any any eq 443' in server.device.lines for server in servers)
+
+
+def test_failed_canary_restores_the_acl_order(servers):
+    before = running_config(servers[0])
+    rollout = Rollout(devices(servers[:1]), CHANGE, [Check('show running-config', r'eq 8080')])
+    report = rollout.run()
+
+    assert report['aborted'] and report['aborted_wave'] == 1
+    assert report['counts'] == {'rolled_back': 1}
+    assert not diff_configs(running_config(servers[0]), before)
+    assert servers[0].device.write_count == 0
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from snapshot_store import SnapshotStore
+
+CONFIG = 'hostname R1\nntp clock-period 17179869\ninterface GigabitEthernet0/0\n ip address 10.0.0.1 255.255.255.0\n'
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(str(tmp_path / 'snapshots'))
+    yield store
+    store.close()
+
+
+def objects(store):
+    root = os.path.join(store.root, 'objects')
+    return [name for _, _, names in os.walk(root) for name in names]
+
+
+def test_unchanged_config_is_stored_once(store):
+    digest, changed = store.save('r1', CONFIG, taken_at=100)
+    assert changed
+
+    # Only the ntp clock-period drifted
+    again, changed = store.save('r1', CONFIG.replace('17179869', '17179870'), taken_at=200)
+    assert (again, changed) == (digest, False)
+    assert len(objects(store)) == 1
+    assert [taken_at for taken_at, _ in store.history('r1')] == [100, 200]
+
+
+def test_history_and_point_in_time(store):
+    first, _ = store.save('r1', CONFIG, taken_at=100)
+    store.save('r1', CONFIG, taken_at=200)
+    second, _ = store.save('r1', CONFIG.replace('R1', 'R2'), taken_at=300)
+    store.save('r2', CONFIG, taken_at=150)
+
+    assert store.changes('r1') == [(100, first), (300, second)]
+    assert store.at('r1', 250) == (200, store.read_object(first))
+    assert store.at('r1', 50) is None
+    assert store.latest('r1')[1].startswith('hostname R2')
+    assert store.devices() == ['r1', 'r2']
+
+
+def test_save_file_matches_save_and_exports(store, tmp_path):
+    capture = tmp_path / 'running_config.txt'
+    capture.write_bytes(CONFIG.replace('\n', '\r\n').encode('utf-8'))
+
+    digest, changed = store.save_file('r1', str(capture), taken_at=100)
+    assert changed
+    assert store.save('r1', CONFIG, taken_at=200) == (digest, False)
+
+    exported = tmp_path / 'exported.txt'
+    store.export(digest, str(exported))
+    assert exported.read_text() == CONFIG.replace('ntp clock-period 17179869\n', '')
+    assert not [name for name in objects(store) if name.endswith('.tmp')]
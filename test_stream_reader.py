@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from fake_ios import FakeIOSServer
+from networkconfignew import NetworkDeviceConfigurator
+from stream_reader import iter_file_lines
+from transports import TelnetTransport
+
+
+@pytest.fixture
+def server():
+    server = FakeIOSServer().serve_in_thread()
+    yield server
+    server.stop_thread()
+
+
+def test_capture_streams_running_config_to_file(server, tmp_path):
+    output_file = str(tmp_path / 'running_config.txt')
+    device = NetworkDeviceConfigurator('127.0.0.1', 'cisco', 'cisco', 'class', transport=TelnetTransport(server.port))
+    try:
+        assert device.connect()
+        written = device.capture('show running-config', output_file)
+        # The session is left at the prompt, ready for the next command
+        assert 'hostname R1' in device.send_command('show running-config | include hostname')
+    finally:
+        device.disconnect()
+
+    assert written == os.path.getsize(output_file)
+    assert not os.path.exists(output_file + '.part')
+    lines = list(iter_file_lines(output_file))
+    for line in server.device.running_config():
+        assert line in lines
+    assert not any(line.rstrip().endswith('R1#') for line in lines)
+
+
+def test_iter_file_lines(tmp_path):
+    path = tmp_path / 'config.txt'
+    path.write_bytes(b'hostname R1\r\n interface Gi0/0\n\xff end')
+    assert list(iter_file_lines(str(path))) == ['hostname R1', ' interface Gi0/0', '� end']
+
+    path.write_bytes(b'')
+    assert list(iter_file_lines(str(path))) == []
@@ -0,0 +1,576 @@
+import time
+import socket
+import logging
+import selectors
+import threading
+
+import pexpect
+from pexpect.spawnbase import SpawnBase
+
+from prompts import LOGIN_PATTERNS, NEW_HOST_KEY, USERNAME_PROMPT
+from retry import AUTH, SessionFailure
+
+# Telnet commands and options (RFC 854, 857, 858)
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO, SGA = 1, 3
+
+
+class ChannelSpawn(SpawnBase):
+    """
+    pexpect session on top of an in-process channel.
+
+    Gives expect(), expect_list(), before, after and match over anything with
+    fileno(), recv(), sendall() and close() - a paramiko Channel, a
+    TelnetChannel or a plain socket - so the configurator code runs unchanged
+    whether the session is a forked ssh binary or a channel inside this
+    process. The optional owner (e.g. the SSHClient the channel came from) is
+    closed with the session.
+    """
+
+    def __init__(self, channel, timeout=30, maxread=65535, searchwindowsize=None, logfile=None,
+                 encoding='utf-8', codec_errors='strict', owner=None):
+        super().__init__(timeout=timeout, maxread=maxread, searchwindowsize=searchwindowsize, logfile=logfile,
+                         encoding=encoding, codec_errors=codec_errors)
+        self.channel = channel
+        self.owner = owner
+        self.child_fd = channel.fileno()
+        self.closed = False
+        self.name = f'<channel {channel!r}>'
+
+        # select.select() stops at fd 1024, a process with hundreds of sessions goes past that
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(channel, selectors.EVENT_READ)
+
+    def read_nonblocking(self, size=1, timeout=-1):
+        if self.closed:
+            raise ValueError('I/O operation on closed channel')
+        if self.flag_eof:
+            raise pexpect.EOF('End of file on channel')
+
+        if timeout == -1:
+            timeout = self.timeout
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not self._selector.select(remaining):
+                raise pexpect.TIMEOUT('Timeout exceeded')
+
+            try:
+                data = self.channel.recv(size)
+                break
+            except BlockingIOError:
+                # Only protocol traffic such as telnet negotiation, nothing for the caller yet
+                continue
+
+        if not data:
+            self.flag_eof = True
+            raise pexpect.EOF('End of file on channel')
+
+        text = self._decoder.decode(data, final=False)
+        self._log(text, 'read')
+        return text
+
+    def send(self, s):
+        s = self._coerce_send_string(s)
+        self._log(s, 'send')
+        data = self._encoder.encode(s, final=False)
+        self.channel.sendall(data)
+        return len(data)
+
+    def sendline(self, s=''):
+        return self.send(s + self.linesep)
+
+    def isalive(self):
+        return not self.closed and not self.flag_eof
+
+    def close(self, force=True):
+        if not self.closed:
+            self._selector.close()
+            self.channel.close()
+            if self.owner is not None:
+                self.owner.close()
+            self.closed = True
+
+
+class TelnetChannel:
+    """
+    Telnet connection with the channel interface of a paramiko Channel.
+
+    The socket is non-blocking. recv() strips the telnet commands out of the
+    data and answers option negotiation itself: the device may echo and
+    suppress go-ahead, every other option is refused. A read that held
+    nothing but negotiation raises BlockingIOError, like a non-blocking
+    socket with no data, so the caller goes back to select().
+    """
+
+    def __init__(self, sock, timeout=20):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.timeout = timeout
+        self.closed = False
+        self._pending = b''
+        self._subnegotiation = False
+        self._remote = set()
+        self._local = set()
+
+    @classmethod
+    def connect(cls, host, port=23, timeout=20):
+        return cls(socket.create_connection((host, port), timeout), timeout)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _reply(self, command, option):
+        # Answer only requests that change an option's state, so negotiation never loops
+        if command == WILL and option not in self._remote:
+            if option in (ECHO, SGA):
+                self._remote.add(option)
+                return bytes((IAC, DO, option))
+            return bytes((IAC, DONT, option))
+        if command == WONT and option in self._remote:
+            self._remote.discard(option)
+            return bytes((IAC, DONT, option))
+        if command == DO and option not in self._local:
+            if option == SGA:
+                self._local.add(option)
+                return bytes((IAC, WILL, option))
+            return bytes((IAC, WONT, option))
+        if command == DONT and option in self._local:
+            self._local.discard(option)
+            return bytes((IAC, WONT, option))
+        return b''
+
+    def recv(self, size):
+        data = self.sock.recv(size)
+        if not data:
+            return b''
+
+        data = self._pending + data
+        self._pending = b''
+        text = bytearray()
+        replies = bytearray()
+        index = 0
+
+        while index < len(data):
+            byte = data[index]
+
+            if byte != IAC:
+                if not self._subnegotiation:
+                    text.append(byte)
+                index += 1
+                continue
+
+            # Commands split over two reads are finished on the next one
+            if index + 1 >= len(data):
+                self._pending = data[index:]
+                break
+            command = data[index + 1]
+
+            if command == IAC:
+                if not self._subnegotiation:
+                    text.append(IAC)
+                index += 2
+            elif command in (WILL, WONT, DO, DONT):
+                if index + 2 >= len(data):
+                    self._pending = data[index:]
+                    break
+                replies += self._reply(command, data[index + 2])
+                index += 3
+            else:
+                if command == SB:
+                    self._subnegotiation = True
+                elif command == SE:
+                    self._subnegotiation = False
+                index += 2
+
+        if replies:
+            self._write(bytes(replies))
+        if not text:
+            raise BlockingIOError('No data after telnet negotiation')
+
+        # NVT sends a bare carriage return as CR NUL
+        return bytes(text).replace(b'\r\x00', b'\r')
+
+    def _write(self, data):
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[self.sock.send(view):]
+            except BlockingIOError:
+                # Wait until the socket takes data again; selectors has no fd 1024 limit
+                with selectors.DefaultSelector() as selector:
+                    selector.register(self.sock, selectors.EVENT_WRITE)
+                    if not selector.select(self.timeout):
+                        raise TimeoutError(f'Telnet peer stopped reading for {self.timeout}s')
+
+    def sendall(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        # Escape IAC bytes in the data and end lines the NVT way
+        self._write(data.replace(b'\xff', b'\xff\xff').replace(b'\r\n', b'\n').replace(b'\n', b'\r\n'))
+
+    def send(self, data):
+        self.sendall(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+
+class PexpectTransport:
+    """
+    Fork the ssh binary under a pty for every session.
+
+    Works wherever an OpenSSH client is installed and honours ~/.ssh/config,
+    at the cost of one child process and one pty per device.
+    """
+
+    name = 'pexpect'
+
+    def open(self, ip, username, password, timeout=20):
+        """
+        Log in to a device.
+
+        :ip: Device IP address
+        :username: Login username
+        :password: Login password
+        :timeout: Seconds to wait for the password prompt
+        =return: pexpect session waiting for the device prompt, None on failure
+        """
+        session = pexpect.spawn(f'ssh {username}@{ip}', encoding='utf-8', timeout=20)
+        result = session.expect_list([NEW_HOST_KEY] + LOGIN_PATTERNS, timeout=timeout)
+
+        if result == 0:
+            session.sendline('yes')
+            result = session.expect_list([NEW_HOST_KEY] + LOGIN_PATTERNS, timeout=timeout)
+
+        if result != 1:
+            logging.error(f'Failed to create an SSH session for {ip}')
+            session.close()
+            return None
+
+        session.sendline(password)
+        return session
+
+
+class ParamikoTransport:
+    """
+    SSH inside this Python process with paramiko.
+
+    The key exchange and authentication run in paramiko's transport thread
+    and the shell is a channel read through ChannelSpawn, so hundreds of
+    sessions need no child processes or ptys.
+    """
+
+    name = 'paramiko'
+
+    def __init__(self, port=22, look_for_keys=False, allow_agent=False):
+        self.port = port
+        self.look_for_keys = look_for_keys
+        self.allow_agent = allow_agent
+
+    def open(self, ip, username, password, timeout=20):
+        """
+        Log in to a device.
+
+        :ip: Device IP address
+        :username: Login username
+        :password: Login password
+        :timeout: Seconds to wait for the connection and authentication
+        =return: ChannelSpawn waiting for the device prompt, None on failure; refused credentials
+                 raise SessionFailure(AUTH)
+        """
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        try:
+            client.connect(ip, port=self.port, username=username, password=password, timeout=timeout,
+                           auth_timeout=timeout, banner_timeout=timeout, look_for_keys=self.look_for_keys,
+                           allow_agent=self.allow_agent)
+            channel = client.invoke_shell(width=512, height=0)
+        except paramiko.AuthenticationException as e:
+            # A subclass of SSHException, but a wrong password must not be retried like a network error
+            client.close()
+            raise SessionFailure(AUTH, f'Authentication failed for {ip}: {e}')
+        except (paramiko.SSHException, OSError) as e:
+            logging.error(f'Failed to create an SSH session for {ip}: {e}')
+            client.close()
+            return None
+
+        # Closing the session also closes the client and its transport thread
+        return ChannelSpawn(channel, timeout=20, owner=client)
+
+
+class TelnetTransport:
+    """
+    Telnet inside this Python process, for devices without SSH.
+
+    The session is a non-blocking TelnetChannel read through ChannelSpawn,
+    the same session type as the paramiko transports, so SSH and telnet
+    devices run side by side in one executor without a telnet binary or a
+    pty per device.
+    """
+
+    name = 'telnet'
+
+    def __init__(self, port=23):
+        self.port = port
+
+    def open(self, ip, username, password, timeout=20):
+        """
+        Log in to a device.
+
+        Handles both 'Username:' then 'Password:' (AAA or local users) and a
+        bare 'Password:' (line password).
+
+        :ip: Device IP address
+        :username: Login username
+        :password: Login password
+        :timeout: Seconds to wait for the connection and each login prompt
+        =return: ChannelSpawn waiting for the device prompt, None on failure
+        """
+        try:
+            channel = TelnetChannel.connect(ip, self.port, timeout)
+        except OSError as e:
+            logging.error(f'Failed to create a telnet session for {ip}: {e}')
+            return None
+
+        session = ChannelSpawn(channel, timeout=20)
+        patterns = [USERNAME_PROMPT] + LOGIN_PATTERNS
+        result = session.expect_list(patterns, timeout=timeout)
+
+        if result == 0:
+            session.sendline(username)
+            result = session.expect_list(patterns, timeout=timeout)
+
+        if result != 1:
+            logging.error(f'Failed to log in over telnet to {ip}')
+            session.close()
+            return None
+
+        session.sendline(password)
+        return session
+
+
+class _ChannelSlot:
+    """
+    Frees a channel slot on a shared SSH connection when the session closes.
+
+    :done: Called after the slot is freed, to close the connection once its
+           last channel is gone
+    """
+
+    def __init__(self, semaphore, done=None):
+        self.semaphore = semaphore
+        self.done = done
+        self.released = False
+
+    def close(self):
+        if not self.released:
+            self.released = True
+            self.semaphore.release()
+            if self.done is not None:
+                self.done()
+
+
+class MultiplexTransport(ParamikoTransport):
+    """
+    Many CLI channels over one authenticated SSH connection per device.
+
+    The first open() to a device does the key exchange and authentication;
+    later opens, from any thread, only start a new channel on that
+    connection. exec_commands() runs several show commands concurrently on
+    their own exec channels. IOS allows a handful of channels per connection,
+    so at most max_channels are open at once per device and further opens
+    wait for a free slot.
+    """
+
+    name = 'paramiko-mux'
+
+    def __init__(self, port=22, look_for_keys=False, allow_agent=False, max_channels=4):
+        super().__init__(port, look_for_keys, allow_agent)
+        self.max_channels = max_channels
+        self._clients = {}
+        self._slots = {}
+        self._logins = {}
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _client(self, ip, username, password, timeout):
+        import paramiko
+
+        key = (ip, username)
+        with self._lock:
+            slots = self._slots.setdefault(key, threading.BoundedSemaphore(self.max_channels))
+            login = self._logins.setdefault(key, threading.Lock())
+
+        # One login per device at a time, so concurrent opens share it
+        with login:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is not None and client.get_transport() is not None and client.get_transport().is_active():
+                    # Counted before the channel is open, so the connection is not closed under it
+                    self._users[key] += 1
+                    return client, slots
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            try:
+                client.connect(ip, port=self.port, username=username, password=password, timeout=timeout,
+                               auth_timeout=timeout, banner_timeout=timeout, look_for_keys=self.look_for_keys,
+                               allow_agent=self.allow_agent)
+            except Exception:
+                client.close()
+                raise
+            with self._lock:
+                stale = self._clients.get(key)
+                if stale is not None:
+                    stale.close()
+                self._clients[key] = client
+                self._users[key] = 1
+            return client, slots
+
+    def _release(self, key, client):
+        # Close the connection with its last channel; a newer connection for the device is left alone
+        with self._lock:
+            if self._clients.get(key) is not client:
+                return
+            self._users[key] -= 1
+            if self._users[key] > 0:
+                return
+            del self._clients[key]
+            del self._users[key]
+        client.close()
+
+    def _channel(self, ip, username, password, timeout):
+        key = (ip, username)
+        client, slots = self._client(ip, username, password, timeout)
+
+        if not slots.acquire(timeout=timeout):
+            self._release(key, client)
+            raise TimeoutError(f'No free channel on the connection to {ip} after {timeout}s')
+
+        slot = _ChannelSlot(slots, lambda: self._release(key, client))
+        try:
+            return client.get_transport().open_session(timeout=timeout), slot
+        except Exception:
+            slot.close()
+            raise
+
+    def open(self, ip, username, password, timeout=20):
+        """
+        Open an interactive shell on the shared connection to a device.
+
+        =return: ChannelSpawn waiting for the device prompt, None on failure; refused credentials
+                 raise SessionFailure(AUTH)
+        """
+        import paramiko
+
+        try:
+            channel, slot = self._channel(ip, username, password, timeout)
+        except paramiko.AuthenticationException as e:
+            raise SessionFailure(AUTH, f'Authentication failed for {ip}: {e}')
+        except (paramiko.SSHException, OSError) as e:
+            logging.error(f'Failed to open an SSH channel to {ip}: {e}')
+            return None
+
+        try:
+            channel.get_pty(width=512, height=0)
+            channel.invoke_shell()
+        except (paramiko.SSHException, OSError) as e:
+            logging.error(f'Failed to start a shell on {ip}: {e}')
+            channel.close()
+            slot.close()
+            return None
+
+        # Closing the session frees the channel slot, and the connection with the last one
+        return ChannelSpawn(channel, timeout=20, owner=slot)
+
+    def exec_command(self, ip, username, password, command, timeout=30):
+        """
+        Run one command on its own exec channel of the shared connection.
+
+        Exec channels start at the account's privilege level, so commands
+        such as 'show running-config' need a privilege 15 account.
+
+        =return: Command output
+        """
+        channel, slot = self._channel(ip, username, password, timeout)
+        try:
+            channel.settimeout(timeout)
+            channel.exec_command(command)
+            chunks = []
+            while True:
+                data = channel.recv(65535)
+                if not data:
+                    break
+                chunks.append(data)
+            return b''.join(chunks).decode('utf-8', errors='replace')
+        finally:
+            channel.close()
+            slot.close()
+
+    def exec_commands(self, ip, username, password, commands, timeout=30):
+        """
+        Run several commands concurrently, one exec channel each.
+
+        :commands: Commands to run
+        =return: dict of command -> output, None for commands that failed
+        """
+        outputs = {}
+
+        def run(command):
+            try:
+                outputs[command] = self.exec_command(ip, username, password, command, timeout)
+            except Exception as e:
+                logging.error(f'Failed to run {command!r} on {ip}: {e}')
+                outputs[command] = None
+
+        threads = [threading.Thread(target=run, args=(command,), daemon=True) for command in commands]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return outputs
+
+    def close(self, ip=None):
+        """
+        Close the shared connection to one device, or to every device.
+        """
+        with self._lock:
+            keys = [key for key in self._clients if ip is None or key[0] == ip]
+            clients = [self._clients.pop(key) for key in keys]
+            for key in keys:
+                self._users.pop(key, None)
+        for client in clients:
+            client.close()
+
+
+# Transports selectable by name
+TRANSPORTS = {
+    PexpectTransport.name: PexpectTransport,
+    ParamikoTransport.name: ParamikoTransport,
+    MultiplexTransport.name: MultiplexTransport,
+    TelnetTransport.name: TelnetTransport,
+}
+
+
+def get_transport(transport):
+    """
+    :transport: Transport name, transport object or None for the pexpect default
+    =return: Transport object
+    """
+    if transport is None:
+        return PexpectTransport()
+    if isinstance(transport, str):
+        if transport not in TRANSPORTS:
+            raise ValueError(f'Unknown transport {transport!r}, expected one of {", ".join(TRANSPORTS)}')
+        return TRANSPORTS[transport]()
+    return transport
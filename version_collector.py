@@ -0,0 +1,265 @@
+#!/usr/bin/python3
+
+"""
+Collect version facts from the whole fleet into an SQLite database.
+
+Runs 'show version' on every inventory device in parallel, parses the
+software version, model, serial number, uptime and image with tolerant
+patterns, and stores one row per device. Questions such as "which
+devices run 15.2(4)M7" are then indexed lookups.
+
+Usage:
+    python3 version_collector.py devices-15.txt
+    python3 version_collector.py --query 16.9.5
+"""
+
+import re
+import sys
+import time
+import getpass
+import logging
+import sqlite3
+import argparse
+import threading
+
+from governor import Governor
+from inventory import load_inventory
+from networkconfignew import NetworkDeviceConfigurator
+from retry import RetryScheduler, SessionFailure
+
+# Each fact has several patterns, for IOS, IOS-XE and NX-OS wording; the first match wins
+VERSION_PATTERNS = {
+    'version': [
+        re.compile(r'Cisco IOS.*?Software.*?,\s*Version\s+([^,\s]+)', re.IGNORECASE),
+        re.compile(r'^\s*(?:NXOS|system):\s+version\s+(\S+)', re.IGNORECASE | re.MULTILINE),
+        re.compile(r'\bVersion\s+(\d[^,\s]*)'),
+    ],
+    'model': [
+        re.compile(r'^[Cc]isco\s+(\S+)\s+(?:\([^)]*\)\s+)?(?:processor|Chassis)', re.MULTILINE),
+        re.compile(r'^Model [Nn]umber\s*:\s*(\S+)', re.MULTILINE),
+        re.compile(r'^\s*cisco\s+(Nexus\s*\S+.*?)\s+[Cc]hassis', re.MULTILINE),
+    ],
+    'serial': [
+        re.compile(r'Processor board ID\s+(\S+)'),
+        re.compile(r'^System [Ss]erial [Nn]umber\s*:\s*(\S+)', re.MULTILINE),
+    ],
+    'uptime': [
+        re.compile(r'^\S+\s+uptime is\s+(.+?)\s*$', re.MULTILINE),
+        re.compile(r'^Kernel uptime is\s+(.+?)\s*$', re.MULTILINE),
+    ],
+    'image': [
+        re.compile(r'System image file is\s+"([^"]+)"'),
+        re.compile(r'^\s*(?:NXOS|system) image file is:\s+(\S+)', re.MULTILINE),
+    ],
+    'hostname': [
+        re.compile(r'^(?!Kernel\s)(\S+)\s+uptime is\s', re.MULTILINE),
+    ],
+}
+
+FACTS = ('hostname', 'version', 'model', 'serial', 'uptime', 'image')
+
+
+def parse_show_version(output):
+    """
+    Pull the facts out of 'show version' output.
+
+    Never raises on unexpected output: facts that are not found are None.
+
+    :output: Output of 'show version'
+    =return: dict with hostname, version, model, serial, uptime and image
+    """
+    facts = {}
+    for fact, patterns in VERSION_PATTERNS.items():
+        facts[fact] = None
+        for pattern in patterns:
+            match = pattern.search(output or '')
+            if match:
+                facts[fact] = match.group(1).strip()
+                break
+    return facts
+
+
+class VersionStore:
+    """
+    SQLite table of the latest version facts of every device.
+
+    Version, model and serial are indexed, so fleet questions are index
+    lookups. Safe to share between collector threads.
+    """
+
+    def __init__(self, path='fleet_versions.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS versions (
+                device TEXT PRIMARY KEY,
+                hostname TEXT,
+                version TEXT,
+                model TEXT,
+                serial TEXT,
+                uptime TEXT,
+                image TEXT,
+                collected_at REAL NOT NULL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS versions_version ON versions (version);
+            CREATE INDEX IF NOT EXISTS versions_model ON versions (model);
+            CREATE INDEX IF NOT EXISTS versions_serial ON versions (serial);
+        """)
+
+    def save(self, device, facts=None, error=None, collected_at=None):
+        """
+        Record the facts of one device, or the error that prevented collecting them.
+
+        A failed collection keeps the facts from the last successful one.
+        """
+        collected_at = collected_at if collected_at is not None else time.time()
+
+        with self._lock:
+            if facts is None:
+                self.db.execute('INSERT INTO versions (device, collected_at, error) VALUES (?, ?, ?) '
+                                'ON CONFLICT (device) DO UPDATE SET collected_at = excluded.collected_at, '
+                                'error = excluded.error', (device, collected_at, error))
+            else:
+                self.db.execute('INSERT OR REPLACE INTO versions (device, hostname, version, model, serial, uptime, '
+                                'image, collected_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)',
+                                (device,) + tuple(facts.get(fact) for fact in FACTS) + (collected_at,))
+            self.db.commit()
+
+    def devices_with_version(self, version):
+        with self._lock:
+            return [row[0] for row in self.db.execute('SELECT device FROM versions WHERE version = ? ORDER BY device',
+                                                      (version,))]
+
+    def devices_with_model(self, model):
+        with self._lock:
+            return [row[0] for row in self.db.execute('SELECT device FROM versions WHERE model = ? ORDER BY device',
+                                                      (model,))]
+
+    def versions(self):
+        """
+        =return: List of (version, device count), most common first
+        """
+        with self._lock:
+            return self.db.execute('SELECT version, COUNT(*) FROM versions WHERE version IS NOT NULL '
+                                   'GROUP BY version ORDER BY COUNT(*) DESC, version').fetchall()
+
+    def get(self, device):
+        with self._lock:
+            row = self.db.execute(f'SELECT {", ".join(FACTS)}, collected_at, error FROM versions WHERE device = ?',
+                                  (device,)).fetchone()
+        return dict(zip(FACTS + ('collected_at', 'error'), row)) if row else None
+
+    def close(self):
+        self.db.close()
+
+
+def collect_device(device, username, password, enable_password, transport=None, governor=None, site=None):
+    """
+    Log in to one device and parse its 'show version'.
+
+    Raises SessionFailure when the login fails, so the caller can retry
+    the failures that may go away.
+
+    =return: (facts, error) - facts is None when the device could not be read
+    """
+    configurator = NetworkDeviceConfigurator(device, username, password, enable_password, transport=transport,
+                                             governor=governor, site=site)
+    try:
+        if not configurator.connect():
+            raise SessionFailure(configurator.failure, f'connect failed ({configurator.failure})')
+        return parse_show_version(configurator.send_command('show version')), None
+    except SessionFailure:
+        raise
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+    finally:
+        configurator.disconnect()
+
+
+def collect_versions(inventory, store, username, password, enable_password, max_workers=32, governor=None,
+                     scheduler=None):
+    """
+    Collect the version facts of every inventory device in parallel.
+
+    Devices with a credentials reference log in with those credentials,
+    the others with the given ones. Logins that time out, drop or find no
+    free vty line are retried with backoff. One failing device never stops
+    the others; its error is stored instead.
+
+    :inventory: Inventory of devices
+    :store: VersionStore to write to
+    :governor: Optional Governor limiting sessions per device and site and the login rate
+    :scheduler: RetryScheduler to run on, one with max_workers workers by default
+    =return: (collected, failed) counts
+    """
+    collected = failed = 0
+
+    def run(device):
+        login = inventory.login(device)
+        if login:
+            return collect_device(device.host, login.username, login.password, login.enable_password,
+                                  device.transport, governor, device.site)
+        return collect_device(device.host, username, password, enable_password, device.transport, governor,
+                              device.site)
+
+    scheduler = scheduler or RetryScheduler(max_workers)
+
+    for outcome in scheduler.run((device.host, lambda device=device: run(device)) for device in inventory):
+        if outcome.result is not None:
+            facts, error = outcome.result
+        else:
+            facts, error = None, f'{outcome.error} after {outcome.attempts} attempt(s)'
+        store.save(outcome.key, facts, error)
+
+        if facts is None:
+            failed += 1
+            logging.error(f'Version collection failed for {outcome.key}: {error}')
+        else:
+            collected += 1
+
+    return collected, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Collect software versions from the fleet into SQLite.')
+    parser.add_argument('inventory', nargs='?', default='devices-15.txt', help='inventory file (default: %(default)s)')
+    parser.add_argument('--db', default='fleet_versions.db', help='SQLite output (default: %(default)s)')
+    parser.add_argument('--credentials', help='named credentials file for the inventory')
+    parser.add_argument('--username', default='cisco', help='login for devices without credentials')
+    parser.add_argument('--workers', type=int, default=32, help='parallel sessions (default: %(default)s)')
+    parser.add_argument('--max-per-device', type=int, default=2, help='sessions per device (default: %(default)s)')
+    parser.add_argument('--max-per-site', type=int, help='sessions per site (default: no limit)')
+    parser.add_argument('--login-rate', type=float, default=10, help='logins per second (default: %(default)s)')
+    parser.add_argument('--query', metavar='VERSION', help='only list the devices running VERSION')
+    args = parser.parse_args(argv)
+
+    store = VersionStore(args.db)
+
+    try:
+        if args.query:
+            for device in store.devices_with_version(args.query):
+                print(device)
+            return 0
+
+        inventory = load_inventory(args.inventory, credentials=args.credentials)
+        password = getpass.getpass(f'Enter password for user {args.username}: ')
+        enable_password = getpass.getpass('Enter enable password: ')
+
+        governor = Governor(args.workers, args.max_per_device, args.max_per_site, args.login_rate)
+        collected, failed = collect_versions(inventory, store, args.username, password, enable_password,
+                                             args.workers, governor)
+
+        print(f'--- Collected {collected} devices, {failed} failed, saved to {args.db}')
+        for version, count in store.versions():
+            print(f'--- {version}: {count}')
+        return 0 if failed == 0 else 1
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(filename='network_device_configurator.log', level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s: %(message)s')
+    sys.exit(main())